@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its latency and query timings cover the whole stack
+    'countries.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -126,3 +128,108 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Country refresh
+# Rows per bulk INSERT/UPDATE statement when reconciling upstream data
+
+COUNTRY_UPSERT_BATCH_SIZE = 500
+
+# Largest batch (rows, request bytes) accepted by POST/DELETE /countries/bulk
+
+COUNTRY_BULK_MAX_ROWS = 100_000
+COUNTRY_BULK_MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# Upstream fetch layer: per-source timeouts (seconds) and bounded retry with backoff
+
+UPSTREAM_TIMEOUTS = {
+    'rates': 10,
+    'countries': 10,
+}
+UPSTREAM_MAX_RETRIES = 2
+UPSTREAM_BACKOFF_FACTOR = 0.5
+
+# Background refresh jobs run on an in-process worker; active jobs older than
+# REFRESH_JOB_TIMEOUT seconds are treated as crashed and no longer block new ones
+
+REFRESH_JOB_TIMEOUT = 600
+REFRESH_JOBS_ALWAYS_EAGER = False
+
+# Seconds between refreshes of each upstream stage (see services.due_stages);
+# the derived GDP and image stages follow whenever their inputs change
+
+REFRESH_STAGE_INTERVALS = {
+    'rates': 5 * 60,
+    'countries': 24 * 60 * 60,
+}
+
+# `manage.py run_refresher` checks for due stages every REFRESH_SCHEDULER_INTERVAL
+# seconds, +/- REFRESH_SCHEDULER_JITTER (a fraction). The refresh lease on the
+# Status row lapses REFRESH_LEASE_SECONDS after its holder's last renewal
+
+REFRESH_SCHEDULER_INTERVAL = 60
+REFRESH_SCHEDULER_JITTER = 0.1
+REFRESH_LEASE_SECONDS = 300
+
+# Django REST Framework
+# GET /countries is only paginated when limit/offset/cursor params are sent
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'countries.pagination.CountryPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Versioned response cache for GET /countries, /countries/<name> and /status.
+# Set BACKEND to a shared cache alias (and VERSION_BACKEND to the same) when
+# running several worker processes; see countries/cache.py for all options.
+
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 512,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    'BACKEND': None,
+    'VERSION_BACKEND': 'default',
+    'VERSION_TTL': 2,
+}
+
+# Snapshot mode: each worker serves GET /countries, /countries/<name> and
+# /status from an immutable in-memory copy of the Country table, rebuilt when
+# the data version moves (see countries/snapshot.py)
+
+COUNTRY_SNAPSHOT_MODE = False
+
+# Cache-Control max-age (seconds) for GET /countries/image; clients and CDNs
+# revalidate with the ETag afterwards
+
+SUMMARY_IMAGE_MAX_AGE = 300
+
+# Rows fetched per keyset chunk by GET /countries/export
+
+COUNTRY_EXPORT_CHUNK_SIZE = 2000
+
+# In-memory cache of on-demand /countries/image variants (region/top/width/format)
+
+SUMMARY_IMAGE_RENDER_CACHE = {
+    'MAX_ENTRIES': 64,
+    'MAX_BYTES': 16 * 1024 * 1024,
+}
+
+# Seed for the random GDP multiplier; None draws fresh multipliers every refresh
+
+GDP_RANDOM_SEED = None
+
+# Exchange-rate history: raw snapshots older than this many days are rolled up
+# into daily min/max/avg aggregates after each refresh. Aggregates are kept
+# forever unless RATE_AGGREGATE_RETENTION_DAYS is set.
+
+RATE_SNAPSHOT_RETENTION_DAYS = 7
+RATE_AGGREGATE_RETENTION_DAYS = None
+
+# Largest batch (conversions, request bytes) accepted by POST /convert
+
+CONVERT_MAX_BATCH = 100_000
+CONVERT_MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# Countries kept in each /stats/* group's top-by-GDP list
+
+STATS_TOP_N = 10
@@ -0,0 +1,14 @@
+"""
+Settings for `manage.py bench_api --settings=core.settings_bench`: the app
+settings on SQLite, so benchmark runs are reproducible without a MySQL server.
+The benchmark creates and destroys its own (in-memory) test database, so the
+default database is never written and leaves no file behind.
+"""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
@@ -17,18 +17,27 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from countries.views import (
-    RefreshCountriesView, CountryListView, CountryDetailView, 
-    StatusView, SummaryImageView, APIRootView, CountryCreateView
+    RefreshCountriesView, RefreshJobDetailView, CountryListView, CountryExportView, CountryDetailView, 
+    StatusView, SummaryImageView, RateHistoryView, ConvertView, StatsView, CountrySearchView, MetricsView, CountryBulkView, APIRootView, CountryCreateView
 )
 
 urlpatterns = [
     path('', APIRootView.as_view()),
     path('admin/', admin.site.urls),
     path('countries/refresh', RefreshCountriesView.as_view()),
+    path('countries/refresh/<uuid:job_id>', RefreshJobDetailView.as_view(), name='refresh-job'),
     path('countries/create', CountryCreateView.as_view(), name='country-create'),
+    path('countries/bulk', CountryBulkView.as_view(), name='country-bulk'),
     path('countries/image', SummaryImageView.as_view()),
+    path('countries/export', CountryExportView.as_view(), name='country-export'),
+    path('countries/search', CountrySearchView.as_view(), name='country-search'),
     path('countries', CountryListView.as_view()),
     path('countries/<str:name>', CountryDetailView.as_view()), 
+    path('rates/<str:code>/history', RateHistoryView.as_view(), name='rate-history'),
+    path('convert', ConvertView.as_view(), name='convert'),
+    path('stats/regions', StatsView.as_view(dimension='region'), name='stats-regions'),
+    path('stats/currencies', StatsView.as_view(dimension='currency'), name='stats-currencies'),
     path('status', StatusView.as_view()),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     
 ]
\ No newline at end of file
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CountriesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'countries'
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_query_recorder
+
+        connection_created.connect(install_query_recorder)
+        # Connections opened before the app was ready
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
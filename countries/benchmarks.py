@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import quote, urlsplit
+from urllib.request import Request, urlopen
+
+from django.test import Client
+
+from .models import Country
+from .services import refresh_country_data
+from .upstream import SOURCES
+
+# --- API Benchmark Harness ---
+# Seeds the configured database through a real refresh against local
+# stand-ins for restcountries/open.er-api, then times each workload through
+# the full Django stack (middleware included) with the test client. Used by
+# `manage.py bench_api`; results are plain dicts so runs can be stored as JSON
+# and compared between commits.
+
+REGIONS = ['Africa', 'Americas', 'Asia', 'Europe', 'Oceania']
+SYLLABLES = ['ba', 'ce', 'di', 'fo', 'ga', 'hu', 'ki', 'la', 'mo', 'ne', 'ra', 'si', 'tu', 'vo', 'zan', 'ria', 'land', 'stan']
+
+
+def make_fixtures(rows, seed=0):
+    """Deterministic restcountries-style country list and USD rate table."""
+    rng = random.Random(seed)
+    currencies = sorted({''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(3)) for _ in range(160)})
+    rates = {'USD': 1}
+    rates.update({code: round(rng.uniform(0.05, 20000), 4) for code in currencies})
+    codes = list(rates)
+
+    countries = []
+    for i in range(rows):
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        countries.append({
+            'name': f'{name} {i}',
+            'capital': ''.join(rng.choice(SYLLABLES) for _ in range(2)).title(),
+            'region': rng.choice(REGIONS),
+            'population': rng.randint(1_000, 200_000_000),
+            'flag': f'https://flags.example/{i}.svg',
+            # A few countries without a currency, as upstream has
+            'currencies': [{'code': rng.choice(codes)}] if i % 50 else [],
+        })
+    return countries, rates
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the fixture bodies by path, with ETags, like the real upstreams."""
+    bodies = {}
+
+    def do_GET(self):
+        body = self.bodies.get(self.path.split('?')[0])
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def fixture_upstreams(countries, rates):
+    """Runs a local server for the fixtures and points SOURCES at it."""
+    handler = type('Handler', (FixtureHandler,), {'bodies': {
+        '/countries': json.dumps(countries).encode(),
+        '/rates': json.dumps({'result': 'success', 'rates': rates}).encode(),
+    }})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    try:
+        with mock.patch.dict(SOURCES['countries'], url=f'{base}/countries'), \
+                mock.patch.dict(SOURCES['rates'], url=f'{base}/rates'):
+            yield
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# --- Workloads ---
+
+def build_workloads(sample_names):
+    """(name, paths) pairs; a workload cycles through its paths."""
+    names = [name.replace(' ', '%20') for name in sample_names]
+    return [
+        ('list', ['/countries']),
+        ('list_sort_gdp_desc', ['/countries?sort=gdp_desc']),
+        ('list_sort_gdp_asc', ['/countries?sort=gdp_asc']),
+        ('list_sort_name_desc', ['/countries?sort=name_desc']),
+        ('list_sort_population_desc', ['/countries?sort=population_desc']),
+        ('list_filter_region', ['/countries?region=europe&sort=gdp_desc']),
+        ('list_filter_currency', ['/countries?currency=USD&sort=population_desc']),
+        ('list_page', ['/countries?limit=50&sort=gdp_desc']),
+        ('detail', [f'/countries/{name}' for name in names]),
+        ('status', ['/status']),
+        ('stats', ['/stats/regions', '/stats/currencies']),
+        ('search', ['/countries/search?q=ba', '/countries/search?q=zanria']),
+        ('image', ['/countries/image']),
+        ('image_variant', ['/countries/image?top=10&width=800&format=webp']),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(rows, workload, latencies, elapsed=None):
+    """Latency summary; throughput is over `elapsed` wall time when requests overlapped."""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    elapsed = elapsed or total
+    return {
+        'rows': rows,
+        'workload': workload,
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(total / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+
+
+def run_timed(call, max_runs, max_seconds, min_runs=3):
+    """Times `call()` up to `max_runs` times or until `max_seconds` pass (at least `min_runs`)."""
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    while len(latencies) < max_runs and (len(latencies) < min_runs or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_requests(client, requests):
+    """Returns a callable issuing the next (method, path, body) request on each call."""
+    position = [0]
+
+    def call():
+        method, path, body = requests[position[0] % len(requests)]
+        position[0] += 1
+        response = client.generic(method, path, body or '', content_type='application/json')
+        if response.status_code >= 500:
+            raise RuntimeError(f"{method} {path} answered {response.status_code}")
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+
+    return call
+
+
+def load_replay(path):
+    """Reads recorded traffic: one JSON object per line with method, path and optional body."""
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'path' not in entry:
+                continue
+            body = entry.get('body')
+            requests.append((entry.get('method', 'GET').upper(), entry['path'],
+                             json.dumps(body) if body is not None else None))
+    return requests
+
+
+def benchmark_size(rows, max_requests=200, max_seconds=5.0, refresh_runs=3, seed=0,
+                   workloads=None, replay=None):
+    """Seeds `rows` countries via a refresh, then times every workload. Returns result dicts."""
+    countries, rates = make_fixtures(rows, seed)
+    client = Client()
+    results = []
+
+    with fixture_upstreams(countries, rates):
+        # The first refresh seeds the table and is not timed
+        Country.objects.all().delete()
+        refresh_country_data(force=True, seed=seed)
+
+        if workloads is None or 'refresh' in workloads:
+            latencies = run_timed(
+                lambda: refresh_country_data(force=True, seed=seed), refresh_runs, max_seconds, min_runs=1
+            )
+            results.append(summarize(rows, 'refresh', latencies))
+
+    sample_names = [country['name'] for country in random.Random(seed).sample(countries, min(50, rows))]
+    for name, paths in build_workloads(sample_names):
+        if workloads is not None and name not in workloads:
+            continue
+        call = run_requests(client, [('GET', path, None) for path in paths])
+        call() # warm-up (connections, font and canvas caches)
+        results.append(summarize(rows, name, run_timed(call, max_requests, max_seconds)))
+
+    if replay:
+        call = run_requests(client, replay)
+        results.append(summarize(rows, 'replay', run_timed(call, max(max_requests, len(replay)), max_seconds)))
+    return results
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """
+    Regressions of `results` against a baseline run: workloads whose p50 or
+    p99 grew by more than `threshold` (a fraction). Returns readable strings.
+    """
+    def key(entry):
+        return entry.get('rows'), entry.get('connections'), entry['workload']
+
+    previous = {key(entry): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in results:
+        before = previous.get(key(entry))
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if before[metric] and entry[metric] > before[metric] * (1 + threshold):
+                scale = (f"{entry['rows']} rows" if entry.get('rows') is not None
+                         else f"{entry['connections']} connections")
+                regressions.append(
+                    f"{entry['workload']} @ {scale}: {metric} "
+                    f"{before[metric]:.3f} -> {entry[metric]:.3f} "
+                    f"(+{(entry[metric] / before[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+# --- Live Server Load Test ---
+# Drives a running deployment over many concurrent keep-alive HTTP/1.1
+# connections, so a WSGI server (e.g. gunicorn core.wsgi) and the ASGI one
+# (e.g. uvicorn core.asgi:application) can be compared on the same data at
+# the same concurrency. Latencies include time queued behind other requests.
+
+LIVE_WORKLOADS = ('list', 'list_page', 'detail', 'status', 'image')
+LIVE_REQUEST_TIMEOUT = 30
+
+
+async def read_response(reader):
+    """Reads one response; returns (status, connection closed by server)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get('connection') == 'close'
+
+
+async def drive_connection(host, port, paths, offset, deadline, latencies, errors, netloc=None):
+    """One client connection issuing requests back to back until `deadline`."""
+    reader = writer = None
+    position = offset
+    while time.perf_counter() < deadline:
+        path = paths[position % len(paths)]
+        position += 1
+        request = f'GET {path} HTTP/1.1\r\nHost: {netloc or host}\r\nAccept: application/json\r\n\r\n'.encode()
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status, closed = await asyncio.wait_for(read_response(reader), LIVE_REQUEST_TIMEOUT)
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            errors.append('connection')
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status >= 500:
+            errors.append(status)
+        if closed:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive_connections(host, port, paths, connections, duration, netloc=None):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        drive_connection(host, port, paths, i, deadline, latencies, errors, netloc)
+        for i in range(connections)
+    ))
+    return latencies, errors, time.perf_counter() - start
+
+
+def raise_open_file_limit(needed):
+    """Lifts the soft descriptor limit towards `needed` (one per connection, plus slack)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    if soft != resource.RLIM_INFINITY and soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def fetch_sample_names(base_url, count=50):
+    request = Request(f'{base_url}/countries?limit={count}', headers={'Accept': 'application/json'})
+    with urlopen(request, timeout=LIVE_REQUEST_TIMEOUT) as response:
+        return [country['name'] for country in json.load(response)['results']]
+
+
+def load_test(base_url, connections=1000, duration=10.0, workloads=None):
+    """
+    Runs each live workload for `duration` seconds over `connections`
+    concurrent connections against the server at `base_url`. Returns result
+    dicts with the connection count and errors (5xx and connection failures).
+    """
+    parts = urlsplit(base_url.rstrip('/'))
+    base_url = f'{parts.scheme}://{parts.netloc}'
+    raise_open_file_limit(connections + 256)
+
+    names = [quote(name) for name in fetch_sample_names(base_url)]
+    results = []
+    for name, paths in build_workloads(names):
+        if name not in (workloads or LIVE_WORKLOADS):
+            continue
+        latencies, errors, elapsed = asyncio.run(
+            drive_connections(parts.hostname, parts.port or 80, paths, connections, duration, parts.netloc)
+        )
+        if not latencies:
+            raise RuntimeError(f"{name}: no request completed ({len(errors)} errors)")
+        result = summarize(None, name, latencies, elapsed)
+        result.update(connections=connections, errors=len(errors))
+        results.append(result)
+    return results
+
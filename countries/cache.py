@@ -0,0 +1,277 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .metrics import registry, serialization_timer
+from .models import Status
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 512,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    # Optional second tier: alias of a Django cache (e.g. a shared Redis/Memcached)
+    'BACKEND': None,
+    'TIMEOUT': 300,
+    # Django cache alias holding the current data version, and how long a worker
+    # may trust it. With a shared cache the key is deleted on every bump, so this
+    # only bounds staleness for per-process caches such as the default LocMem.
+    'VERSION_BACKEND': 'default',
+    'VERSION_TTL': 2,
+}
+
+VERSION_KEY = 'countries:data_version'
+
+# Query params whose values are compared case-insensitively by the views
+CASE_INSENSITIVE_PARAMS = {'region', 'currency', 'sort'}
+
+
+def get_cache_setting(name):
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+# --- Data Version ---
+
+def get_data_state():
+    """
+    Returns (data_version, last-modified timestamp or None), read through the
+    version cache so most requests never touch the database. The timestamp is
+    the later of the last refresh and the last create/delete.
+    """
+    version_cache = caches[get_cache_setting('VERSION_BACKEND')]
+    state = version_cache.get(VERSION_KEY)
+    if state is None:
+        state = make_data_state(get_status_state().first())
+        version_cache.set(VERSION_KEY, state, get_cache_setting('VERSION_TTL'))
+    return state
+
+
+def get_status_state():
+    return Status.objects.filter(pk=1).values_list('data_version', 'last_refreshed_at', 'data_changed_at')
+
+
+def make_data_state(row):
+    version, *times = row or (0, None, None)
+    times = [t.timestamp() for t in times if t is not None]
+    return (version, max(times) if times else None)
+
+
+def get_data_version():
+    """Returns the global data version."""
+    return get_data_state()[0]
+
+
+def bump_data_version():
+    """
+    Increments the data version. Call inside the transaction that changes the
+    data: the bump commits (or rolls back) with it, and the cached version is
+    dropped only once the new data is visible.
+    """
+    Status.objects.get_or_create(pk=1)
+    Status.objects.filter(pk=1).update(
+        data_version=F('data_version') + 1, data_changed_at=timezone.now()
+    )
+    transaction.on_commit(
+        lambda: caches[get_cache_setting('VERSION_BACKEND')].delete(VERSION_KEY)
+    )
+
+
+# --- In-process LRU Tier ---
+
+class LRUCache:
+    """Thread-safe LRU bounded by entry count and total size in bytes."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, size = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+response_cache = LRUCache(get_cache_setting('MAX_ENTRIES'), get_cache_setting('MAX_BYTES'))
+
+
+def collect_response_cache_metrics():
+    return [
+        ('response_cache_requests_total', 'counter', 'In-process response cache lookups by result.',
+         [({'result': 'hit'}, response_cache.hits), ({'result': 'miss'}, response_cache.misses)]),
+        ('response_cache_entries', 'gauge', 'Entries held in the in-process response cache.',
+         [({}, len(response_cache))]),
+    ]
+
+
+registry.add_collector(collect_response_cache_metrics)
+
+
+# --- Response Caching ---
+
+def build_cache_key(request, scope, version):
+    params = sorted(
+        (key, value.lower() if key in CASE_INSENSITIVE_PARAMS else value)
+        for key, values in request.GET.lists()
+        for value in values
+    )
+    query = '&'.join(f'{key}={value}' for key, value in params)
+    # Pagination links are absolute, and browsers may negotiate the HTML renderer
+    flavour = 'html' if 'text/html' in request.META.get('HTTP_ACCEPT', '') else 'json'
+    return f'countries:response:{version}:{scope}:{request.get_host()}:{flavour}:{query}'
+
+
+def make_etag(cache_key):
+    return '"%s"' % hashlib.sha1(cache_key.encode()).hexdigest()
+
+
+def check_conditional(request, scope, state):
+    """
+    Returns (cache key, etag, last_modified, 304 response or None) for a
+    GET/HEAD of `scope` at data state (version, last-modified timestamp).
+    """
+    version, last_refreshed_at = state
+    key = build_cache_key(request, scope, version)
+    etag = make_etag(key)
+    last_modified = int(last_refreshed_at) if last_refreshed_at is not None else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+    return key, etag, last_modified, not_modified
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def use_response_cache(request):
+    return get_cache_setting('ENABLED') and request.method == 'GET'
+
+
+def cached_response(entry):
+    status_code, content_type, content = entry
+    return HttpResponse(content, status=status_code, content_type=content_type)
+
+
+def store_response(key, response):
+    """Renders a cacheable response and stores it in the in-process tier; returns the entry or None."""
+    if response.status_code != 200 or response.streaming:
+        return None
+    if hasattr(response, 'render'):
+        with serialization_timer():
+            response.render()
+    entry = (response.status_code, response['Content-Type'], response.content)
+    response_cache.set(key, entry, len(response.content))
+    return entry
+
+
+class CachedResponseMixin:
+    """
+    Serves GET responses from the version-keyed response cache, with strong
+    ETags and Last-Modified so matching conditional requests get a 304 without
+    touching the database. Views set `get_cache_scope()` to identify the
+    resource (path parameters included); anything that changes the data must
+    call bump_data_version().
+    """
+
+    def get_cache_scope(self):
+        return self.request.path
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.request, self.args, self.kwargs = request, args, kwargs
+        key, etag, last_modified, not_modified = check_conditional(
+            request, self.get_cache_scope(), get_data_state()
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = self.get_cached_response(request, key, *args, **kwargs)
+        return add_validators(response, etag, last_modified)
+
+    def get_cached_response(self, request, key, *args, **kwargs):
+        enabled = use_response_cache(request)
+        shared = get_cache_setting('BACKEND')
+
+        if enabled:
+            cached = response_cache.get(key)
+            if cached is None and shared:
+                cached = caches[shared].get(key)
+                if cached is not None:
+                    response_cache.set(key, cached, len(cached[2]))
+            if cached is not None:
+                return cached_response(cached)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if enabled:
+            entry = store_response(key, response)
+            if entry is not None and shared:
+                caches[shared].set(key, entry, get_cache_setting('TIMEOUT'))
+        return response
+
+
+# --- File ETags ---
+
+_file_etags = {}
+
+
+def get_file_etag(path, stat_result):
+    """Strong ETag from the file's sha1, recomputed only when mtime/size change."""
+    signature = (stat_result.st_mtime_ns, stat_result.st_size)
+    cached = _file_etags.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    etag = '"%s"' % digest.hexdigest()
+    _file_etags[path] = (signature, etag)
+    return etag
@@ -0,0 +1,86 @@
+import csv
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fast_serializers import compile_row_encoder, get_output_names
+from .models import Country
+from .pagination import keyset_segments, keyset_slice
+from .serializers import CountrySerializer
+
+EXPORT_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'COUNTRY_EXPORT_CHUNK_SIZE', 2000)
+
+
+def iter_export_rows(queryset, ordering, chunk_size=None):
+    """
+    Yields serialized country dicts in `ordering`, one bounded chunk at a time.
+    Chunks are walked by keyset on (sort key, id) rather than one long cursor:
+    mysqlclient buffers a whole result set client-side, so a single iterator()
+    would still hold every row in memory at once.
+    """
+    chunk_size = chunk_size or get_export_chunk_size()
+    columns, make_encoder = compile_row_encoder(CountrySerializer)
+    encode = make_encoder()
+    segments = keyset_segments(Country, ordering)
+
+    # The sort key and pk ride along after the serializer columns to seed the next seek
+    width = len(columns)
+    rows = queryset.values_list(*columns, ordering.lstrip('-'), 'pk')
+
+    position = None
+    while True:
+        chunk = keyset_slice(rows, segments, position, chunk_size)
+        for row in chunk:
+            yield encode(row[:width])
+        if len(chunk) < chunk_size:
+            return
+        position = (chunk[-1][width], chunk[-1][width + 1])
+        del chunk
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def encode_export(rows, export_format, batch=500):
+    """Encodes rows into byte chunks, buffering at most `batch` rows per chunk."""
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        opening, separator, closing = writer.writerow(get_output_names(CountrySerializer)), '', ''
+
+        def encode_row(row):
+            return writer.writerow(['' if value is None else value for value in row.values()])
+    else:
+        # Same encoder settings as DRF's JSONRenderer, so a JSON export is
+        # byte-identical to the unpaginated GET /countries body
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        if export_format == 'ndjson':
+            opening, separator, closing = '', '\n', '\n'
+        else:
+            opening, separator, closing = '[', ',', ']'
+        encode_row = encoder.encode
+
+    buffer = [opening]
+    empty = True
+    for row in rows:
+        if not empty:
+            buffer.append(separator)
+        empty = False
+        buffer.append(encode_row(row))
+        if len(buffer) >= batch:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+    if not (empty and export_format == 'ndjson'):
+        buffer.append(closing)
+    yield ''.join(buffer).encode('utf-8')
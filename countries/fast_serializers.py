@@ -0,0 +1,104 @@
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .metrics import serialization_timer
+
+# Serializer fields whose to_representation is a no-op for values the DB driver
+# already returns as str/int; everything else keeps its own to_representation
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField)
+
+# Distinct values remembered per converted column within one response
+MEMO_SIZE = 1024
+
+
+@lru_cache(maxsize=None)
+def compile_row_encoder(serializer_class):
+    """
+    Precompiles a row encoder for a ModelSerializer whose fields map straight
+    onto model columns. Returns (columns, make_encoder) where `columns` is what
+    to pass to values_list() and `make_encoder()` returns an `encode(row)` that
+    turns one tuple into the same dict `serializer_class(instance).data` would
+    produce. Make one encoder per response: its memos assume a fixed timezone.
+    """
+    names, columns, converters = [], [], []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*' or '.' in field.source:
+            raise ImproperlyConfigured(
+                f"{serializer_class.__name__}.{name} does not map to a single column"
+            )
+        names.append(name)
+        columns.append(field.source)
+        converters.append(None if isinstance(field, PASSTHROUGH_FIELDS) else field.to_representation)
+
+    converted = tuple(i for i, convert in enumerate(converters) if convert is not None)
+    converters = tuple(converters)
+    names = tuple(names)
+
+    def make_encoder():
+        # Rows written by one refresh share timestamps, so memoizing the
+        # (comparatively slow) conversions per response saves most of the work
+        memos = {i: {} for i in converted}
+
+        def encode(row):
+            if converted:
+                row = list(row)
+                for i in converted:
+                    value = row[i]
+                    # Serializers emit None for None without calling to_representation
+                    if value is None:
+                        continue
+                    memo = memos[i]
+                    try:
+                        row[i] = memo[value]
+                    except KeyError:
+                        if len(memo) >= MEMO_SIZE:
+                            memo.clear()
+                        row[i] = memo[value] = converters[i](value)
+            return dict(zip(names, row))
+
+        return encode
+
+    return tuple(columns), make_encoder
+
+
+def get_output_names(serializer_class):
+    """Field names in the order compile_row_encoder() emits them."""
+    return [name for name, field in serializer_class().fields.items() if not field.write_only]
+
+
+def serialize_rows(serializer_class, queryset):
+    """Serializes a queryset through values_list() instead of model instances."""
+    columns, make_encoder = compile_row_encoder(serializer_class)
+    encode = make_encoder()
+    rows = list(queryset.values_list(*columns))
+    with serialization_timer():
+        return [encode(row) for row in rows]
+
+
+class FastListMixin:
+    """
+    Opt-in read path for list views: set `fast_serialization = True` and the
+    unpaginated list is built from values_list() tuples with a precompiled row
+    encoder, skipping model instantiation and per-row ModelSerializer work.
+    The rendered JSON is byte-identical to the ModelSerializer path. Paginated
+    responses (bounded in size) keep using the serializer.
+    """
+    fast_serialization = False
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_serialization:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with serialization_timer():
+                data = self.get_serializer(page, many=True).data
+            return self.get_paginated_response(data)
+
+        return Response(serialize_rows(self.get_serializer_class(), queryset))
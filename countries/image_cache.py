@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .cache import LRUCache, get_data_version
+from .image_generator import render_variant
+from .metrics import registry
+
+# --- Render Cache ---
+# Rendered variants are keyed by (data version, normalized params), so a
+# refresh makes every earlier entry unreachable and they age out of the LRU.
+
+def get_render_cache_setting(name, default):
+    return getattr(settings, 'SUMMARY_IMAGE_RENDER_CACHE', {}).get(name, default)
+
+
+render_cache = LRUCache(
+    get_render_cache_setting('MAX_ENTRIES', 64),
+    get_render_cache_setting('MAX_BYTES', 16 * 1024 * 1024),
+)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'renders': 0,
+    'render_seconds_total': 0.0,
+    'render_seconds_max': 0.0,
+    'coalesced': 0,
+}
+
+
+def get_render_metrics():
+    """Render count/time and cache hit ratio for the on-demand image variants."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = render_cache.hits + render_cache.misses
+    metrics.update(
+        hits=render_cache.hits,
+        misses=render_cache.misses,
+        hit_ratio=render_cache.hits / lookups if lookups else 0.0,
+        entries=len(render_cache),
+    )
+    return metrics
+
+
+def collect_render_metrics():
+    metrics = get_render_metrics()
+    return [
+        ('summary_image_renders_total', 'counter', 'On-demand summary image variants rendered.',
+         [({}, metrics['renders'])]),
+        ('summary_image_render_seconds_total', 'counter', 'Time spent rendering image variants.',
+         [({}, metrics['render_seconds_total'])]),
+        ('summary_image_render_seconds_max', 'gauge', 'Slowest image variant render.',
+         [({}, metrics['render_seconds_max'])]),
+        ('summary_image_coalesced_total', 'counter', 'Requests that shared an identical in-flight render.',
+         [({}, metrics['coalesced'])]),
+        ('summary_image_render_cache_requests_total', 'counter', 'Render cache lookups by result.',
+         [({'result': 'hit'}, metrics['hits']), ({'result': 'miss'}, metrics['misses'])]),
+        ('summary_image_render_cache_entries', 'gauge', 'Rendered variants held in memory.',
+         [({}, metrics['entries'])]),
+    ]
+
+
+registry.add_collector(collect_render_metrics)
+
+
+def _record_render(seconds):
+    with _metrics_lock:
+        _metrics['renders'] += 1
+        _metrics['render_seconds_total'] += seconds
+        _metrics['render_seconds_max'] = max(_metrics['render_seconds_max'], seconds)
+
+
+def get_variant(region=None, top=5, width=500, image_format='png'):
+    """
+    Returns (content_type, content, etag, cache_status) for a summary variant.
+    Concurrent requests for the same uncached variant share a single render.
+    """
+    key = (get_data_version(), (region or '').casefold(), top, width, image_format)
+
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached + ('hit',)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        with _metrics_lock:
+            _metrics['coalesced'] += 1
+        return future.result() + ('coalesced',)
+
+    try:
+        start = time.perf_counter()
+        content_type, content = render_variant(region or None, top, width, image_format)
+        _record_render(time.perf_counter() - start)
+
+        entry = (content_type, content, '"%s"' % hashlib.sha1(content).hexdigest())
+        render_cache.set(key, entry, len(content))
+        future.set_result(entry)
+        return entry + ('miss',)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -1,59 +1,133 @@
+import io
+import os
+import tempfile
+import threading
+from functools import lru_cache
+
+from django.utils import timezone
 from PIL import Image, ImageDraw, ImageFont
-from pathlib import Path
-
-def generate_summary_image(total_countries, top_countries, timestamp):
-    """Generates and saves the summary image."""
-    
-    # 1. Setup
-    WIDTH, HEIGHT = 800, 600
-    BACKGROUND_COLOR = (30, 30, 50)
-    TEXT_COLOR = (255, 255, 255)
-    
-    # Create the cache directory if it doesn't exist
-    cache_dir = Path("cache")
-    cache_dir.mkdir(exist_ok=True)
-    IMAGE_PATH = cache_dir / "summary.png"
-
-    # Define a default font (replace with a proper TTF font path if needed)
+
+from .models import Country, Status, normalize_key
+
+# --- Summary Image (Requires Pillow) ---
+
+IMAGE_DIR = 'cache'
+IMAGE_PATH = os.path.join(IMAGE_DIR, 'summary.png')
+
+FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+CANVAS_SIZE = (500, 450)
+BACKGROUND_COLOR = (240, 240, 240)
+TITLE = "🌐 Country Data Summary"
+
+_write_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_font(size):
+    """Loads (once per size) the TrueType font, falling back to Pillow's default."""
     try:
-        font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf" # Common Linux path
-        font_large = ImageFont.truetype(font_path, 40)
-        font_medium = ImageFont.truetype(font_path, 24)
-        font_small = ImageFont.truetype(font_path, 18)
-    except IOError:
-        # Fallback to default if custom font is not found
-        font_large = ImageFont.load_default()
-        font_medium = ImageFont.load_default()
-        font_small = ImageFont.load_default()
-
-    # 2. Draw
-    img = Image.new('RGB', (WIDTH, HEIGHT), color=BACKGROUND_COLOR)
+        return ImageFont.truetype(FONT_PATH, size)
+    except Exception:
+        # Fallback to the default Pillow font (avoids crash)
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=16)
+def get_base_canvas(size=CANVAS_SIZE):
+    """The static layer (background and title) for a canvas size, rendered once per process."""
+    scale = size[0] / CANVAS_SIZE[0]
+    img = Image.new('RGB', size, color=BACKGROUND_COLOR)
+    d = ImageDraw.Draw(img)
+    d.text((round(20 * scale), round(20 * scale)), TITLE, fill=(0, 0, 128), font=get_font(round(20 * scale)))
+    return img
+
+
+def get_top_countries(limit=5, region=None):
+    """Top countries by GDP (only those with calculated GDP)."""
+    queryset = Country.objects.filter(estimated_gdp__isnull=False)
+    if region:
+        queryset = queryset.filter(region_key=normalize_key(region))
+    return list(queryset.order_by('-estimated_gdp')[:limit].values('name', 'estimated_gdp'))
+
+
+def get_canvas_size(width=CANVAS_SIZE[0], top=5):
+    """Canvas size for a width, growing the height when the top list needs more room."""
+    scale = width / CANVAS_SIZE[0]
+    height = max(CANVAS_SIZE[1], 130 + 40 + top * 30 + 20)
+    return width, round(height * scale)
+
+
+def render_summary_image(total_countries, top_countries, refresh_time, top=5, width=CANVAS_SIZE[0], region=None):
+    """Draws the summary onto a copy of the cached base canvas and returns it."""
+    scale = width / CANVAS_SIZE[0]
+
+    def px(value):
+        return round(value * scale)
+
+    font_large, font_medium = get_font(px(20)), get_font(px(14))
+    img = get_base_canvas(get_canvas_size(width, top)).copy()
     d = ImageDraw.Draw(img)
-    
-    y_offset = 50
-    
-    # Title
-    d.text((50, y_offset), "GDP & Currency Summary", fill=TEXT_COLOR, font=font_large)
-    y_offset += 60
-
-    # Total Countries
-    d.text((50, y_offset), f"Total Cached Countries: {total_countries}", fill=TEXT_COLOR, font=font_medium)
-    y_offset += 40
-
-    # Last Refresh
-    d.text((50, y_offset), f"Last Refresh: {timestamp.strftime('%Y-%m-%d %H:%M:%S %Z')}", fill=TEXT_COLOR, font=font_medium)
-    y_offset += 80
-
-    # Top 5 GDP Title
-    d.text((50, y_offset), "Top 5 Countries by Estimated GDP:", fill=TEXT_COLOR, font=font_medium)
-    y_offset += 40
-    
-    # Top 5 List
+
+    total_label = f"Countries in {region}" if region else "Total Cached Countries"
+    d.text((px(20), px(60)), f"{total_label}: {total_countries:,}", fill=(50, 50, 50), font=font_medium)
+    d.text((px(20), px(85)), f"Last Global Refresh: {refresh_time.strftime('%Y-%m-%d %H:%M:%S UTC')}", fill=(50, 50, 50), font=font_medium)
+
+    y_offset = 130
+    d.text((px(20), px(y_offset)), f"🏆 Top {top} by Estimated GDP (USD):", fill=(0, 0, 0), font=font_large)
+
     for i, country in enumerate(top_countries):
-        gdp_value = f"${country.estimated_gdp:,.2f}" if country.estimated_gdp is not None else "N/A"
-        text = f"{i+1}. {country.name} ({country.currency_code if country.currency_code else 'N/A'}): {gdp_value}"
-        d.text((70, y_offset), text, fill=TEXT_COLOR, font=font_small)
-        y_offset += 30
+        # Format GDP value safely
+        gdp_value = f"{country['estimated_gdp']:,.0f}" if country['estimated_gdp'] is not None else "N/A"
+        text = f"{i+1}. {country['name']}: ${gdp_value}"
+        d.text((px(30), px(y_offset + 40 + i * 30)), text, fill=(0, 0, 0), font=font_medium)
+
+    return img
+
+
+def save_atomically(img, path, format='PNG'):
+    """Writes to a temp file in the same directory, then renames it over `path`."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.summary-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            img.save(f, format=format)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def generate_summary_image(total_countries, refresh_time):
+    """Generates and saves the summary image to cache/summary.png."""
+    img = render_summary_image(total_countries, get_top_countries(), refresh_time)
+    with _write_lock:
+        save_atomically(img, IMAGE_PATH)
+
+
+# --- On-demand Variants ---
+
+IMAGE_FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def render_variant(region=None, top=5, width=CANVAS_SIZE[0], image_format='png'):
+    """Renders a summary variant from the current data and returns (content_type, bytes)."""
+    pil_format, content_type = IMAGE_FORMATS[image_format]
+
+    countries = Country.objects.all()
+    if region:
+        countries = countries.filter(region_key=normalize_key(region))
+    status = Status.objects.filter(pk=1).first()
+    refresh_time = status.last_refreshed_at if status and status.last_refreshed_at else timezone.now()
 
-    # 3. Save
-    img.save(IMAGE_PATH)
\ No newline at end of file
+    img = render_summary_image(
+        countries.count(), get_top_countries(top, region), refresh_time,
+        top=top, width=width, region=region,
+    )
+    buffer = io.BytesIO()
+    img.save(buffer, format=pil_format)
+    return content_type, buffer.getvalue()
@@ -0,0 +1,288 @@
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .exceptions import ExternalApiError
+from .models import RefreshJob, RefreshStage, Status
+from .services import describe_fetch_error, due_stages, expand_stages, refresh_country_data
+
+# --- In-process Worker Pool ---
+# A single worker keeps refreshes strictly serialized within a process; the
+# dedup check in enqueue_refresh() keeps them serialized across processes.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='refresh')
+    return _executor
+
+
+def submit_job(job_id):
+    if getattr(settings, 'REFRESH_JOBS_ALWAYS_EAGER', False):
+        run_refresh_job(job_id)
+    else:
+        get_executor().submit(_run_in_worker, job_id)
+
+
+def _run_in_worker(job_id):
+    # Worker threads own their DB connections; drop them between jobs
+    close_old_connections()
+    try:
+        run_refresh_job(job_id)
+    finally:
+        close_old_connections()
+
+
+# --- Enqueueing ---
+
+def expire_stale_jobs():
+    """Fails active jobs older than REFRESH_JOB_TIMEOUT, e.g. left behind by a crashed worker."""
+    timeout = getattr(settings, 'REFRESH_JOB_TIMEOUT', 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    RefreshJob.objects.filter(
+        state__in=RefreshJob.ACTIVE_STATES, created_at__lt=cutoff
+    ).update(state=RefreshJob.FAILED, error="Job timed out", finished_at=timezone.now())
+
+
+def enqueue_refresh(stages=None):
+    """
+    Returns (job, created). If a refresh covering `stages` (see
+    services.expand_stages; all by default) is already queued or running,
+    that job is returned instead of starting a second one.
+    """
+    stages = expand_stages(stages)
+    with transaction.atomic():
+        # Lock the Status singleton so concurrent enqueuers are serialized
+        Status.objects.select_for_update().get_or_create(pk=1)
+        expire_stale_jobs()
+
+        for job in RefreshJob.objects.filter(state__in=RefreshJob.ACTIVE_STATES):
+            if set(stages) <= set(job.stages or RefreshStage.STAGES):
+                return job, False
+
+        job = RefreshJob.objects.create(stages=stages)
+        transaction.on_commit(lambda: submit_job(job.pk))
+        return job, True
+
+
+# --- Refresh Lease ---
+# Only the holder of the lease on the Status singleton refreshes, so replicas
+# never run overlapping refresh transactions. The lease is taken and renewed
+# with a single conditional UPDATE and lapses on its own after
+# REFRESH_LEASE_SECONDS, so a crashed holder blocks nobody for longer.
+
+class RefreshLeaseError(Exception):
+    """Another process holds the refresh lease, or took it over mid-refresh."""
+
+
+def get_lease_seconds():
+    return getattr(settings, 'REFRESH_LEASE_SECONDS', 300)
+
+
+def make_lease_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_refresh_lease(owner, seconds=None):
+    """Takes or renews the lease for `owner`. Returns False while another holder's lease is live."""
+    now = timezone.now()
+    Status.objects.get_or_create(pk=1)
+    claimed = Status.objects.filter(
+        Q(refresh_lease_owner=None) | Q(refresh_lease_owner=owner) | Q(refresh_lease_expires_at__lt=now),
+        pk=1,
+    ).update(
+        refresh_lease_owner=owner,
+        refresh_lease_expires_at=now + timedelta(seconds=seconds or get_lease_seconds()),
+    )
+    return claimed == 1
+
+
+def renew_refresh_lease(owner, seconds=None):
+    """Extends `owner`'s lease. Returns False if it was released or taken over."""
+    return Status.objects.filter(pk=1, refresh_lease_owner=owner).update(
+        refresh_lease_expires_at=timezone.now() + timedelta(seconds=seconds or get_lease_seconds())
+    ) == 1
+
+
+def release_refresh_lease(owner):
+    Status.objects.filter(pk=1, refresh_lease_owner=owner).update(
+        refresh_lease_owner=None, refresh_lease_expires_at=None
+    )
+
+
+class RefreshLease:
+    def __init__(self, owner, seconds=None):
+        self.owner = owner
+        self.seconds = seconds
+
+    def renew(self):
+        if not renew_refresh_lease(self.owner, self.seconds):
+            raise RefreshLeaseError(f"Refresh lease lost by {self.owner}")
+
+
+@contextmanager
+def refresh_lease(owner=None, seconds=None):
+    """Holds the lease for the enclosed block, raising RefreshLeaseError if another process has it."""
+    lease = RefreshLease(owner or make_lease_owner(), seconds)
+    if not acquire_refresh_lease(lease.owner, seconds):
+        holder, expires_at = Status.objects.filter(pk=1).values_list(
+            'refresh_lease_owner', 'refresh_lease_expires_at'
+        ).first() or (None, None)
+        raise RefreshLeaseError(f"Another refresh is in progress (held by {holder} until {expires_at})")
+    try:
+        yield lease
+    finally:
+        release_refresh_lease(lease.owner)
+
+
+# --- Execution ---
+
+class PhaseRecorder:
+    """
+    Persists the current phase and per-phase durations on the job row, and
+    renews `lease`, if given, at every phase boundary.
+    """
+
+    def __init__(self, job, lease=None):
+        self.job = job
+        self.lease = lease
+        self.phase = None
+        self.started = None
+
+    def _close_phase(self):
+        if self.phase is not None:
+            self.job.timings[self.phase] = round(time.perf_counter() - self.started, 4)
+
+    def __call__(self, phase):
+        if self.lease is not None:
+            self.lease.renew()
+        self._close_phase()
+        self.phase, self.started = phase, time.perf_counter()
+        self.job.phase = phase
+        self.job.save(update_fields=['phase', 'timings'])
+
+    def finish(self):
+        self._close_phase()
+        self.phase = None
+
+
+def run_refresh_job(job_id):
+    job = RefreshJob.objects.get(pk=job_id)
+    job.state = RefreshJob.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['state', 'started_at'])
+
+    recorder = PhaseRecorder(job)
+    try:
+        with refresh_lease() as lease:
+            recorder.lease = lease
+            updated_count, current_time, counts = refresh_country_data(
+                on_phase=recorder, stages=job.stages or None
+            )
+    except RefreshLeaseError as e:
+        job.state = RefreshJob.FAILED
+        job.error = str(e)
+    except ExternalApiError as e:
+        job.state = RefreshJob.FAILED
+        job.error = describe_fetch_error(e)
+    except Exception as e:
+        job.state = RefreshJob.FAILED
+        job.error = f"Internal server error: {e.__class__.__name__}"
+    else:
+        job.state = RefreshJob.SUCCEEDED
+        job.result = {
+            'total_countries': updated_count,
+            'last_refreshed_at': current_time.isoformat(),
+            **counts,
+        }
+
+    recorder.finish()
+    job.phase = None
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+# --- Scheduler ---
+# Used by `manage.py run_refresher`: every replica may run it, and each tick
+# refreshes the due stages only if it can take the lease.
+
+def jittered_delay(interval, jitter, rng=random):
+    """`interval` seconds, randomly stretched or shrunk by up to the `jitter` fraction."""
+    return max(0.0, interval * rng.uniform(1 - jitter, 1 + jitter))
+
+
+class PhaseLogger:
+    """Logs each phase's duration as it closes, renewing the lease at every boundary."""
+
+    def __init__(self, log, lease=None):
+        self.log = log
+        self.lease = lease
+        self.phase = None
+        self.started = None
+
+    def __call__(self, phase):
+        if self.lease is not None:
+            self.lease.renew()
+        self.finish()
+        self.phase, self.started = phase, time.perf_counter()
+
+    def finish(self):
+        if self.phase is not None:
+            self.log(f"  {self.phase}: {time.perf_counter() - self.started:.3f}s")
+            self.phase = None
+
+
+def run_scheduled_refresh(owner, log, stages=None, force=False, lease_seconds=None):
+    """
+    One scheduler tick: refreshes `stages` (by default the due ones, see
+    services.due_stages) while holding the lease as `owner`. Returns the
+    refresh details, or None when nothing was due, another process holds the
+    lease, or every upstream failed.
+    """
+    stages = stages or due_stages()
+    if not stages:
+        log("No stages due")
+        return None
+    stages = expand_stages(stages)
+
+    log(f"Refreshing {', '.join(stages)}")
+    on_phase = PhaseLogger(log)
+    try:
+        with refresh_lease(owner, lease_seconds) as lease:
+            on_phase.lease = lease
+            try:
+                total, _, details = refresh_country_data(on_phase=on_phase, force=force, stages=stages)
+            finally:
+                on_phase.finish()
+    except RefreshLeaseError as e:
+        log(f"Skipped: {e}")
+        return None
+    except ExternalApiError as e:
+        log(f"Failed: {describe_fetch_error(e)}")
+        return None
+
+    outcomes = ', '.join(f"{stage} {outcome}" for stage, outcome in details['stages'].items())
+    log(
+        f"Refreshed {total} countries ({details['inserted']} inserted, {details['updated']} updated): {outcomes}"
+    )
+    for stage, error in details['errors'].items():
+        log(f"  {stage} failed: {error}")
+    return details
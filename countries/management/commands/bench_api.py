@@ -0,0 +1,134 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+from countries.benchmarks import (
+    LIVE_WORKLOADS, benchmark_size, build_workloads, compare_results, load_replay, load_test,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway test database with synthetic countries (via a refresh "
+        "against local upstream fixtures) and reports throughput and p50/p99 per "
+        "workload as JSON. Use --settings=core.settings_bench for SQLite. With "
+        "--url, load-tests a running server instead (e.g. gunicorn core.wsgi vs "
+        "uvicorn core.asgi:application) over --connections concurrent keep-alive "
+        "connections. With --compare, exits non-zero when a workload regressed "
+        "past --threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[250, 10_000, 100_000])
+        parser.add_argument('--requests', type=int, default=200, help="Max timed requests per workload.")
+        parser.add_argument('--max-seconds', type=float, default=5.0, help="Time budget per workload.")
+        parser.add_argument('--refresh-runs', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workload', action='append', dest='workloads',
+                            help="Only run these workloads (repeatable): refresh, replay or "
+                                 + ', '.join(name for name, _ in build_workloads([])))
+        parser.add_argument('--replay', help="JSONL of recorded requests ({method, path, body}) to replay.")
+        parser.add_argument('--response-cache', action='store_true',
+                            help="Keep the versioned response cache on (off by default, so the read path is timed).")
+        parser.add_argument('--url', help="Load-test the (already seeded) server at this base URL.")
+        parser.add_argument('--connections', type=int, default=1000,
+                            help="Concurrent connections for --url.")
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help="Seconds per workload for --url (workloads: " + ', '.join(LIVE_WORKLOADS) + ").")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+        parser.add_argument('--compare', help="Baseline JSON report to check for regressions.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed p50/p99 growth against the baseline, as a fraction.")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            self.stderr.write(f"Load-testing {options['url']} with {options['connections']} connections...")
+            results = load_test(options['url'], options['connections'], options['duration'], options['workloads'])
+        else:
+            results = self.run_in_process(options)
+
+        report = {'meta': self.get_meta(options), 'results': results}
+        for entry in results:
+            scale = entry['rows'] if entry.get('rows') is not None else f"{entry['connections']}c"
+            self.stderr.write(
+                f"{scale:>7} {entry['workload']:<28} {entry['requests']:>6} req "
+                f"{entry['throughput_rps'] or 0:>9.1f} req/s  p50 {entry['p50_ms']:>9.2f}ms  p99 {entry['p99_ms']:>9.2f}ms"
+                + (f"  errors {entry['errors']}" if entry.get('errors') else '')
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                regressions = compare_results(results, json.load(f), options['threshold'])
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stderr.write("No regressions against the baseline.")
+
+    def run_in_process(self, options):
+        replay = load_replay(options['replay']) if options['replay'] else None
+        if options['replay'] and not replay:
+            raise CommandError(f"{options['replay']} has no requests (lines need a 'path')")
+
+        response_cache = dict(getattr(settings, 'RESPONSE_CACHE', {}), ENABLED=options['response_cache'])
+        workdir = tempfile.mkdtemp(prefix='bench-api-')
+        previous_cwd = os.getcwd()
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        results = []
+        try:
+            # The summary image is written relative to the working directory
+            os.chdir(workdir)
+            with override_settings(RESPONSE_CACHE=response_cache):
+                for rows in options['rows']:
+                    self.stderr.write(f"Benchmarking {rows} rows...")
+                    results += benchmark_size(
+                        rows, options['requests'], options['max_seconds'], options['refresh_runs'],
+                        options['seed'], options['workloads'], replay,
+                    )
+        finally:
+            os.chdir(previous_cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        return results
+
+    def get_meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': None if options['url'] else connection.vendor,
+            'target': options['url'],
+            'connections': options['connections'] if options['url'] else None,
+            'platform': platform.platform(),
+            'argv': sys.argv[1:],
+            'rows': options['rows'],
+            'seed': options['seed'],
+            'response_cache': options['response_cache'],
+        }
@@ -0,0 +1,105 @@
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from countries.models import Country
+from countries.views import CountryListView, SORT_OPTIONS
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the first and a deep page of GET /countries in offset and cursor "
+        "mode against synthetic tables of growing size. Seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 300000])
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--sort', choices=sorted(SORT_OPTIONS), default='gdp_desc')
+
+    def handle(self, *args, **options):
+        # Time the database pagination itself: repeats would otherwise be
+        # response cache hits, and snapshot mode would bypass the queries
+        with override_settings(
+            RESPONSE_CACHE=dict(getattr(settings, 'RESPONSE_CACHE', {}), ENABLED=False),
+            COUNTRY_SNAPSHOT_MODE=False,
+        ):
+            self.run(options)
+
+    def run(self, options):
+        for rows in options['rows']:
+            try:
+                with transaction.atomic():
+                    self.seed(rows)
+                    self.report(rows, options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def seed(self, rows):
+        now = datetime.now()
+        batch = []
+        for i in range(rows):
+            # Synthetic historical snapshots: many rows per region/currency, some NULL GDPs
+            batch.append(Country(
+                name=f'Synthetic {i:07d}',
+                population=(i * 7919) % 1000003,
+                currency_code=('NGN', 'EUR', 'USD', 'JPY')[i % 4],
+                region=('Africa', 'Europe', 'Americas', 'Asia')[i % 4],
+                estimated_gdp=None if i % 17 == 0 else Decimal((i * 104729) % 10 ** 9) / 100,
+                last_refreshed_at=now,
+            ))
+            if len(batch) == 5000:
+                Country.objects.bulk_create(batch)
+                batch = []
+        Country.objects.bulk_create(batch)
+
+    def timed_get(self, params, repeat):
+        view = CountryListView.as_view()
+        factory = RequestFactory()
+        best = None
+        for _ in range(repeat):
+            request = factory.get('/countries', params)
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, response.data
+
+    def report(self, rows, options):
+        limit, repeat, sort = options['limit'], options['repeat'], options['sort']
+        deep_offset = max(rows - limit, 0)
+
+        offset_first, _ = self.timed_get({'sort': sort, 'limit': limit, 'offset': 0}, repeat)
+        offset_deep, _ = self.timed_get({'sort': sort, 'limit': limit, 'offset': deep_offset}, repeat)
+
+        cursor_first, _ = self.timed_get({'sort': sort, 'limit': limit}, repeat)
+
+        if deep_offset:
+            # Build a deep cursor from the row just before that offset
+            _, deep_page = self.timed_get({'sort': sort, 'limit': 1, 'offset': deep_offset - 1}, 1)
+            seek_row = Country.objects.get(name=deep_page['results'][0]['name'])
+            paginator = CountryListView.pagination_class()
+            paginator.sort, paginator.field = SORT_OPTIONS[sort], SORT_OPTIONS[sort].lstrip('-')
+            cursor = paginator.encode_cursor(seek_row, reverse=False)
+            cursor_deep, _ = self.timed_get({'sort': sort, 'limit': limit, 'cursor': cursor}, repeat)
+        else:
+            # The whole table fits on the first page
+            cursor_deep = cursor_first
+
+        self.stdout.write(
+            f"rows={rows:>7} sort={sort} limit={limit} | "
+            f"offset first={offset_first * 1000:7.2f}ms deep={offset_deep * 1000:7.2f}ms | "
+            f"cursor first={cursor_first * 1000:7.2f}ms deep={cursor_deep * 1000:7.2f}ms"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from countries.rate_history import compact_rate_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Rolls exchange-rate snapshots older than the retention window into "
+        "daily min/max/avg aggregates and deletes the raw rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=None,
+            help="Override RATE_SNAPSHOT_RETENTION_DAYS for this run.",
+        )
+
+    def handle(self, *args, **options):
+        compacted = compact_rate_snapshots(options['retention_days'])
+        self.stdout.write(f"Compacted {compacted} rate snapshots.")
@@ -0,0 +1,79 @@
+import random
+import signal
+import threading
+import traceback
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from countries.jobs import get_lease_seconds, jittered_delay, make_lease_owner, run_scheduled_refresh
+from countries.models import RefreshStage
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs refreshes on a schedule. Every --interval seconds (with --jitter), "
+        "refreshes the stages that are due per REFRESH_STAGE_INTERVALS. Safe to "
+        "run on every replica: a lease on the Status row lets only one of them "
+        "refresh at a time, and it lapses after --lease seconds if its holder "
+        "dies. Logs per-phase durations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between ticks (default REFRESH_SCHEDULER_INTERVAL).")
+        parser.add_argument('--jitter', type=float, default=None,
+                            help="Random spread of each wait, as a fraction of the interval "
+                                 "(default REFRESH_SCHEDULER_JITTER).")
+        parser.add_argument('--lease', type=float, default=None,
+                            help="Lease duration in seconds (default REFRESH_LEASE_SECONDS).")
+        parser.add_argument('--stage', action='append', dest='stages', choices=RefreshStage.STAGES,
+                            help="Refresh these stages on every tick instead of the due ones (repeatable).")
+        parser.add_argument('--force', action='store_true', help="Reprocess unchanged upstream data.")
+        parser.add_argument('--once', action='store_true', help="Run a single tick and exit.")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or getattr(settings, 'REFRESH_SCHEDULER_INTERVAL', 60)
+        jitter = options['jitter'] if options['jitter'] is not None else \
+            getattr(settings, 'REFRESH_SCHEDULER_JITTER', 0.1)
+        lease_seconds = options['lease'] or get_lease_seconds()
+        if not 0 <= jitter < 1:
+            raise CommandError("--jitter must be a fraction in [0, 1)")
+
+        self.stopping = threading.Event()
+        if not options['once']:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, self.stop)
+
+        owner = make_lease_owner()
+        self.log(f"Refresher {owner} started (interval {interval}s, jitter {jitter:.0%}, lease {lease_seconds}s)")
+        if not options['once']:
+            # Replicas started together spread out before their first tick
+            self.stopping.wait(random.uniform(0, interval * jitter))
+
+        while not self.stopping.is_set():
+            # A long-running process must not hold on to broken or stale connections
+            close_old_connections()
+            try:
+                run_scheduled_refresh(
+                    owner, self.log, options['stages'], options['force'], lease_seconds
+                )
+            except Exception:
+                # Keep the daemon alive; the next tick retries
+                self.log("Refresh crashed:\n" + traceback.format_exc())
+            finally:
+                close_old_connections()
+            if options['once']:
+                break
+            self.stopping.wait(jittered_delay(interval, jitter))
+
+        self.log(f"Refresher {owner} stopped")
+
+    def stop(self, signum, frame):
+        self.log("Stopping after the current tick")
+        self.stopping.set()
+
+    def log(self, message):
+        self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} {message}")
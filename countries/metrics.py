@@ -0,0 +1,225 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- Metrics Registry ---
+# A small, dependency-free subset of the Prometheus data model: labelled
+# counters and histograms kept in process memory, plus collectors that
+# report other modules' counters at scrape time. Exposed by GET /metrics.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       format_labels(self.labelnames, labels, [('le', format_value(float(bound)))]),
+                       cumulative)
+            yield f'{self.name}_sum', format_labels(self.labelnames, labels), total
+            yield f'{self.name}_count', format_labels(self.labelnames, labels), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """`collector()` returns (name, type, help, [(labels dict, value)]) tuples at scrape time."""
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        """The registry in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        for collector in self.collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'http_request_duration_seconds', 'Request latency by view route.',
+    ['view', 'method', 'status'],
+))
+REQUEST_QUERIES = registry.register(Histogram(
+    'http_request_db_queries', 'Database queries per request.',
+    ['view'], QUERY_COUNT_BUCKETS,
+))
+REQUEST_DB_TIME = registry.register(Histogram(
+    'http_request_db_seconds', 'Time spent executing database queries per request.',
+    ['view'],
+))
+REQUEST_SERIALIZATION = registry.register(Histogram(
+    'http_request_serialization_seconds', 'Time spent serializing and rendering the response body.',
+    ['view'],
+))
+RESPONSE_SIZE = registry.register(Histogram(
+    'http_response_size_bytes', 'Response body size (non-streaming responses).',
+    ['view'], SIZE_BUCKETS,
+))
+REFRESH_PHASE = registry.register(Histogram(
+    'refresh_phase_duration_seconds',
+    'Refresh phase durations: fetch, transform, process (DB write) and image (render).',
+    ['phase'], PHASE_BUCKETS,
+))
+
+
+# --- Per-request Accounting ---
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'serialization_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+
+current_stats = ContextVar('countries_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection: counts queries against the
+    current request, if any. It reads the request from the context rather
+    than being scoped to one connection, because the async ORM runs queries
+    on a worker thread's connection; sync_to_async carries the context there.
+    """
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_seconds += time.perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver for record_query()."""
+    if record_query not in connection.execute_wrappers:
+        # Outermost, and below any execute_wrapper() block already open
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def serialization_timer():
+    """Adds the enclosed time to the current request's serialization total, if any."""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization_seconds += time.perf_counter() - start
+
+
+# --- Refresh Phases ---
+
+class PhaseTimer:
+    """
+    Wraps a refresh's `on_phase` callback: passes each phase through and
+    records how long the previous one took. finish() closes the last phase.
+    """
+
+    def __init__(self, on_phase=None):
+        self.on_phase = on_phase or (lambda phase: None)
+        self.phase = None
+        self.started = None
+
+    def finish(self):
+        if self.phase is not None:
+            REFRESH_PHASE.observe(time.perf_counter() - self.started, self.phase)
+            self.phase = None
+
+    def __call__(self, phase):
+        self.finish()
+        self.phase, self.started = phase, time.perf_counter()
+        self.on_phase(phase)
@@ -0,0 +1,77 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import (
+    REQUEST_DB_TIME, REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_SERIALIZATION, RESPONSE_SIZE,
+    RequestStats, current_stats,
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, database query count/time, serialization time and
+    response size per view. Views are labelled by their URL route (e.g.
+    'countries/<str:name>') so label cardinality stays bounded. Register it
+    first in MIDDLEWARE so the timings cover the rest of the stack. Works in
+    both handler modes, so it adds no thread hop of its own under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.route if match is not None else 'unmatched'
+        REQUEST_LATENCY.observe(elapsed, view, request.method, response.status_code)
+        REQUEST_QUERIES.observe(stats.queries, view)
+        REQUEST_DB_TIME.observe(stats.db_seconds, view)
+        REQUEST_SERIALIZATION.observe(stats.serialization_seconds, view)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), view)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (serialized to bytes) right after this hook
+        stats = current_stats.get()
+        if stats is not None and not response.is_rendered:
+            start = time.perf_counter()
+
+            def record_render(rendered):
+                stats.serialization_seconds += time.perf_counter() - start
+
+            response.add_post_render_callback(record_render)
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        # The async handler would run a sync hook through a thread
+        return RequestMetricsMiddleware.process_template_response(self, request, response)
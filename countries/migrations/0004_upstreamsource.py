@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0003_refreshjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpstreamSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=255, null=True)),
+                ('last_modified', models.CharField(blank=True, max_length=64, null=True)),
+                ('content_hash', models.CharField(blank=True, max_length=64, null=True)),
+                ('last_fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('last_changed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
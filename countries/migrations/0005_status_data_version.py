@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0004_upstreamsource'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='status',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0005_status_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='status',
+            name='data_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0006_status_data_changed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateDailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=3)),
+                ('day', models.DateField()),
+                ('min_rate', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('max_rate', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('rate_sum', models.DecimalField(decimal_places=6, max_digits=24)),
+                ('samples', models.PositiveIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency_code', 'day'), name='rateagg_currency_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=3)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('taken_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['currency_code', 'taken_at'], name='ratesnap_currency_taken')],
+            },
+        ),
+    ]
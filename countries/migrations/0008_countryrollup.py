@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0007_rate_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('region', 'Region'), ('currency', 'Currency')], max_length=16)),
+                ('key', models.CharField(blank=True, max_length=100, null=True)),
+                ('countries', models.PositiveIntegerField()),
+                ('total_population', models.BigIntegerField()),
+                ('countries_with_gdp', models.PositiveIntegerField()),
+                ('total_gdp', models.DecimalField(blank=True, decimal_places=2, max_digits=30, null=True)),
+                ('avg_gdp', models.DecimalField(blank=True, decimal_places=2, max_digits=25, null=True)),
+                ('median_gdp', models.DecimalField(blank=True, decimal_places=2, max_digits=25, null=True)),
+                ('top_countries', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['dimension', 'key'],
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key'), name='rollup_dimension_key')],
+            },
+        ),
+    ]
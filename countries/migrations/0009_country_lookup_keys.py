@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+def backfill_keys(apps, schema_editor):
+    # Historical models don't carry Country.set_keys(), so normalize inline
+    Country = apps.get_model('countries', 'Country')
+    countries = list(Country.objects.only('id', 'name', 'region', 'currency_code'))
+    for country in countries:
+        country.name_key = country.name.casefold()
+        country.region_key = country.region.casefold() if country.region else None
+        country.currency_key = country.currency_code.casefold() if country.currency_code else None
+    Country.objects.bulk_update(countries, ['name_key', 'region_key', 'currency_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0008_countryrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='region_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='currency_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=3, null=True),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='country',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='country',
+            name='region',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0009_country_lookup_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='country',
+            name='currency_key',
+            field=models.CharField(blank=True, editable=False, max_length=3, null=True),
+        ),
+        migrations.AlterField(
+            model_name='country',
+            name='region_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['region_key', 'estimated_gdp'], name='country_region_gdp'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['region_key', 'population'], name='country_region_population'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['region_key', 'name'], name='country_region_name'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['currency_key', 'estimated_gdp'], name='country_currency_gdp'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['currency_key', 'population'], name='country_currency_population'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['currency_key', 'name'], name='country_currency_name'),
+        ),
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['population'], name='country_population'),
+        ),
+    ]
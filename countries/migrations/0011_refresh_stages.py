@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0010_country_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('last_attempted_at', models.DateTimeField(blank=True, null=True)),
+                ('last_succeeded_at', models.DateTimeField(blank=True, null=True)),
+                ('last_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='refreshjob',
+            name='stages',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
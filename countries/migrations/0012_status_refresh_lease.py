@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries', '0011_refresh_stages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='status',
+            name='refresh_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='status',
+            name='refresh_lease_owner',
+            field=models.CharField(blank=True, max_length=128, null=True),
+        ),
+    ]
@@ -1,9 +1,16 @@
+import uuid
 from django.db import models
 
 class Status(models.Model):
     """Stores global status information, ensuring only one record exists."""
     total_countries = models.IntegerField(default=0)
     last_refreshed_at = models.DateTimeField(null=True, blank=True)
+    # Bumped whenever Country/Status data changes; keys the response caches
+    data_version = models.PositiveBigIntegerField(default=0)
+    data_changed_at = models.DateTimeField(null=True, blank=True)
+    # Refresh lease (see jobs.refresh_lease): at most one process refreshes at a time
+    refresh_lease_owner = models.CharField(max_length=128, null=True, blank=True)
+    refresh_lease_expires_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         verbose_name_plural = "Status"
@@ -13,6 +20,38 @@ class Status(models.Model):
         self.pk = 1
         super().save(*args, **kwargs)
 
+def normalize_key(value):
+    """Case-folded lookup key for name/region/currency (None stays None)."""
+    return value.casefold() if value else None
+
+
+# Source column -> normalized, indexed lookup column
+COUNTRY_KEY_FIELDS = {
+    'name': 'name_key',
+    'region': 'region_key',
+    'currency_code': 'currency_key',
+}
+
+
+class CountryQuerySet(models.QuerySet):
+    """Keeps the normalized key columns in step on bulk writes, which skip save()."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_keys()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        key_fields = [COUNTRY_KEY_FIELDS[f] for f in fields if f in COUNTRY_KEY_FIELDS]
+        if key_fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.set_keys()
+            fields = list(fields) + [f for f in key_fields if f not in fields]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Country(models.Model):
     """Cached country data with computed estimated_gdp."""
     # Required Fields
@@ -26,12 +65,165 @@ class Country(models.Model):
     
     # Optional Fields
     capital = models.CharField(max_length=255, null=True, blank=True)
-    region = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    region = models.CharField(max_length=100, null=True, blank=True)
     flag_url = models.URLField(max_length=512, null=True, blank=True)
     
     # Timestamp
     last_refreshed_at = models.DateTimeField() # Note: Set manually on refresh
 
+    # Normalized lookup keys (see normalize_key), written with the row. Exact
+    # matches on these use their indexes under any database collation, where
+    # name__iexact & co. compile to UPPER()/LIKE comparisons that may not.
+    name_key = models.CharField(max_length=255, unique=True, editable=False)
+    region_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    currency_key = models.CharField(max_length=3, null=True, blank=True, editable=False)
+
+    objects = CountryQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
-        verbose_name_plural = "Countries"
\ No newline at end of file
+        verbose_name_plural = "Countries"
+        # One (filter, sort) index per list/image access pattern: a region or
+        # currency filter followed by each sortable column. InnoDB and SQLite
+        # append the pk to every secondary index, so the (sort key, pk) keyset
+        # order is read straight off the index. These also serve the filters
+        # on their own, so the key columns need no single-column indexes.
+        indexes = [
+            models.Index(fields=['region_key', 'estimated_gdp'], name='country_region_gdp'),
+            models.Index(fields=['region_key', 'population'], name='country_region_population'),
+            models.Index(fields=['region_key', 'name'], name='country_region_name'),
+            models.Index(fields=['currency_key', 'estimated_gdp'], name='country_currency_gdp'),
+            models.Index(fields=['currency_key', 'population'], name='country_currency_population'),
+            models.Index(fields=['currency_key', 'name'], name='country_currency_name'),
+            models.Index(fields=['population'], name='country_population'),
+        ]
+
+    def set_keys(self):
+        for field, key_field in COUNTRY_KEY_FIELDS.items():
+            setattr(self, key_field, normalize_key(getattr(self, field)))
+
+    def save(self, *args, **kwargs):
+        self.set_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                COUNTRY_KEY_FIELDS[f] for f in update_fields if f in COUNTRY_KEY_FIELDS
+            }
+        super().save(*args, **kwargs)
+
+class UpstreamSource(models.Model):
+    """HTTP validators and content hash of the last processed payload per upstream."""
+    name = models.CharField(max_length=32, unique=True) # key in upstream.SOURCES
+    etag = models.CharField(max_length=255, null=True, blank=True)
+    last_modified = models.CharField(max_length=64, null=True, blank=True) # raw header value
+    content_hash = models.CharField(max_length=64, null=True, blank=True) # sha256 hex
+    last_fetched_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True)
+
+    def validators(self):
+        return {
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'content_hash': self.content_hash,
+        }
+
+
+class RefreshStage(models.Model):
+    """Freshness of one refresh stage; the upstream stages share their name with upstream.SOURCES."""
+    COUNTRIES = 'countries'
+    RATES = 'rates'
+    GDP = 'gdp'
+    IMAGE = 'image'
+    STAGES = (COUNTRIES, RATES, GDP, IMAGE) # pipeline order
+
+    name = models.CharField(max_length=32, unique=True)
+    last_attempted_at = models.DateTimeField(null=True, blank=True)
+    last_succeeded_at = models.DateTimeField(null=True, blank=True)
+    last_changed_at = models.DateTimeField(null=True, blank=True) # last run that wrote data
+    last_error = models.TextField(null=True, blank=True) # set while the latest attempt failed
+
+
+class RefreshJob(models.Model):
+    """A queued or finished background refresh, polled via /countries/refresh/<job_id>."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATES = (QUEUED, RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    state = models.CharField(max_length=16, choices=STATE_CHOICES, default=QUEUED, db_index=True)
+    phase = models.CharField(max_length=32, null=True, blank=True)
+    stages = models.JSONField(default=list, blank=True) # requested stages; empty means all
+    timings = models.JSONField(default=dict, blank=True) # phase -> seconds
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class RateSnapshot(models.Model):
+    """One USD-based exchange rate per currency per refresh (append-only)."""
+    currency_code = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=18, decimal_places=6)
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['currency_code', 'taken_at'], name='ratesnap_currency_taken'),
+        ]
+
+
+class RateDailyAggregate(models.Model):
+    """Daily min/max/avg of compacted RateSnapshot rows."""
+    currency_code = models.CharField(max_length=3)
+    day = models.DateField()
+    min_rate = models.DecimalField(max_digits=18, decimal_places=6)
+    max_rate = models.DecimalField(max_digits=18, decimal_places=6)
+    # Sum and count rather than a stored average, so later compactions merge exactly
+    rate_sum = models.DecimalField(max_digits=24, decimal_places=6)
+    samples = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency_code', 'day'], name='rateagg_currency_day'),
+        ]
+
+    @property
+    def avg_rate(self):
+        return self.rate_sum / self.samples
+
+
+class CountryRollup(models.Model):
+    """Per-region / per-currency aggregates, rebuilt in the refresh transaction."""
+    REGION = 'region'
+    CURRENCY = 'currency'
+    DIMENSION_CHOICES = [(REGION, 'Region'), (CURRENCY, 'Currency')]
+
+    dimension = models.CharField(max_length=16, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=100, null=True, blank=True) # NULL groups countries without one
+    countries = models.PositiveIntegerField()
+    total_population = models.BigIntegerField()
+    countries_with_gdp = models.PositiveIntegerField()
+    total_gdp = models.DecimalField(max_digits=30, decimal_places=2, null=True, blank=True)
+    avg_gdp = models.DecimalField(max_digits=25, decimal_places=2, null=True, blank=True)
+    median_gdp = models.DecimalField(max_digits=25, decimal_places=2, null=True, blank=True)
+    top_countries = models.JSONField(default=list) # [{name, estimated_gdp}] by GDP, descending
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['dimension', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='rollup_dimension_key'),
+        ]
@@ -0,0 +1,229 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import Country
+
+
+KeysetSegment = namedtuple('KeysetSegment', ['nulls', 'where', 'order_by', 'seek'])
+
+
+def keyset_order_by(model, ordering):
+    """
+    order_by() arguments for `ordering` in the order keyset_segments() walks:
+    NULLs last in either direction, ties (and the NULL block) by pk in the
+    key's direction. Unpaginated, offset and cursor pages all use this order.
+    """
+    field = ordering.lstrip('-')
+    desc = ordering.startswith('-')
+    key = ordering
+    if model._meta.get_field(field).null:
+        key = F(field).desc(nulls_last=True) if desc else F(field).asc(nulls_last=True)
+    return key, '-pk' if desc else 'pk'
+
+
+def keyset_segments(model, ordering, reverse=False):
+    """
+    Builds a keyset walk for an order_by string such as '-estimated_gdp'.
+    Ties are broken on pk in the key's direction and NULLs sort last (first
+    when walking in reverse). A nullable key is walked as two segments, the
+    non-NULL rows then the NULL block, each a plain (key, pk) index range:
+    NULLS LAST in a single ORDER BY is emulated on MySQL as `key IS NULL, key`
+    and always needs a filesort. Each segment's seek(value, pk) is the Q for
+    rows after that position within the segment.
+    """
+    field = ordering.lstrip('-')
+    nullable = model._meta.get_field(field).null
+
+    # Walking backwards flips every direction, including NULL placement
+    desc = ordering.startswith('-') != reverse
+    op = 'lt' if desc else 'gt'
+    tie_breaker = '-pk' if desc else 'pk'
+
+    def seek_values(value, pk):
+        # A sargable range on the key, narrowed to the rows after `pk` on ties
+        return Q(**{f'{field}__{op}e': value}) & (Q(**{f'{field}__{op}': value}) | Q(**{f'pk__{op}': pk}))
+
+    def seek_nulls(value, pk):
+        return Q(**{f'pk__{op}': pk})
+
+    values = KeysetSegment(
+        False,
+        Q(**{f'{field}__isnull': False}) if nullable else Q(),
+        (f'-{field}' if desc else field, tie_breaker),
+        seek_values,
+    )
+    if not nullable:
+        return [values]
+    nulls = KeysetSegment(True, Q(**{f'{field}__isnull': True}), (tie_breaker,), seek_nulls)
+    return [nulls, values] if reverse else [values, nulls]
+
+
+def keyset_slice(queryset, segments, position, limit):
+    """
+    Returns up to `limit` rows after `position` ((sort value, pk), or None for
+    the start) across the walk's segments in order, one query per segment
+    visited.
+    """
+    rows = []
+    in_nulls = position is not None and position[0] is None
+    reached = position is None
+    for segment in segments:
+        chunk = queryset.filter(segment.where)
+        if not reached:
+            if segment.nulls != in_nulls:
+                continue
+            reached = True
+            chunk = chunk.filter(segment.seek(*position))
+        rows.extend(chunk.order_by(*segment.order_by)[:limit - len(rows)])
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+class CountryPagination(LimitOffsetPagination):
+    """
+    Opt-in pagination for GET /countries.
+
+    * no paging params: the full, unpaginated list (backwards compatible)
+    * `offset` (with optional `limit`): classic LIMIT/OFFSET pages with a count
+    * `limit` and/or `cursor`: keyset pages that seek on (sort key, id), so
+      page N costs the same as page 1 regardless of table size
+
+    The view must provide `get_ordering_field()` returning the order_by string
+    for the requested sort (e.g. '-estimated_gdp').
+    """
+    max_limit = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        params = request.query_params
+        self.mode = None
+
+        if self.offset_query_param in params:
+            self.mode = 'offset'
+            return super().paginate_queryset(queryset, request, view)
+        if self.limit_query_param in params or self.cursor_query_param in params:
+            self.mode = 'cursor'
+            return self.paginate_keyset(queryset, request, view)
+        return None
+
+    def get_paginated_response(self, data):
+        if self.mode == 'offset':
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    # --- Keyset mode ---
+
+    def paginate_keyset(self, queryset, request, view):
+        segments, position, reverse = self.start_keyset(queryset, request, view)
+        # Fetch one extra row to learn whether another page exists
+        rows = keyset_slice(queryset, segments, position, self.limit + 1)
+        return self.finish_keyset(rows, position, reverse)
+
+    def start_keyset(self, queryset, request, view):
+        """Returns the walk's (segments, position, reverse) for this request."""
+        position, reverse = self.prepare_keyset(request, view)
+        return keyset_segments(queryset.model, self.sort, reverse), position, reverse
+
+    def prepare_keyset(self, request, view):
+        """Reads the page size, sort and cursor; returns (position, reverse)."""
+        self.limit = self.get_limit(request)
+        ordering = view.get_ordering_field()
+        self.sort = ordering
+        self.field = ordering.lstrip('-')
+        self.model_field = Country._meta.get_field(self.field)
+        return self.decode_cursor(request)
+
+    def paginate_snapshot(self, selection, request, view):
+        """
+        paginate_queryset() over a snapshot.Selection, with the same modes and
+        pages. Raises snapshot.StaleCursor when the cursor's row has changed
+        since; the database can still seek to it.
+        """
+        self.request = request
+        params = request.query_params
+        self.mode = None
+
+        if self.offset_query_param in params:
+            self.mode = 'offset'
+            return super().paginate_queryset(selection.rows, request, view)
+        if self.limit_query_param in params or self.cursor_query_param in params:
+            self.mode = 'cursor'
+            position, reverse = self.prepare_keyset(request, view)
+            rows = selection.keyset_slice(self.field, position, reverse, self.limit + 1)
+            return self.finish_keyset(rows, position, reverse)
+        return None
+
+    def finish_keyset(self, rows, position, reverse):
+        """Trims the look-ahead row off `rows` and records the page's links."""
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        self.first = rows[0] if rows else None
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        payload = {
+            's': self.sort,
+            'v': None if value is None else str(value),
+            'id': row.pk,
+            'r': reverse,
+        }
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return token.decode('ascii')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            if payload['s'] != self.sort:
+                raise ValueError("cursor belongs to a different sort")
+            # A tampered value would otherwise fail while building the seek filter
+            value = self.model_field.to_python(payload['v'])
+            return (value, int(payload['id'])), bool(payload['r'])
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _cursor_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_next_link(self):
+        if self.mode == 'offset':
+            return super().get_next_link()
+        if not self.has_next or self.last is None:
+            return None
+        return self._cursor_link(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if self.mode == 'offset':
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._cursor_link(self.first, reverse=True)
@@ -0,0 +1,170 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from .models import RateDailyAggregate, RateSnapshot
+from .transforms import RATE_QUANTUM
+
+# --- Recording ---
+
+def record_rate_snapshots(exchange_rates, taken_at, batch_size=None):
+    """Appends one RateSnapshot per currency in the open.er-api rate table."""
+    batch_size = batch_size or getattr(settings, 'COUNTRY_UPSERT_BATCH_SIZE', 500)
+    snapshots = []
+    for currency_code, rate in exchange_rates.items():
+        try:
+            rate = Decimal(str(rate)).quantize(RATE_QUANTUM)
+        except (InvalidOperation, ValueError):
+            continue
+        if len(currency_code) == 3 and rate > 0:
+            snapshots.append(RateSnapshot(currency_code=currency_code, rate=rate, taken_at=taken_at))
+    RateSnapshot.objects.bulk_create(snapshots, batch_size=batch_size)
+    return len(snapshots)
+
+
+# --- Retention / Compaction ---
+
+def compact_rate_snapshots(retention_days=None, now=None):
+    """
+    Rolls raw snapshots from days older than `retention_days` (default
+    RATE_SNAPSHOT_RETENTION_DAYS) into RateDailyAggregate rows, then deletes
+    them. Aggregates older than RATE_AGGREGATE_RETENTION_DAYS, when set, are
+    dropped. Returns the number of raw snapshots compacted.
+    """
+    if retention_days is None:
+        retention_days = getattr(settings, 'RATE_SNAPSHOT_RETENTION_DAYS', 7)
+    now = now or timezone.now()
+    cutoff_day = (now - timedelta(days=retention_days)).astimezone(dt_timezone.utc).date()
+    cutoff = datetime.combine(cutoff_day, time.min, tzinfo=dt_timezone.utc)
+
+    with transaction.atomic():
+        old = RateSnapshot.objects.filter(taken_at__lt=cutoff)
+        # The newest refresh always stays raw: it backs the conversion rate table
+        latest = RateSnapshot.objects.aggregate(latest=Max('taken_at'))['latest']
+        if latest is not None:
+            old = old.exclude(taken_at=latest)
+        daily = (
+            old.annotate(day=TruncDate('taken_at', tzinfo=dt_timezone.utc))
+            .values('currency_code', 'day')
+            .annotate(min_rate=Min('rate'), max_rate=Max('rate'), rate_sum=Sum('rate'), samples=Count('id'))
+        )
+        daily = {(row['currency_code'], row['day']): row for row in daily}
+
+        compacted = 0
+        if daily:
+            existing = {
+                (agg.currency_code, agg.day): agg
+                for agg in RateDailyAggregate.objects.filter(
+                    day__in={day for _, day in daily},
+                    currency_code__in={code for code, _ in daily},
+                )
+            }
+            to_create, to_update = [], []
+            for key, row in daily.items():
+                compacted += row['samples']
+                agg = existing.get(key)
+                if agg is None:
+                    to_create.append(RateDailyAggregate(
+                        currency_code=key[0], day=key[1], min_rate=row['min_rate'],
+                        max_rate=row['max_rate'], rate_sum=row['rate_sum'], samples=row['samples'],
+                    ))
+                    continue
+                # A day compacted before (e.g. after a retention change) is merged exactly
+                agg.min_rate = min(agg.min_rate, row['min_rate'])
+                agg.max_rate = max(agg.max_rate, row['max_rate'])
+                agg.rate_sum += row['rate_sum']
+                agg.samples += row['samples']
+                to_update.append(agg)
+
+            RateDailyAggregate.objects.bulk_create(to_create)
+            RateDailyAggregate.objects.bulk_update(to_update, ['min_rate', 'max_rate', 'rate_sum', 'samples'])
+            old.delete()
+
+        aggregate_days = getattr(settings, 'RATE_AGGREGATE_RETENTION_DAYS', None)
+        if aggregate_days is not None:
+            RateDailyAggregate.objects.filter(
+                day__lt=(now - timedelta(days=aggregate_days)).date()
+            ).delete()
+
+    return compacted
+
+
+# --- History Queries ---
+
+RESAMPLE_KINDS = ('hour', 'day', 'week')
+
+
+def truncate_day(day, kind):
+    """Bucket start for a compacted day; daily data cannot be split into hours."""
+    if kind == 'week':
+        day = day - timedelta(days=day.weekday())
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def format_rate(value):
+    return str(Decimal(value).quantize(RATE_QUANTUM))
+
+
+def get_rate_history(currency_code, start, end, resample=None):
+    """
+    Returns history points for a currency between `start` and `end`
+    (inclusive, aware datetimes), merging raw snapshots with compacted daily
+    aggregates. Without `resample` each raw snapshot is a point
+    ({t, rate}); compacted days contribute their average. With `resample`
+    ('hour', 'day' or 'week') points are {t, min, max, avg, samples} buckets
+    computed by the database.
+    """
+    raw = RateSnapshot.objects.filter(
+        currency_code=currency_code, taken_at__gte=start, taken_at__lte=end
+    )
+    aggregates = RateDailyAggregate.objects.filter(
+        currency_code=currency_code,
+        day__gte=start.astimezone(dt_timezone.utc).date(),
+        day__lte=end.astimezone(dt_timezone.utc).date(),
+    )
+
+    if resample is None:
+        points = [
+            (truncate_day(agg.day, 'day'), agg.avg_rate) for agg in aggregates
+        ] + list(raw.order_by('taken_at').values_list('taken_at', 'rate'))
+        points.sort(key=lambda point: point[0])
+        return [{'t': t.isoformat(), 'rate': format_rate(rate)} for t, rate in points]
+
+    buckets = {}
+
+    def merge(bucket, low, high, total, samples):
+        current = buckets.get(bucket)
+        if current is None:
+            buckets[bucket] = [low, high, total, samples]
+        else:
+            current[0] = min(current[0], low)
+            current[1] = max(current[1], high)
+            current[2] += total
+            current[3] += samples
+
+    raw_buckets = (
+        raw.annotate(bucket=Trunc('taken_at', resample, tzinfo=dt_timezone.utc))
+        .values('bucket')
+        .annotate(low=Min('rate'), high=Max('rate'), total=Sum('rate'), samples=Count('id'))
+        .order_by('bucket')
+    )
+    for row in raw_buckets:
+        merge(row['bucket'], row['low'], row['high'], row['total'], row['samples'])
+    for agg in aggregates:
+        merge(truncate_day(agg.day, resample), agg.min_rate, agg.max_rate, agg.rate_sum, agg.samples)
+
+    return [
+        {
+            't': bucket.isoformat(),
+            'min': format_rate(low),
+            'max': format_rate(high),
+            'avg': format_rate(total / samples),
+            'samples': samples,
+        }
+        for bucket, (low, high, total, samples) in sorted(buckets.items())
+    ]
@@ -0,0 +1,110 @@
+import threading
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from types import MappingProxyType
+
+from django.db.models import Max
+
+from .cache import get_data_version
+from .models import RateSnapshot
+from .transforms import RATE_QUANTUM
+
+# --- In-memory Rate Table ---
+# Conversions are answered from an immutable, process-local table. A refresh
+# publishes a new table after it commits; other worker processes notice the
+# data version change and reload the newest snapshot set once.
+
+AMOUNT_QUANTUM = RATE_QUANTUM
+
+
+class ConversionError(Exception):
+    """Raised for an unknown currency or an unparsable or out-of-range amount."""
+
+
+class RateTable:
+    """Immutable USD-based rate table; cross rates are computed with Decimal."""
+
+    def __init__(self, rates, taken_at=None, version=None):
+        table = {}
+        for currency_code, rate in rates.items():
+            try:
+                # Same precision as the stored snapshots, so every process agrees
+                rate = Decimal(str(rate)).quantize(RATE_QUANTUM)
+            except (InvalidOperation, ValueError):
+                continue
+            if rate > 0:
+                table[currency_code.upper()] = rate
+        self.rates = MappingProxyType(table)
+        self.taken_at = taken_at
+        self.version = version
+        # Memo of (source, target) -> cross rate; entries are idempotent, so
+        # concurrent readers may race on a write without harm
+        self._cross = {}
+
+    def __len__(self):
+        return len(self.rates)
+
+    def cross_rate(self, source, target):
+        """Units of `target` per unit of `source`."""
+        key = (source, target)
+        rate = self._cross.get(key)
+        if rate is None:
+            try:
+                rate = self.rates[target] / self.rates[source]
+            except KeyError as e:
+                raise ConversionError(f"Unknown currency code: {e.args[0]}")
+            self._cross[key] = rate
+        return rate
+
+    def convert(self, source, target, amount):
+        """Returns (cross rate, converted amount) for a Decimal-parsable amount."""
+        rate = self.cross_rate(source.upper(), target.upper())
+        try:
+            amount = Decimal(str(amount))
+        except (InvalidOperation, ValueError):
+            raise ConversionError("Amount must be a decimal number")
+        if not amount.is_finite():
+            raise ConversionError("Amount must be a decimal number")
+        try:
+            # quantize() fails once the result needs more digits than the context precision
+            return rate, (amount * rate).quantize(AMOUNT_QUANTUM, rounding=ROUND_HALF_EVEN)
+        except InvalidOperation:
+            raise ConversionError("Amount out of range")
+
+
+_table = None
+_load_lock = threading.Lock()
+
+
+def load_rate_table(version=None):
+    """Builds a table from the newest set of RateSnapshot rows."""
+    taken_at = RateSnapshot.objects.aggregate(latest=Max('taken_at'))['latest']
+    rates = {}
+    if taken_at is not None:
+        rates = dict(
+            RateSnapshot.objects.filter(taken_at=taken_at).values_list('currency_code', 'rate')
+        )
+    return RateTable(rates, taken_at, version)
+
+
+def get_rate_table():
+    """Returns the current table, reloading it only when the data version moved."""
+    global _table
+    version = get_data_version()
+    table = _table
+    if table is None or table.version != version:
+        with _load_lock:
+            table = _table
+            if table is None or table.version != version:
+                table = _table = load_rate_table(version)
+    return table
+
+
+def publish_rate_table(rates, taken_at, version=None):
+    """
+    Swaps in a table built from a refresh's rates (call after it commits).
+    Pass the data version the refresh committed; it defaults to the current one.
+    """
+    global _table
+    if version is None:
+        version = get_data_version()
+    _table = RateTable(rates, taken_at, version)
@@ -0,0 +1,131 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import COUNTRY_KEY_FIELDS, Country, CountryRollup, normalize_key
+from .transforms import GDP_QUANTUM
+
+# --- Region / Currency Rollups ---
+# Materialized by the transaction that changes Country rows (refresh, create,
+# delete), so GET /stats/* reads a handful of precomputed rows that always
+# agree with the Status row committed alongside them. Refreshes and bulk
+# writes rebuild every row; single-row writes adjust just their two groups.
+
+# Rollup dimension -> Country column it groups by
+ROLLUP_DIMENSIONS = {
+    CountryRollup.REGION: 'region',
+    CountryRollup.CURRENCY: 'currency_code',
+}
+
+
+def get_rollup_top_n():
+    """Length of the stored top-by-GDP list per group."""
+    return getattr(settings, 'STATS_TOP_N', 10)
+
+
+def median(sorted_values):
+    middle, odd = divmod(len(sorted_values), 2)
+    if odd:
+        return sorted_values[middle]
+    return ((sorted_values[middle - 1] + sorted_values[middle]) / 2).quantize(GDP_QUANTUM)
+
+
+def build_rollup(dimension, key, rows, top_n, computed_at):
+    """Aggregates one group's (name, population, gdp) rows, pre-sorted by GDP descending."""
+    gdps = [gdp for _, _, gdp in rows if gdp is not None]
+    total_gdp = sum(gdps) if gdps else None
+    return CountryRollup(
+        dimension=dimension,
+        key=key,
+        countries=len(rows),
+        total_population=sum(population for _, population, _ in rows),
+        countries_with_gdp=len(gdps),
+        total_gdp=total_gdp,
+        avg_gdp=(total_gdp / len(gdps)).quantize(GDP_QUANTUM) if gdps else None,
+        median_gdp=median(gdps[::-1]) if gdps else None,
+        top_countries=[
+            {'name': name, 'estimated_gdp': str(gdp)}
+            for name, _, gdp in rows[:top_n] if gdp is not None
+        ],
+        computed_at=computed_at,
+    )
+
+
+def rebuild_rollups(computed_at, top_n=None):
+    """
+    Recomputes every rollup from one ordered scan of Country and replaces the
+    stored rows. Call inside the transaction that changed the countries.
+    """
+    top_n = get_rollup_top_n() if top_n is None else top_n
+    # Groups match the case-insensitive ?region=/?currency= filters: rows are
+    # grouped on the normalized key column and each group is shown by the first
+    # spelling in scan order (that of its highest-GDP country)
+    columns = list(ROLLUP_DIMENSIONS.values())
+    scan = Country.objects.order_by(F('estimated_gdp').desc(nulls_last=True), 'name').values_list(
+        'name', 'population', 'estimated_gdp', *columns, *(COUNTRY_KEY_FIELDS[column] for column in columns)
+    )
+
+    groups = {dimension: defaultdict(list) for dimension in ROLLUP_DIMENSIONS}
+    display = {dimension: {} for dimension in ROLLUP_DIMENSIONS}
+    for name, population, gdp, *values in scan:
+        row = (name, population, gdp)
+        for dimension, value, key in zip(ROLLUP_DIMENSIONS, values, values[len(columns):]):
+            groups[dimension][key or None].append(row)
+            display[dimension].setdefault(key or None, value or None)
+
+    rollups = [
+        build_rollup(dimension, display[dimension][key], rows, top_n, computed_at)
+        for dimension, by_key in groups.items()
+        for key, rows in by_key.items()
+    ]
+    CountryRollup.objects.all().delete()
+    CountryRollup.objects.bulk_create(rollups)
+    return len(rollups)
+
+
+def apply_rollup_delta(country, delta, computed_at, top_n=None):
+    """
+    Applies one created (delta=1) or deleted (delta=-1) country to its region
+    and currency rollups without rescanning the table: counts and totals are
+    adjusted in place, and the top list, median and shown key are re-read from
+    the group's (key, estimated_gdp) and (key, name) indexes. Call inside the
+    transaction that wrote the row, after the write.
+    """
+    top_n = get_rollup_top_n() if top_n is None else top_n
+    population, gdp = country.population, country.estimated_gdp
+    for dimension, column in ROLLUP_DIMENSIONS.items():
+        key = normalize_key(getattr(country, column))
+        # Locked, so concurrent single-row writes to a dimension apply in turn
+        stored = CountryRollup.objects.select_for_update().filter(dimension=dimension)
+        rollup = next((row for row in stored if normalize_key(row.key) == key), None)
+        if rollup is None:
+            rollup = CountryRollup(dimension=dimension, countries=0, total_population=0, countries_with_gdp=0)
+
+        rollup.countries += delta
+        if rollup.countries <= 0:
+            if rollup.pk is not None:
+                rollup.delete()
+            continue
+        rollup.total_population += delta * population
+
+        group = Country.objects.filter(**{COUNTRY_KEY_FIELDS[column]: key})
+        with_gdp = group.exclude(estimated_gdp=None)
+        if gdp is not None:
+            rollup.countries_with_gdp += delta
+            count = rollup.countries_with_gdp
+            rollup.total_gdp = (rollup.total_gdp or 0) + delta * gdp if count else None
+            rollup.avg_gdp = (rollup.total_gdp / count).quantize(GDP_QUANTUM) if count else None
+            # The middle one or two values, read in index order
+            middle = with_gdp.order_by('estimated_gdp').values_list('estimated_gdp', flat=True)
+            rollup.median_gdp = median(list(middle[(count - 1) // 2:count // 2 + 1])) if count else None
+
+        # Same order as rebuild_rollups' scan; its first row's spelling is shown
+        top = list(with_gdp.order_by('-estimated_gdp', 'name').values_list('name', 'estimated_gdp', column)[:max(top_n, 1)])
+        rollup.top_countries = [{'name': name, 'estimated_gdp': str(value)} for name, value, _ in top[:top_n]]
+        if top:
+            rollup.key = top[0][2] or None
+        else:
+            rollup.key = group.order_by('name').values_list(column, flat=True).first() or None
+        rollup.computed_at = computed_at
+        rollup.save()
@@ -0,0 +1,164 @@
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from .cache import get_data_version
+from .models import Country
+
+# --- In-memory Search Index ---
+# Type-ahead over country names and capitals. The index is immutable and
+# rebuilt from the Country table whenever the data version moves (refresh,
+# create, delete), so lookups never touch the database.
+
+FIELDS = ('name', 'capital')
+
+# Field matched by each prefix tier, best first: whole name, whole capital,
+# a later word of the name, a later word of the capital
+TIERS = ('name', 'capital', 'name', 'capital')
+
+FUZZY_MIN_LENGTH = 3
+FUZZY_THRESHOLD = 0.3
+
+
+def normalize(text):
+    """Case-folds and strips accents, so 'cote' finds "Côte d'Ivoire"."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).strip()
+
+
+def word_suffixes(text):
+    """The text from the start of each word after the first ('papua new guinea' -> 'new guinea', 'guinea')."""
+    return [text[i + 1:] for i, c in enumerate(text) if c in " -'(" and text[i + 1:i + 2].isalnum()]
+
+
+def trigrams(text):
+    # One pad on each side: a second leading pad adds a gram per first letter
+    # whose posting list covers ~1/26th of the index
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Sorted prefix arrays (one per match tier, searched with bisect) plus a
+    trigram inverted index for fuzzy matches.
+    """
+
+    def __init__(self, rows, version=None):
+        # rows: (name, capital, region) tuples
+        self.entries = tuple(rows)
+        self.version = version
+
+        tiers = [[] for _ in TIERS]
+        self.grams = defaultdict(list)
+        self.gram_counts = []
+        for entry_id, (name, capital, _) in enumerate(self.entries):
+            counts = []
+            for offset, text in enumerate((name, capital)):
+                text = normalize(text or '')
+                if not text:
+                    counts.append(0)
+                    continue
+                tiers[offset].append((text, entry_id))
+                for suffix in word_suffixes(text):
+                    tiers[offset + 2].append((suffix, entry_id))
+                grams = trigrams(text)
+                for gram in grams:
+                    self.grams[gram].append(entry_id * 2 + offset)
+                counts.append(len(grams))
+            self.gram_counts.append(counts)
+
+        self.tiers = []
+        for terms in tiers:
+            terms.sort()
+            self.tiers.append(([term for term, _ in terms], [entry_id for _, entry_id in terms]))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def prefix_matches(self, query, limit):
+        """(entry_id, tier) pairs for entries with a name/capital/word starting with `query`."""
+        seen, matches = set(), []
+        for tier, (keys, entry_ids) in enumerate(self.tiers):
+            i = bisect_left(keys, query)
+            while i < len(keys) and keys[i].startswith(query):
+                entry_id = entry_ids[i]
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    matches.append((entry_id, tier))
+                    if len(matches) >= limit:
+                        return matches
+                i += 1
+        return matches
+
+    def fuzzy_matches(self, query, limit, exclude=()):
+        """(entry_id, field offset, score) by trigram similarity, best first."""
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.grams.get(gram, ()))
+
+        best = {}
+        for posting, count in shared.items():
+            entry_id, offset = divmod(posting, 2)
+            if entry_id in exclude:
+                continue
+            score = count / (len(query_grams) + self.gram_counts[entry_id][offset] - count)
+            if score >= FUZZY_THRESHOLD and score > best.get(entry_id, (0, None))[0]:
+                best[entry_id] = (score, offset)
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], self.entries[item[0]][0]))
+        return [(entry_id, offset, score) for entry_id, (score, offset) in ranked[:limit]]
+
+    def search(self, query, limit=10):
+        """Prefix matches by tier, then fuzzy matches to fill up to `limit`."""
+        query = normalize(query)
+        if not query:
+            return []
+
+        hits = [
+            (entry_id, TIERS[tier], 'prefix', 1.0)
+            for entry_id, tier in self.prefix_matches(query, limit)
+        ]
+        if len(hits) < limit and len(query) >= FUZZY_MIN_LENGTH:
+            matched = {entry_id for entry_id, *_ in hits}
+            hits += [
+                (entry_id, FIELDS[offset], 'fuzzy', round(score, 3))
+                for entry_id, offset, score in self.fuzzy_matches(query, limit - len(hits), matched)
+            ]
+
+        results = []
+        for entry_id, field, match, score in hits:
+            name, capital, region = self.entries[entry_id]
+            results.append({
+                'name': name,
+                'capital': capital,
+                'region': region,
+                'matched_field': field,
+                'match': match,
+                'score': score,
+            })
+        return results
+
+
+def build_search_index(version=None):
+    rows = Country.objects.order_by('name').values_list('name', 'capital', 'region')
+    return SearchIndex(rows, version)
+
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def get_search_index():
+    """Returns the current index, rebuilding it only when the data version moved."""
+    global _index
+    version = get_data_version()
+    index = _index
+    if index is None or index.version != version:
+        with _build_lock:
+            index = _index
+            if index is None or index.version != version:
+                index = _index = build_search_index(version)
+    return index
@@ -1,5 +1,24 @@
 from rest_framework import serializers
-from .models import Country
+from rest_framework.validators import UniqueValidator
+from .models import Country, CountryRollup, RefreshJob, RefreshStage, normalize_key
+
+class CountryListSerializer(serializers.ListSerializer):
+    """many=True form of CountrySerializer; validate_rows() keeps the valid rows of a batch."""
+
+    def validate_rows(self):
+        """
+        Validates each item of `initial_data` on its own. Returns the valid
+        rows as (index, validated data) pairs and the errors of the rest as
+        index -> details, instead of failing the whole list like is_valid().
+        """
+        valid, errors = [], {}
+        for index, item in enumerate(self.initial_data):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as e:
+                errors[index] = e.detail
+        return valid, errors
+
 
 class CountrySerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +39,23 @@ class CountrySerializer(serializers.ModelSerializer):
             'estimated_gdp', 
             'exchange_rate'
         ]
+        list_serializer_class = CountryListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.context.get('upsert'):
+            # Existing names are updated in place rather than rejected
+            fields['name'].validators = [
+                validator for validator in fields['name'].validators
+                if not isinstance(validator, UniqueValidator)
+            ]
+        return fields
+
+    def validate_name(self, value):
+        # Names are unique case-insensitively (via name_key), not just exactly
+        if not self.context.get('upsert') and Country.objects.filter(name_key=normalize_key(value)).exists():
+            raise serializers.ValidationError("country with this name already exists.")
+        return value
 
     # Keep your custom validation from before to ensure name, population, and 
     # currency_code are present, and to return the custom error structure.
@@ -45,4 +81,55 @@ class CountrySerializer(serializers.ModelSerializer):
 class StatusSerializer(serializers.Serializer):
     """Serializer for Status endpoint output."""
     total_countries = serializers.IntegerField()
-    last_refreshed_at = serializers.DateTimeField()
\ No newline at end of file
+    last_refreshed_at = serializers.DateTimeField()
+
+class RefreshStageSerializer(serializers.ModelSerializer):
+    """Freshness of one refresh stage, listed by name under /status `stages`."""
+    class Meta:
+        model = RefreshStage
+        fields = ['last_attempted_at', 'last_succeeded_at', 'last_changed_at', 'last_error']
+
+def serialize_stages(stages):
+    """Stage name -> freshness, in pipeline order."""
+    by_name = {stage.name: stage for stage in stages}
+    return {
+        name: RefreshStageSerializer(by_name[name]).data
+        for name in RefreshStage.STAGES if name in by_name
+    }
+
+class RefreshJobSerializer(serializers.ModelSerializer):
+    """Serializer for background refresh job status."""
+    job_id = serializers.UUIDField(source='id', read_only=True)
+
+    class Meta:
+        model = RefreshJob
+        fields = [
+            'job_id',
+            'state',
+            'stages',
+            'phase',
+            'timings',
+            'result',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+
+
+class CountryRollupSerializer(serializers.ModelSerializer):
+    """Serializer for one precomputed region/currency group."""
+
+    class Meta:
+        model = CountryRollup
+        fields = [
+            'key',
+            'countries',
+            'total_population',
+            'countries_with_gdp',
+            'total_gdp',
+            'avg_gdp',
+            'median_gdp',
+            'top_countries',
+            'computed_at',
+        ]
@@ -1,162 +1,514 @@
-import requests
-import random
-import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
 from django.db import transaction
 from django.db.models import DecimalField
-from decimal import Decimal # <-- CRUCIAL for precise math
-from PIL import Image, ImageDraw, ImageFont 
+from django.utils import timezone
 
-from .models import Country, Status 
-from .exceptions import ExternalApiError 
+from .cache import bump_data_version
+from .image_generator import generate_summary_image
+from .metrics import PhaseTimer
+from .exceptions import ExternalApiError
+from .models import Country, RefreshStage, Status, UpstreamSource, normalize_key
+from .rate_history import compact_rate_snapshots, record_rate_snapshots
+from .rates import load_rate_table, publish_rate_table
+from .rollups import rebuild_rollups
+from .transforms import compute_gdp_columns, get_rng
+from .upstream import SOURCES, fetch_all, fetch_source
 
-# --- Helper for Image Generation (Requires Pillow) ---
+# --- Bulk Upsert ---
 
-def generate_summary_image(total_countries, refresh_time):
-    """Generates and saves the summary image to cache/summary.png."""
+# Columns that come from the upstream APIs; a row is only rewritten when one differs
+UPSERT_FIELDS = [
+    'name', 'population', 'capital', 'region', 'flag_url',
+    'currency_code', 'exchange_rate', 'estimated_gdp',
+]
+
+# Columns computed from the currency; writers that do not supply them clear
+# them when a row's currency changes
+DERIVED_FIELDS = ['exchange_rate', 'estimated_gdp']
+
+
+def get_upsert_batch_size():
+    """Rows per INSERT/UPDATE statement, overridable via settings."""
+    return getattr(settings, 'COUNTRY_UPSERT_BATCH_SIZE', 500)
+
+
+def upsert_countries(incoming, current_time, batch_size=None, partial=False):
+    """
+    Reconciles `incoming` (name key -> field dict) against the Country
+    table using a fixed number of queries: one SELECT, batched INSERTs for new
+    rows and batched UPDATEs for changed rows. Unchanged rows only get their
+    timestamp bumped. Returns inserted/updated/unchanged counts.
+
+    With `partial`, only the incoming rows are read (one SELECT per batch of
+    keys), for writers that touch a subset of the table.
+    """
+    batch_size = batch_size or get_upsert_batch_size()
+
+    # 1. Load existing rows once, indexed by their normalized name key
+    queryset = Country.objects.only('id', 'name_key', *UPSERT_FIELDS)
+    countries = queryset
+    if partial:
+        keys = list(incoming)
+        countries = (
+            country
+            for i in range(0, len(keys), batch_size)
+            for country in queryset.filter(name_key__in=keys[i:i + batch_size])
+        )
+    existing = {country.name_key: country for country in countries}
+
+    # 2. Diff
+    to_create, to_update, unchanged_ids = [], [], []
+    changed_fields = set()
+    for key, values in incoming.items():
+        country = existing.get(key)
+        if country is None:
+            to_create.append(Country(last_refreshed_at=current_time, **values))
+            continue
+
+        changed = [field for field, value in values.items() if getattr(country, field) != value]
+        if 'currency_code' in changed:
+            # Rate and GDP derived from the old currency are wrong until repriced
+            cleared = [field for field in DERIVED_FIELDS
+                       if field not in values and getattr(country, field) is not None]
+            values = dict(values, **dict.fromkeys(cleared))
+            changed += cleared
+        if not changed:
+            unchanged_ids.append(country.pk)
+            continue
+
+        for field in changed:
+            setattr(country, field, values[field])
+        changed_fields.update(changed)
+        to_update.append(country)
+
+    # 3. Apply
+    if to_create:
+        Country.objects.bulk_create(to_create, batch_size=batch_size)
+    if to_update:
+        # Only the columns that changed somewhere: bulk_update() writes each
+        # listed column as a CASE over the whole batch, which SQLite evaluates
+        # row by row
+        Country.objects.bulk_update(
+            to_update, [field for field in UPSERT_FIELDS if field in changed_fields], batch_size=batch_size
+        )
+    # Every matched row gets the refresh timestamp, which needs no CASE
+    touched_ids = [country.pk for country in to_update] + unchanged_ids
+    for i in range(0, len(touched_ids), batch_size):
+        Country.objects.filter(pk__in=touched_ids[i:i + batch_size]).update(
+            last_refreshed_at=current_time
+        )
+
+    return {
+        'inserted': len(to_create),
+        'updated': len(to_update),
+        'unchanged': len(unchanged_ids),
+    }
+
+
+def delete_countries(names, batch_size=None):
+    """
+    Deletes the countries named in `names` (case-insensitively), a batch of
+    keys per statement. Returns the number deleted and the names not found.
+    """
+    batch_size = batch_size or get_upsert_batch_size()
+    keys = list(dict.fromkeys(normalize_key(name) for name in names))
+
+    deleted, found = 0, set()
+    for i in range(0, len(keys), batch_size):
+        batch = Country.objects.filter(name_key__in=keys[i:i + batch_size])
+        found.update(batch.values_list('name_key', flat=True))
+        deleted += batch.delete()[0]
+    return deleted, [name for name in names if normalize_key(name) not in found]
+
+
+# --- Transform ---
+
+def build_country_rows(countries_data, exchange_rates, rng=None):
+    """Maps the restcountries payload to name key -> Country field dict."""
+    incoming = {}
     
-    # 1. Fetch Top 5 GDP countries (only include those with calculated GDP)
-    top_countries = list(
-        Country.objects
-        .filter(estimated_gdp__isnull=False)
-        .order_by('-estimated_gdp')[:5]
-        .values('name', 'estimated_gdp')
+    for country_data in countries_data:
+        name = country_data.get('name')
+        
+        # Skip records missing a primary identifier
+        if not name:
+            continue
+
+        # Safely extract the first currency code
+        currency_code = None
+        currencies = country_data.get('currencies')
+        if currencies and isinstance(currencies, list) and len(currencies) > 0:
+            currency_code = currencies[0].get('code')
+
+        # Later duplicates win, matching the old update_or_create behaviour
+        incoming[normalize_key(name)] = {
+            'name': name, # Save the original capitalization from the API
+            'population': country_data.get('population', 0),
+            'capital': country_data.get('capital'),
+            'region': country_data.get('region'),
+            'flag_url': country_data.get('flag'),
+            'currency_code': currency_code,
+        }
+
+    # GDP for every row in one batched pass
+    rows = list(incoming.values())
+    rates, gdps = compute_gdp_columns(
+        [row['population'] for row in rows],
+        [row['currency_code'] for row in rows],
+        exchange_rates,
+        rng,
     )
-    
-    # 2. Setup Canvas and Fonts
-    W, H = 500, 450
-    img = Image.new('RGB', (W, H), color=(240, 240, 240))
-    d = ImageDraw.Draw(img)
-    
-    # Robust font handling to prevent system crash
-    try:
-        # Attempt to load a common system font (will fail on many environments)
-        font_path = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
-        font_large = ImageFont.truetype(font_path, 20)
-        font_medium = ImageFont.truetype(font_path, 14)
-    except Exception:
-        # Fallback to the default Pillow font (avoids crash)
-        font_large = ImageFont.load_default()
-        font_medium = ImageFont.load_default()
-
-    # 3. Draw Text
-    d.text((20, 20), "🌐 Country Data Summary", fill=(0, 0, 128), font=font_large)
-    d.text((20, 60), f"Total Cached Countries: {total_countries:,}", fill=(50, 50, 50), font=font_medium)
-    d.text((20, 85), f"Last Global Refresh: {refresh_time.strftime('%Y-%m-%d %H:%M:%S UTC')}", fill=(50, 50, 50), font=font_medium)
-    
-    y_offset = 130
-    d.text((20, y_offset), "🏆 Top 5 by Estimated GDP (USD):", fill=(0, 0, 0), font=font_large)
-    
-    for i, country in enumerate(top_countries):
-        # Format GDP value safely
-        gdp_value = f"{country['estimated_gdp']:,.0f}" if country['estimated_gdp'] is not None else "N/A"
-        text = f"{i+1}. {country['name']}: ${gdp_value}"
-        d.text((30, y_offset + 40 + i * 30), text, fill=(0, 0, 0), font=font_medium)
+    for row, exchange_rate, estimated_gdp in zip(rows, rates, gdps):
+        row['exchange_rate'] = exchange_rate
+        row['estimated_gdp'] = estimated_gdp
 
-    # 4. Save Image
-    os.makedirs('cache', exist_ok=True)
-    img.save('cache/summary.png')
+    return incoming
 
 
-# --- Core Refresh Logic ---
+def reprice_countries(exchange_rates, current_time, batch_size=None, rng=None):
+    """
+    Recomputes only exchange_rate/estimated_gdp for the stored countries, for
+    refreshes where the rates changed but the country list did not.
+    """
+    batch_size = batch_size or get_upsert_batch_size()
+    to_update = []
+    unchanged = 0
 
-def refresh_country_data():
-    """Fetches, processes, and stores country and exchange rate data."""
-    
-    # --- 1. Fetch External Data ---
+    countries = list(Country.objects.filter(currency_code__isnull=False).only(
+        'id', 'population', 'currency_code', 'exchange_rate', 'estimated_gdp'
+    ))
+    rates, gdps = compute_gdp_columns(
+        [country.population for country in countries],
+        [country.currency_code for country in countries],
+        exchange_rates,
+        rng,
+    )
+    for country, exchange_rate, estimated_gdp in zip(countries, rates, gdps):
+        if (exchange_rate, estimated_gdp) == (country.exchange_rate, country.estimated_gdp):
+            unchanged += 1
+            continue
+        country.exchange_rate = exchange_rate
+        country.estimated_gdp = estimated_gdp
+        country.last_refreshed_at = current_time
+        to_update.append(country)
+
+    if to_update:
+        Country.objects.bulk_update(
+            to_update, ['exchange_rate', 'estimated_gdp', 'last_refreshed_at'], batch_size=batch_size
+        )
+
+    return {'inserted': 0, 'updated': len(to_update), 'unchanged': unchanged}
+
+
+# --- Refresh Stages ---
+# A refresh is split into stages, each with its own freshness row
+# (RefreshStage): the two upstream downloads, the derived GDP columns and the
+# summary image. Callers choose which upstreams to refresh (rates every few
+# minutes, the country list daily); the derived stages follow whenever one of
+# their inputs changed. A failing upstream only fails its own stage, and the
+# data from its last successful run keeps being served.
+
+# Derived stage -> the stages whose changes make it stale
+DERIVED_STAGES = {
+    RefreshStage.GDP: (RefreshStage.RATES,),
+    RefreshStage.IMAGE: (RefreshStage.COUNTRIES, RefreshStage.GDP),
+}
+
+NO_RATES_ERROR = "No exchange rates available"
+
+
+def get_stage_intervals():
+    """Seconds between runs of each upstream stage, overridable via settings."""
+    intervals = {RefreshStage.COUNTRIES: 24 * 60 * 60, RefreshStage.RATES: 5 * 60}
+    intervals.update(getattr(settings, 'REFRESH_STAGE_INTERVALS', {}))
+    return intervals
+
+
+def expand_stages(stages=None):
+    """
+    The requested stages (all of them by default) plus the derived stages
+    that depend on them, in pipeline order. Raises ValueError for an unknown
+    stage name.
+    """
+    if not stages:
+        return list(RefreshStage.STAGES)
+    unknown = set(stages) - set(RefreshStage.STAGES)
+    if unknown:
+        raise ValueError(f"Unknown refresh stage(s): {', '.join(sorted(unknown))}")
+
+    selected = set(stages)
+    # Insertion order is dependency order, so GDP is settled before the image
+    for stage, inputs in DERIVED_STAGES.items():
+        if selected.intersection(inputs):
+            selected.add(stage)
+    return [stage for stage in RefreshStage.STAGES if stage in selected]
+
+
+def load_stages():
+    return {stage.name: stage for stage in RefreshStage.objects.all()}
+
+
+def is_stale(stage, freshness):
+    """True when one of a derived stage's inputs changed after the stage last succeeded."""
+    record = freshness.get(stage)
+    succeeded = record.last_succeeded_at if record else None
+    for name in DERIVED_STAGES[stage]:
+        changed = freshness[name].last_changed_at if name in freshness else None
+        if changed is not None and (succeeded is None or changed > succeeded):
+            return True
+    return False
+
+
+def due_stages(now=None):
+    """
+    Upstream stages whose interval (get_stage_intervals) has elapsed since
+    they were last attempted, plus derived stages left stale, e.g. by a
+    failed run.
+    """
+    now = now or timezone.now()
+    freshness = load_stages()
+    due = set()
+    for name, interval in get_stage_intervals().items():
+        record = freshness.get(name)
+        if record is None or record.last_attempted_at is None or \
+                now - record.last_attempted_at >= timedelta(seconds=interval):
+            due.add(name)
+    due.update(stage for stage in DERIVED_STAGES if is_stale(stage, freshness))
+    return [stage for stage in RefreshStage.STAGES if stage in due]
+
+
+def record_stages(outcomes, errors, now=None):
+    """
+    Saves one attempt per stage: `outcomes` maps each successful stage to
+    whether it wrote data, `errors` each failed stage to its message.
+    """
+    now = now or timezone.now()
+    for name in list(outcomes) + list(errors):
+        defaults = {'last_attempted_at': now}
+        if name in errors:
+            defaults['last_error'] = errors[name]
+        else:
+            defaults.update(last_succeeded_at=now, last_error=None)
+            if outcomes[name]:
+                defaults['last_changed_at'] = now
+        RefreshStage.objects.update_or_create(name=name, defaults=defaults)
+
+
+def describe_fetch_error(error):
+    return f"{error.message}: could not fetch data from {error.api_name}"
+
+
+def load_current_rates(errors):
+    """
+    The rates of the newest stored snapshot (the table /convert serves), so
+    stages can be priced without downloading rates again. Falls back to an
+    unconditional download while no snapshot is stored; returns None, with
+    the failure added to `errors`, when neither is available.
+    """
+    table = load_rate_table()
+    if len(table):
+        return dict(table.rates)
+    if RefreshStage.RATES in errors:
+        return None
     try:
-        # Exchange Rates API
-        rate_url = "https://open.er-api.com/v6/latest/USD"
-        rates_response = requests.get(rate_url, timeout=10)
-        rates_response.raise_for_status()
-        exchange_rates = rates_response.json().get('rates', {})
-
-        # Countries API
-        country_url = "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies"
-        countries_response = requests.get(country_url, timeout=10)
-        countries_response.raise_for_status()
-        countries_data = countries_response.json()
-
-    except requests.exceptions.RequestException as e:
-        # This custom exception handles 503 errors cleanly
-        api_name = 'restcountries.com' if 'country' in str(e) else 'open.er-api.com'
-        raise ExternalApiError(api_name)
+        return fetch_source(RefreshStage.RATES).payload.get('rates', {})
+    except ExternalApiError as e:
+        errors[RefreshStage.RATES] = describe_fetch_error(e)
+        return None
+
+
+# --- Core Refresh Logic ---
+
+def load_validators():
+    return {source.name: source.validators() for source in UpstreamSource.objects.all()}
+
+
+def save_validators(results, current_time):
+    for name, result in results.items():
+        defaults = dict(result.validators, last_fetched_at=current_time)
+        if result.changed:
+            defaults['last_changed_at'] = current_time
+        UpstreamSource.objects.update_or_create(name=name, defaults=defaults)
+
+
+def read_data_version():
+    """
+    Reads the data version from the database, bypassing the cache. Inside a
+    transaction that bumped it, this is the version the transaction commits.
+    """
+    return Status.objects.values_list('data_version', flat=True).get(pk=1)
+
+
+def refresh_country_data(on_phase=None, force=False, seed=None, stages=None):
+    """
+    Fetches, processes, and stores country and exchange rate data.
+    `stages` limits the refresh to those stages (see expand_stages); by
+    default all of them run. Upstreams are fetched conditionally; a source
+    whose payload is unchanged since the last refresh is not parsed or
+    written again, and derived stages only rerun when their inputs changed,
+    unless `force`. If some upstreams fail, the rest are still processed and
+    the failures are reported; ExternalApiError is raised only when every
+    selected upstream failed.
+    `on_phase`, if given, is called with the name of each phase as it starts
+    ('fetch', 'transform', 'process', 'image') so callers can report progress.
+    `seed` makes the random GDP multipliers reproducible.
+    Returns (total_countries, refresh_time, details) where details carries the
+    inserted/updated/unchanged counts, the list of processed sources, each
+    stage's outcome and the failed stages' errors.
+    """
+    # Passes phases through to the caller and records their durations for /metrics
+    on_phase = PhaseTimer(on_phase)
+    stages = expand_stages(stages)
+    freshness = load_stages()
+    errors = {}
+
+    # --- 1. Fetch External Data (the selected upstreams concurrently) ---
+    on_phase('fetch')
+    results = {}
+    sources = [stage for stage in stages if stage in SOURCES]
+    if sources:
+        fetched = fetch_all(
+            sources, validators=None if force else load_validators(), return_exceptions=True
+        )
+        for name, result in fetched.items():
+            if isinstance(result, ExternalApiError):
+                errors[name] = describe_fetch_error(result)
+            else:
+                results[name] = result
+        if not results:
+            # Nothing to process; keep the failures visible on /status
+            with transaction.atomic():
+                record_stages({}, errors)
+                bump_data_version()
+            raise next(iter(fetched.values()))
+
+    countries_changed = RefreshStage.COUNTRIES in results and results[RefreshStage.COUNTRIES].changed
+    rates_changed = RefreshStage.RATES in results and results[RefreshStage.RATES].changed
+    reprice = RefreshStage.GDP in stages and not countries_changed and (
+        rates_changed or force or is_stale(RefreshStage.GDP, freshness)
+    )
+
+    exchange_rates = None
+    if rates_changed:
+        exchange_rates = results[RefreshStage.RATES].payload.get('rates', {})
+    elif countries_changed or reprice:
+        # New or changed countries need the full rate table to be priced;
+        # while the rates upstream is down that is the last one stored
+        exchange_rates = load_current_rates(errors)
+        if exchange_rates is None:
+            if countries_changed:
+                # Dropped from `results` so its validators are not saved and
+                # the next refresh fetches the payload again
+                errors[RefreshStage.COUNTRIES] = NO_RATES_ERROR
+                del results[RefreshStage.COUNTRIES]
+                countries_changed = False
+            if reprice:
+                errors[RefreshStage.GDP] = NO_RATES_ERROR
+                reprice = False
+
+    processed_sources = [name for name, result in results.items() if result.changed]
+    rng = get_rng(seed)
+
+    # --- 2. Transform (pure, outside the transaction) ---
+    on_phase('transform')
+    incoming = None
+    if countries_changed:
+        incoming = build_country_rows(results[RefreshStage.COUNTRIES].payload, exchange_rates, rng)
     
-    # --- 2. Process and Store/Update (Atomic Transaction) ---
+    # --- 3. Process and Store/Update (Atomic Transaction) ---
+    on_phase('process')
     with transaction.atomic():
-        updated_count = 0
         current_time = datetime.now()
-        
-        for country_data in countries_data:
-            name = country_data.get('name')
-            population = country_data.get('population', 0)
-            
-            # Skip records missing a primary identifier
-            if not name:
-                continue
+        status, _ = Status.objects.get_or_create(pk=1)
+        updated_count = status.total_countries
+        # Stage -> whether it wrote data
+        outcomes = {name: result.changed for name, result in results.items()}
 
-            # --- Currency and GDP Logic ---
-            currency_code = None
-            exchange_rate = None
-            estimated_gdp = None
+        if incoming is not None:
+            # --- UPSERT Logic (bulk reconciliation) ---
+            counts = upsert_countries(incoming, current_time)
+            updated_count = len(incoming)
+            # The upsert priced every row it wrote
+            outcomes[RefreshStage.GDP] = True
+        elif reprice:
+            # Stored rows are needed here, so this transform runs inside the transaction
+            counts = reprice_countries(exchange_rates, current_time, rng=rng)
+            outcomes[RefreshStage.GDP] = counts['updated'] > 0
+        else:
+            counts = {'inserted': 0, 'updated': 0, 'unchanged': updated_count}
+            if RefreshStage.GDP in stages and RefreshStage.GDP not in errors:
+                outcomes[RefreshStage.GDP] = False
 
-            currencies = country_data.get('currencies')
+        save_validators(results, current_time)
+
+        if rates_changed:
+            # Append this refresh's rates to the history. Once the refresh has
+            # committed, old snapshots are compacted into daily aggregates (the
+            # conversion table is swapped below, after the version bump)
+            taken_at = timezone.now()
+            record_rate_snapshots(exchange_rates, taken_at)
+            transaction.on_commit(compact_rate_snapshots, robust=True)
             
-            # Safely extract the first currency code
-            if currencies and isinstance(currencies, list) and len(currencies) > 0:
-                currency_code = currencies[0].get('code')
-                
-            if currency_code:
-                rate = exchange_rates.get(currency_code)
-                
-                if rate:
-                    # Convert to Decimal for precision math
-                    exchange_rate_dec = Decimal(str(rate))
-                    population_dec = Decimal(str(population))
-                    multiplier = Decimal(str(random.uniform(1000, 2000))) 
-                    
-                    # GDP Calculation: (Population * Multiplier) / Exchange Rate
-                    estimated_gdp = (population_dec * multiplier) / exchange_rate_dec
-                    
-                    # Round the Decimal result to 2 places
-                    estimated_gdp = estimated_gdp.quantize(Decimal('0.01'))
-                    
-                    # Assign the rate back (as Decimal) for UPSERT
-                    exchange_rate = exchange_rate_dec
+        # --- 4. Update Status and Image ---
+        data_changed = incoming is not None or outcomes.get(RefreshStage.GDP, False)
+        status.total_countries = updated_count
+        status.last_refreshed_at = current_time
+        # Only these columns: the refresh lease is renewed concurrently
+        status.save(update_fields=['total_countries', 'last_refreshed_at'])
+        if data_changed or force:
+            # Same transaction as Status, so /stats and /status always agree
+            rebuild_rollups(current_time)
+        record_stages(outcomes, errors)
+        bump_data_version()
+        if rates_changed:
+            # Tagged with the version this transaction commits, so the next
+            # /convert doesn't reload the table it was just handed
+            rates_version = read_data_version()
+            transaction.on_commit(
+                lambda: publish_rate_table(exchange_rates, taken_at, rates_version), robust=True
+            )
+        
+        render = RefreshStage.IMAGE in stages and (
+            data_changed or force or is_stale(RefreshStage.IMAGE, freshness)
+        )
+        if render:
+            # Render after commit so Pillow work and the PNG write don't hold row locks
+            def render_image():
+                on_phase('image')
+                try:
+                    generate_summary_image(updated_count, current_time)
+                except Exception as e:
+                    record_stages({}, {RefreshStage.IMAGE: f"Render failed: {e.__class__.__name__}"})
+                    raise
                 else:
-                    # Currency code exists, but no exchange rate found
-                    estimated_gdp = None # Keep NULL/None if rate is missing
+                    with transaction.atomic():
+                        record_stages({RefreshStage.IMAGE: True}, {})
+                        # The image's freshness is part of /status
+                        bump_data_version()
+                        if rates_changed and read_data_version() == rates_version + 1:
+                            # Only the render moved the version since the refresh,
+                            # so its rates are still the latest: retag the table
+                            transaction.on_commit(
+                                lambda: publish_rate_table(exchange_rates, taken_at, rates_version + 1),
+                                robust=True,
+                            )
+                finally:
+                    on_phase.finish()
+            transaction.on_commit(render_image, robust=True)
+
+        stage_outcomes = {}
+        for stage in stages:
+            if stage in errors:
+                stage_outcomes[stage] = 'failed'
+            elif stage == RefreshStage.IMAGE:
+                stage_outcomes[stage] = 'scheduled' if render else 'unchanged'
             else:
-                # No currency information found for the country
-                estimated_gdp = Decimal('0.00') # Set to 0 if no currency exists
-
-            # --- UPSERT Logic (update_or_create) ---
-            Country.objects.update_or_create(
-                # Use name__iexact for case-insensitive lookup
-                name__iexact=name, 
-                defaults={
-                    'name': name, # Save the original capitalization from the API
-                    'population': population,
-                    'capital': country_data.get('capital'),
-                    'region': country_data.get('region'),
-                    'flag_url': country_data.get('flag'),
-                    'currency_code': currency_code,
-                    'exchange_rate': exchange_rate,
-                    'estimated_gdp': estimated_gdp,
-                    'last_refreshed_at': current_time
-                }
-            )
-            updated_count += 1
-            
-        # --- 3. Update Status and Image ---
-        Status.objects.update_or_create(
-            pk=1,
-            defaults={
-                'total_countries': updated_count,
-                'last_refreshed_at': current_time
-            }
+                stage_outcomes[stage] = 'updated' if outcomes.get(stage) else 'unchanged'
+        result = updated_count, current_time, dict(
+            counts, processed_sources=processed_sources, stages=stage_outcomes, errors=errors,
         )
-        
-        generate_summary_image(updated_count, current_time)
-        
-        return updated_count, current_time
\ No newline at end of file
+
+    # Closes 'process' (commit included) unless the image render already did
+    on_phase.finish()
+    return result
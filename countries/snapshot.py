@@ -0,0 +1,201 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import get_data_version
+from .fast_serializers import compile_row_encoder
+from .models import Country, RefreshStage, Status, normalize_key
+from .pagination import keyset_order_by
+from .serializers import CountrySerializer, StatusSerializer, serialize_stages
+
+# --- In-memory Country Snapshot ---
+# Optional "snapshot mode" (COUNTRY_SNAPSHOT_MODE): every worker holds an
+# immutable copy of the Country table and the /status payload, indexed by
+# name, region and currency and pre-sorted for each list ordering. It is
+# rebuilt and swapped in whole when the data version moves, so list, detail
+# and status reads need no database queries between refreshes.
+
+# Columns a record keeps besides its serialized form: the lookup keys and the
+# sortable fields pagination reads with getattr()
+RECORD_COLUMNS = ('pk', 'name', 'population', 'estimated_gdp', 'name_key', 'region_key', 'currency_key')
+
+
+def snapshot_enabled():
+    return getattr(settings, 'COUNTRY_SNAPSHOT_MODE', False)
+
+
+class CountryRecord:
+    __slots__ = RECORD_COLUMNS + ('data',)
+
+    def __init__(self, pk, name, population, estimated_gdp, name_key, region_key, currency_key, data):
+        self.pk = pk
+        self.name = name
+        self.population = population
+        self.estimated_gdp = estimated_gdp
+        self.name_key = name_key
+        self.region_key = region_key
+        self.currency_key = currency_key
+        # What CountrySerializer(country).data returns
+        self.data = data
+
+
+class StaleCursor(LookupError):
+    """The cursor's row is gone or has moved since the cursor was issued."""
+
+
+class Selection:
+    """
+    The countries matching one filter, in the list's order, which is also
+    the keyset pagination order (pagination.keyset_order_by).
+    """
+    __slots__ = ('rows', 'rank_of', 'ranks')
+
+    def __init__(self, rows, rank_of):
+        self.rows = rows
+        # pk -> position in the unfiltered ordering, and those positions along `rows`
+        self.rank_of = rank_of
+        self.ranks = [rank_of[record.pk] for record in rows]
+
+    def keyset_slice(self, field, position, reverse, limit):
+        """
+        keyset_slice() in memory: up to `limit` rows after `position` ((sort
+        value, pk), or None for the start) along the walk, backwards if
+        `reverse`. The cursor's row locates the position, since comparing
+        values here could disagree with the database's collation; raises
+        StaleCursor if that row is no longer where the cursor left it.
+        """
+        walk = self.rows[::-1] if reverse else self.rows
+        if position is None:
+            return list(walk[:limit])
+
+        value, pk = position
+        index = self.index(pk)
+        if index is None or getattr(self.rows[index], field) != value:
+            raise StaleCursor(pk)
+        start = len(walk) - index if reverse else index + 1
+        return list(walk[start:start + limit])
+
+    def index(self, pk):
+        rank = self.rank_of.get(pk)
+        if rank is None:
+            return None
+        index = bisect_left(self.ranks, rank)
+        return index if index < len(self.ranks) and self.ranks[index] == rank else None
+
+
+class CountrySnapshot:
+    def __init__(self, records, orderings, status, version=None):
+        """
+        `records` maps pk -> CountryRecord; `orderings` maps each order_by
+        string (e.g. '-estimated_gdp') to the pks in the database's order for
+        it, pk tie-breaker included, so collation and NULL placement match
+        the queryset path exactly.
+        """
+        self.version = version
+        self.status = status
+        self.records = records
+        self.by_name = {record.name_key: record for record in records.values()}
+        self.by_region = self.group_by('region_key')
+        self.by_currency = self.group_by('currency_key')
+
+        self.orderings = {}
+        self.ranks = {}
+        for ordering, pks in orderings.items():
+            rows = tuple(records[pk] for pk in pks)
+            self.orderings[ordering] = rows
+            self.ranks[ordering] = {record.pk: i for i, record in enumerate(rows)}
+
+        # (ordering, region key, currency key) -> Selection. Entries are
+        # idempotent, so concurrent readers may race on a write without harm
+        self._selections = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def group_by(self, key):
+        groups = {}
+        for record in self.records.values():
+            groups.setdefault(getattr(record, key), set()).add(record.pk)
+        return groups
+
+    def get(self, name):
+        """The record for a country name (case-insensitive), or None."""
+        return self.by_name.get(normalize_key(name))
+
+    def select(self, ordering, region=None, currency=None):
+        """The Selection for GET /countries' `region`/`currency` filters and order_by string."""
+        region, currency = normalize_key(region), normalize_key(currency)
+        key = (ordering, region, currency)
+        selection = self._selections.get(key)
+        if selection is not None:
+            return selection
+
+        rows = self.orderings[ordering]
+        rank_of = self.ranks[ordering]
+        if region or currency:
+            pks = None
+            for groups, value in ((self.by_region, region), (self.by_currency, currency)):
+                if value:
+                    group = groups.get(value, set())
+                    pks = group if pks is None else pks & group
+            rows = tuple(record for record in rows if record.pk in pks)
+        selection = Selection(rows, rank_of)
+        if rows:
+            # Unknown filter values would otherwise grow the memo without bound
+            self._selections[key] = selection
+        return selection
+
+
+def build_snapshot(orderings, version=None):
+    """Reads the Country table, the Status row and stage freshness into a CountrySnapshot."""
+    columns, make_encoder = compile_row_encoder(CountrySerializer)
+    encode = make_encoder()
+    width = len(RECORD_COLUMNS)
+
+    # One transaction, so the rows, orderings and status agree where the
+    # isolation level allows it
+    with transaction.atomic():
+        records = {
+            row[0]: CountryRecord(*row[:width], encode(row[width:]))
+            for row in Country.objects.order_by('pk').values_list(*RECORD_COLUMNS, *columns)
+        }
+        ordered_pks = {
+            ordering: list(
+                Country.objects.order_by(*keyset_order_by(Country, ordering)).values_list('pk', flat=True)
+            )
+            for ordering in orderings
+        }
+        stages = serialize_stages(RefreshStage.objects.all())
+        status = Status.objects.filter(pk=1).first()
+
+    if status is None:
+        # Default status if refresh has never run
+        status_data = {"total_countries": 0, "last_refreshed_at": None, "stages": stages}
+    else:
+        status_data = dict(StatusSerializer(status).data, stages=stages)
+    return CountrySnapshot(records, ordered_pks, status_data, version)
+
+
+_snapshot = None
+_build_lock = threading.Lock()
+
+
+def load_snapshot(orderings, version):
+    """Returns the snapshot for `version`, building it at most once per process."""
+    global _snapshot
+    with _build_lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = _snapshot = build_snapshot(orderings, version)
+    return snapshot
+
+
+def get_snapshot(orderings):
+    """Returns the current snapshot, rebuilding it only when the data version moved."""
+    version = get_data_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = load_snapshot(orderings, version)
+    return snapshot
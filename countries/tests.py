@@ -1,3 +1,1566 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from django.test.utils import CaptureQueriesContext
+
+from .models import (
+    Country, CountryRollup, RateDailyAggregate, RateSnapshot, RefreshJob, RefreshStage, Status, UpstreamSource,
+    normalize_key,
+)
+from . import rates, snapshot
+from .benchmarks import benchmark_size, compare_results
+from .cache import bump_data_version, response_cache
+from .exceptions import ExternalApiError
+from .fast_serializers import serialize_rows
+from .jobs import (
+    RefreshLeaseError, acquire_refresh_lease, refresh_lease, release_refresh_lease, run_refresh_job,
+)
+from .image_cache import get_render_metrics, get_variant, render_cache
+from .rate_history import compact_rate_snapshots
+from .rates import publish_rate_table
+from .rollups import apply_rollup_delta, rebuild_rollups
+from .search import SearchIndex
+from .image_generator import (
+    CANVAS_SIZE, IMAGE_DIR, IMAGE_PATH, generate_summary_image, get_canvas_size, get_font,
+)
+from .serializers import CountrySerializer
+from .services import due_stages, refresh_country_data
+from .transforms import compute_gdp_columns, get_rng
+from .upstream import build_session, fetch_all
+from .views import SORT_OPTIONS, CountryListView
+
+
+class FakeSession:
+    """Stands in for the pooled requests.Session, serving canned upstream payloads."""
+
+    def __init__(self, countries, rates):
+        self.countries = countries
+        self.rates = rates
+        self.calls = []
+        self.down = set() # url fragments that fail to connect
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        self.calls.append((url, headers))
+        if any(fragment in url for fragment in self.down):
+            raise requests.exceptions.ConnectionError(url)
+        payload = {'rates': self.rates} if 'er-api' in url else self.countries
+        content = json.dumps(payload).encode()
+        etag = f'"{len(content)}-{hash(content)}"'
+
+        response = mock.Mock(headers={'ETag': etag}, content=content)
+        response.status_code = 304 if headers.get('If-None-Match') == etag else 200
+        response.raise_for_status.return_value = None
+        return response
+
+
+def fake_upstreams(countries, rates):
+    """Patches the fetch layer's session so refreshes read the given payloads."""
+    return mock.patch('countries.upstream.get_session', return_value=FakeSession(countries, rates))
+
+
+def make_countries(n):
+    return [
+        {
+            'name': f'Country {i}',
+            'capital': f'Capital {i}',
+            'region': 'Africa' if i % 2 else 'Europe',
+            'population': 1000 + i,
+            'flag': f'https://flags.example/{i}.svg',
+            'currencies': [{'code': 'NGN' if i % 2 else 'EUR'}],
+        }
+        for i in range(n)
+    ]
+
+
+RATES = {'NGN': 1600.5, 'EUR': 0.92}
+
+
+class APITestCase(TestCase):
+    """TestCase that starts every test with empty response/version caches."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        response_cache.clear()
+
+
+class BulkUpsertTests(TestCase):
+    def setUp(self):
+        Status.objects.create()
+
+    def refresh(self, countries, rates=RATES, force=True):
+        with fake_upstreams(countries, rates), \
+                mock.patch('countries.transforms.random.uniform', return_value=1500.0), \
+                mock.patch('countries.services.generate_summary_image'):
+            return refresh_country_data(force=force)
+
+    def count_refresh_queries(self, n):
+        Country.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            self.refresh(make_countries(n))
+        return len(ctx.captured_queries)
+
+    def test_query_count_is_constant_in_country_count(self):
+        self.count_refresh_queries(1) # creates the per-source validator rows
+        self.assertEqual(self.count_refresh_queries(10), self.count_refresh_queries(80))
+
+    def test_reports_inserted_updated_unchanged(self):
+        countries = make_countries(4)
+        _, _, counts = self.refresh(countries)
+        self.assertEqual(counts['inserted'], 4)
+
+        countries[0]['population'] += 1
+        countries.append({'name': 'New Land', 'population': 5, 'currencies': []})
+        total, _, counts = self.refresh(countries)
+        self.assertEqual(total, 5)
+        self.assertEqual(
+            [counts['inserted'], counts['updated'], counts['unchanged']], [1, 1, 3]
+        )
+        self.assertEqual(Country.objects.get(name='New Land').estimated_gdp, Decimal('0.00'))
+
+    def test_matches_existing_rows_case_insensitively(self):
+        countries = make_countries(1)
+        self.refresh(countries)
+        countries[0]['name'] = 'COUNTRY 0'
+        _, _, counts = self.refresh(countries)
+        self.assertEqual(counts['updated'], 1)
+        self.assertEqual(list(Country.objects.values_list('name', flat=True)), ['COUNTRY 0'])
+
+
+class ConditionalFetchTests(TestCase):
+    def refresh(self, countries, rates=RATES):
+        session = FakeSession(countries, rates)
+        with mock.patch('countries.upstream.get_session', return_value=session), \
+                mock.patch('countries.transforms.random.uniform', return_value=1500.0), \
+                mock.patch('countries.services.generate_summary_image') as render:
+            result = refresh_country_data()
+        return result, session, render
+
+    def test_unchanged_upstreams_skip_the_db_phase(self):
+        countries = make_countries(3)
+        self.refresh(countries)
+        before = list(Country.objects.values_list('last_refreshed_at', flat=True))
+
+        (total, _, details), session, render = self.refresh(countries)
+        self.assertEqual(details['processed_sources'], [])
+        self.assertEqual(total, 3)
+        self.assertTrue(all('If-None-Match' in headers for _, headers in session.calls))
+        self.assertEqual(list(Country.objects.values_list('last_refreshed_at', flat=True)), before)
+        render.assert_not_called()
+
+    def test_rate_change_only_reprices(self):
+        countries = make_countries(2)
+        self.refresh(countries)
+        Country.objects.filter(name='Country 0').update(capital='Edited locally')
+
+        (_, _, details), _, _ = self.refresh(countries, rates=dict(RATES, EUR=0.5))
+        self.assertEqual(details['processed_sources'], ['rates'])
+        self.assertEqual(details['updated'], 1)
+        country = Country.objects.get(name='Country 0')
+        self.assertEqual(country.exchange_rate, Decimal('0.5'))
+        self.assertEqual(country.capital, 'Edited locally')
+
+    def test_country_change_refetches_rates_unconditionally(self):
+        countries = make_countries(2)
+        self.refresh(countries)
+        countries.append({'name': 'New Land', 'population': 10, 'currencies': [{'code': 'EUR'}]})
+
+        (_, _, details), _, _ = self.refresh(countries)
+        self.assertEqual(details['processed_sources'], ['countries'])
+        self.assertEqual(Country.objects.get(name='New Land').exchange_rate, Decimal('0.92'))
+
+
+class PartialRefreshTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = FakeSession(make_countries(2), RATES)
+
+    def refresh(self, **kwargs):
+        with mock.patch('countries.upstream.get_session', return_value=self.session), \
+                mock.patch('countries.transforms.random.uniform', return_value=1500.0), \
+                mock.patch('countries.services.generate_summary_image'):
+            return refresh_country_data(**kwargs)
+
+    def stage(self, name):
+        return RefreshStage.objects.get(name=name)
+
+    def test_countries_are_priced_with_stored_rates_while_rates_are_down(self):
+        self.refresh()
+        self.session.countries = make_countries(3)
+        self.session.down = {'er-api'}
+
+        total, _, details = self.refresh()
+        self.assertEqual(total, 3)
+        self.assertEqual(details['stages']['rates'], 'failed')
+        self.assertEqual(details['stages']['countries'], 'updated')
+        self.assertIn('open.er-api.com', details['errors']['rates'])
+        self.assertEqual(Country.objects.get(name='Country 2').exchange_rate, Decimal('0.92'))
+
+        stages = self.client.get('/status').json()['stages']
+        self.assertIn('open.er-api.com', stages['rates']['last_error'])
+        self.assertIsNotNone(stages['rates']['last_succeeded_at'])
+        self.assertIsNone(stages['countries']['last_error'])
+
+    def test_rates_are_processed_while_countries_are_down(self):
+        self.refresh()
+        validators = UpstreamSource.objects.get(name='countries').validators()
+        self.session.down = {'restcountries'}
+        self.session.rates = dict(RATES, EUR=0.5)
+
+        _, _, details = self.refresh()
+        self.assertEqual(details['stages'], {
+            'countries': 'failed', 'rates': 'updated', 'gdp': 'updated', 'image': 'scheduled',
+        })
+        self.assertEqual(Country.objects.get(name='Country 0').exchange_rate, Decimal('0.5'))
+        self.assertEqual(UpstreamSource.objects.get(name='countries').validators(), validators)
+
+    def test_rates_stage_alone_skips_the_country_download(self):
+        self.refresh()
+        self.session.calls.clear()
+        self.session.rates = dict(RATES, EUR=0.5)
+
+        _, _, details = self.refresh(stages=['rates'])
+        self.assertEqual(list(details['stages']), ['rates', 'gdp', 'image'])
+        self.assertTrue(all('er-api' in url for url, _ in self.session.calls))
+        self.assertEqual(Country.objects.get(name='Country 0').exchange_rate, Decimal('0.5'))
+
+    def test_fails_only_when_every_upstream_is_down(self):
+        self.refresh()
+        self.session.down = {'er-api', 'restcountries'}
+        with self.assertRaises(ExternalApiError):
+            self.refresh()
+        self.assertEqual(
+            set(RefreshStage.objects.exclude(last_error=None).values_list('name', flat=True)),
+            {'countries', 'rates'},
+        )
+        self.assertEqual(Country.objects.count(), 2)
+
+    @override_settings(REFRESH_STAGE_INTERVALS={'rates': 60, 'countries': 3600})
+    def test_due_stages_follow_their_intervals(self):
+        self.assertEqual(due_stages(), ['countries', 'rates'])
+        # The render is recorded on commit; the mock must outlive the callbacks
+        with mock.patch('countries.services.generate_summary_image'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.refresh()
+        now = timezone.now()
+        self.assertEqual(due_stages(now + timedelta(seconds=30)), [])
+        self.assertEqual(due_stages(now + timedelta(seconds=90)), ['rates'])
+        self.assertEqual(due_stages(now + timedelta(hours=2)), ['countries', 'rates'])
+
+    def test_unknown_stage_is_rejected(self):
+        response = self.client.post('/countries/refresh?stages=rates,weather')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('weather', response.json()['details']['stages'])
+
+
+class PaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = datetime.now()
+        Country.objects.bulk_create([
+            Country(
+                name=f'Land {i:02d}',
+                population=1000 * (i % 5), # plenty of ties
+                currency_code='EUR',
+                region='Europe',
+                estimated_gdp=None if i % 4 == 0 else Decimal(i % 3),
+                last_refreshed_at=now,
+            )
+            for i in range(23)
+        ])
+
+    def walk(self, params, key='next'):
+        names, url = [], '/countries?' + urlencode(params)
+        while url:
+            body = self.client.get(url).json()
+            names.extend(row['name'] for row in body['results'])
+            url = body[key]
+        return names, body
+
+    def test_unpaginated_without_params(self):
+        self.assertEqual(len(self.client.get('/countries').json()), 23)
+
+    def test_cursor_walk_matches_full_ordering_for_every_sort(self):
+        for sort in SORT_OPTIONS:
+            with self.subTest(sort=sort):
+                expected = [row['name'] for row in self.client.get('/countries', {'sort': sort}).json()]
+                names, _ = self.walk({'sort': sort, 'limit': 5})
+                self.assertCountEqual(names, expected)
+                self.assertEqual(len(names), len(set(names)))
+                self.assertEqual(names, expected)
+                offset = self.client.get('/countries', {'sort': sort, 'offset': 0, 'limit': 50}).json()
+                self.assertEqual([row['name'] for row in offset['results']], expected)
+
+    def test_previous_cursor_walks_back(self):
+        names, last_page = self.walk({'sort': 'gdp_desc', 'limit': 5})
+        back = []
+        url = last_page['previous']
+        while url:
+            body = self.client.get(url).json()
+            back = [row['name'] for row in body['results']] + back
+            url = body['previous']
+        self.assertEqual(back, names[:len(back)])
+        self.assertEqual(len(back), len(names) - len(last_page['results']))
+
+    def test_cursor_mode_does_not_use_offset(self):
+        _, body = self.walk({'sort': 'population_desc', 'limit': 5})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(body['previous'])
+        self.assertNotIn('OFFSET', ctx.captured_queries[-1]['sql'].upper())
+
+    def test_offset_mode_and_bad_cursor(self):
+        body = self.client.get('/countries', {'limit': 5, 'offset': 20}).json()
+        self.assertEqual(body['count'], 23)
+        self.assertEqual(len(body['results']), 3)
+        self.assertEqual(self.client.get('/countries', {'cursor': 'nope'}).status_code, 404)
+
+        for sort, field in (('population_desc', '-population'), ('gdp_desc', '-estimated_gdp')):
+            payload = json.dumps({'s': field, 'v': 'abc', 'id': 1, 'r': False}).encode()
+            cursor = base64.urlsafe_b64encode(payload).decode()
+            response = self.client.get('/countries', {'sort': sort, 'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class ResponseCacheTests(APITestCase):
+    def refresh(self, countries):
+        with fake_upstreams(countries, RATES), \
+                mock.patch('countries.services.generate_summary_image'), \
+                self.captureOnCommitCallbacks(execute=True):
+            refresh_country_data()
+
+    def test_hits_skip_the_database(self):
+        self.refresh(make_countries(3))
+        for url in ['/countries?region=Africa', '/countries/country 1', '/status']:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+
+        # Normalized params share an entry
+        with self.assertNumQueries(0):
+            self.client.get('/countries?region=AFRICA')
+            self.client.get('/countries/COUNTRY 1')
+
+    def test_no_stale_response_after_refresh(self):
+        countries = make_countries(3)
+        self.refresh(countries)
+        self.assertEqual(len(self.client.get('/countries').json()), 3)
+        self.assertEqual(self.client.get('/status').json()['total_countries'], 3)
+
+        countries.append({'name': 'New Land', 'population': 5, 'currencies': []})
+        self.refresh(countries)
+        self.assertEqual(len(self.client.get('/countries').json()), 4)
+        self.assertEqual(self.client.get('/status').json()['total_countries'], 4)
+
+    def test_create_and_delete_invalidate(self):
+        self.refresh(make_countries(1))
+        self.client.get('/countries')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/countries/create', {'name': 'Extra', 'population': 1, 'currency_code': 'EUR'})
+        self.assertEqual(len(self.client.get('/countries').json()), 2)
+
+        self.assertEqual(self.client.get('/countries/extra').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/countries/extra')
+        self.assertEqual(self.client.get('/countries/extra').status_code, 404)
+
+    def test_lru_bounds(self):
+        lru = type(response_cache)(max_entries=2, max_bytes=10)
+        lru.set('a', 'A', 4)
+        lru.set('b', 'B', 4)
+        lru.get('a')
+        lru.set('c', 'C', 4) # over the byte budget: evicts least recently used 'b'
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 'A')
+        lru.set('huge', 'H', 11)
+        self.assertIsNone(lru.get('huge'))
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        with fake_upstreams(make_countries(2), RATES), \
+                mock.patch('countries.services.generate_summary_image'), \
+                self.captureOnCommitCallbacks(execute=True):
+            refresh_country_data()
+
+    def test_matching_etag_is_304_without_queries(self):
+        for url in ['/countries?sort=gdp_desc', '/countries/country 0', '/status']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(0):
+                    revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_etag_varies_with_params_and_data(self):
+        etag = self.client.get('/countries')['ETag']
+        self.assertNotEqual(self.client.get('/countries?region=Africa')['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/countries/create', {'name': 'Extra', 'population': 1, 'currency_code': 'EUR'})
+        response = self.client.get('/countries', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/status')['Last-Modified']
+        response = self.client.get('/status', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_summary_image_conditional_and_cacheable(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(workdir)
+        os.makedirs('cache')
+        with open(os.path.join('cache', 'summary.png'), 'wb') as f:
+            f.write(b'\x89PNG fake')
+
+        response = self.client.get('/countries/image')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        revalidated = self.client.get('/countries/image', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+
+def seed_countries(n):
+    now = timezone.now()
+    Country.objects.bulk_create([
+        Country(
+            name=f'Seed {i:06d}',
+            population=i * 31,
+            currency_code=None if i % 7 == 0 else 'EUR',
+            capital=None if i % 5 == 0 else f'Capital {i}',
+            region=('Africa', 'Europe', None)[i % 3],
+            estimated_gdp=Decimal(i),
+            last_refreshed_at=now - timedelta(microseconds=i % 3),
+        )
+        for i in range(n)
+    ], batch_size=500)
+
+
+def render_json(data):
+    return JSONRenderer().render(data)
+
+
+class FastSerializationTests(TestCase):
+    def test_output_is_byte_identical_to_model_serializer(self):
+        seed_countries(60)
+        for params in [{}, {'sort': 'gdp_desc'}, {'region': 'africa', 'currency': 'eur'}]:
+            with self.subTest(params=params):
+                view = CountryListView()
+                view.request = view.initialize_request(RequestFactory().get('/countries', params))
+                queryset = view.get_queryset()
+                slow = render_json(CountrySerializer(queryset, many=True).data)
+                fast = render_json(serialize_rows(CountrySerializer, queryset))
+                self.assertEqual(fast, slow)
+
+    def test_view_response_is_byte_identical(self):
+        seed_countries(10)
+        fast = self.client.get('/countries').content
+        with mock.patch.object(CountryListView, 'fast_serialization', False):
+            cache.clear()
+            response_cache.clear()
+            slow = self.client.get('/countries').content
+        self.assertEqual(fast, slow)
+
+
+class ExportTests(APITestCase):
+    def export(self, **params):
+        response = self.client.get('/countries/export', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    @override_settings(COUNTRY_EXPORT_CHUNK_SIZE=7)
+    def test_json_export_matches_list_body(self):
+        seed_countries(40)
+        # NULL GDPs, so both orderings cross the NULL block
+        Country.objects.filter(name__in=[f'Seed {i:06d}' for i in range(0, 40, 4)]).update(estimated_gdp=None)
+        for params in [{}, {'sort': 'gdp_desc', 'region': 'africa'}, {'sort': 'population_desc'},
+                       {'sort': 'gdp_asc'}, {'sort': 'gdp_asc', 'region': 'africa'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.export(**params), self.client.get('/countries', params).content)
+
+    def test_ndjson_and_csv(self):
+        seed_countries(5)
+        lines = self.export(format='ndjson').decode().splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], [f'Seed {i:06d}' for i in range(5)])
+
+        rows = list(csv.reader(io.StringIO(self.export(format='csv', currency='EUR').decode())))
+        self.assertEqual(rows[0][:2], ['name', 'population'])
+        self.assertEqual(len(rows), 1 + 4)
+
+    def test_empty_and_invalid(self):
+        self.assertEqual(self.export(), b'[]')
+        self.assertEqual(self.export(format='ndjson'), b'')
+        self.assertEqual(self.client.get('/countries/export', {'format': 'xml'}).status_code, 400)
+
+    @override_settings(COUNTRY_EXPORT_CHUNK_SIZE=200)
+    def test_peak_memory_is_flat_in_table_size(self):
+        def peak_for(n):
+            Country.objects.all().delete()
+            seed_countries(n)
+            response = self.client.get('/countries/export', {'format': 'ndjson'})
+            tracemalloc.start()
+            try:
+                for _ in response.streaming_content:
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small, large = peak_for(1000), peak_for(10000)
+        self.assertLess(large, small * 2)
+
+
+@skipUnless(os.environ.get('COUNTRIES_BENCHMARKS'), "set COUNTRIES_BENCHMARKS=1 to run benchmarks")
+class FastSerializationBenchmark(TestCase):
+    def test_compare_paths(self):
+        for n in (250, 10_000, 100_000):
+            Country.objects.all().delete()
+            seed_countries(n)
+            queryset = Country.objects.all()
+
+            start = time.perf_counter()
+            slow = render_json(CountrySerializer(queryset, many=True).data)
+            slow_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            fast = render_json(serialize_rows(CountrySerializer, queryset))
+            fast_time = time.perf_counter() - start
+
+            self.assertEqual(fast, slow)
+            print(f"\n{n:>7} rows: ModelSerializer {slow_time * 1000:8.1f}ms  "
+                  f"values_list {fast_time * 1000:8.1f}ms  ({slow_time / fast_time:.1f}x)")
+
+
+class RefreshJobExecutionTests(TransactionTestCase):
+    """Runs jobs in autocommit mode, so on_commit hooks fire as they do in production."""
+
+    def setUp(self):
+        cache.clear()
+        response_cache.clear()
+
+    @override_settings(REFRESH_JOBS_ALWAYS_EAGER=True)
+    def test_job_status_reports_phases_and_counts(self):
+        with fake_upstreams(make_countries(3), RATES), \
+                mock.patch('countries.services.generate_summary_image') as render:
+            job_id = self.client.post('/countries/refresh').json()['job_id']
+
+        body = self.client.get(f'/countries/refresh/{job_id}').json()
+        self.assertEqual(body['state'], RefreshJob.SUCCEEDED)
+        self.assertEqual(set(body['timings']), {'fetch', 'transform', 'process', 'image'})
+        self.assertEqual(body['result']['inserted'], 3)
+        render.assert_called_once()
+
+
+class SummaryImageTests(TestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(workdir)
+
+    def test_rendered_after_commit_only(self):
+        with fake_upstreams(make_countries(2), RATES), \
+                mock.patch('countries.services.generate_summary_image') as render:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                refresh_country_data()
+            render.assert_not_called()
+            for callback in callbacks:
+                callback()
+        render.assert_called_once()
+
+    def test_writes_png_atomically_with_cached_fonts(self):
+        seed_countries(8)
+        get_font.cache_clear()
+        generate_summary_image(8, timezone.now())
+        generate_summary_image(8, timezone.now())
+
+        self.assertEqual(os.listdir(IMAGE_DIR), ['summary.png'])
+        with Image.open(IMAGE_PATH) as img:
+            self.assertEqual(img.size, CANVAS_SIZE)
+        self.assertEqual(get_font.cache_info().misses, 2) # one load per size, ever
+
+
+class ImageVariantTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        render_cache.clear()
+        seed_countries(12)
+
+    def test_renders_requested_size_and_format(self):
+        response = self.client.get('/countries/image', {'region': 'Africa', 'top': 10, 'width': 1000, 'format': 'webp'})
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['X-Render-Cache'], 'miss')
+        with Image.open(io.BytesIO(response.content)) as img:
+            self.assertEqual(img.size, get_canvas_size(1000, 10))
+
+    def test_cache_hits_and_invalidation_by_version(self):
+        params = {'top': 3}
+        self.client.get('/countries/image', params)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/countries/image', params)['X-Render-Cache'], 'hit')
+        self.assertGreater(get_render_metrics()['hit_ratio'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/countries/create', {'name': 'Extra', 'population': 1, 'currency_code': 'EUR'})
+        self.assertEqual(self.client.get('/countries/image', params)['X-Render-Cache'], 'miss')
+
+    def test_invalid_params(self):
+        response = self.client.get('/countries/image', {'top': 0, 'width': 'wide', 'format': 'gif'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['details']), {'top', 'width', 'format'})
+
+    def test_concurrent_identical_requests_render_once(self):
+        gate = threading.Event()
+
+        def slow_render(*args):
+            gate.wait(5)
+            return 'image/png', b'png-bytes'
+
+        results = []
+        with mock.patch('countries.image_cache.render_variant', side_effect=slow_render) as render, \
+                mock.patch('countries.image_cache.get_data_version', return_value=1):
+            threads = [
+                threading.Thread(target=lambda: results.append(get_variant(None, 7, 500, 'png')))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.2)
+            gate.set()
+            for thread in threads:
+                thread.join()
+
+        render.assert_called_once()
+        self.assertEqual({result[1] for result in results}, {b'png-bytes'})
+        self.assertEqual(sorted(result[3] for result in results).count('coalesced'), 4)
+
+
+class GdpTransformTests(SimpleTestCase):
+    def test_column_semantics(self):
+        rates, gdps = compute_gdp_columns(
+            [1000, 2000, 3000], ['EUR', None, 'XXX'], {'EUR': 0.5}, rng=mock.Mock(uniform=lambda a, b: 1500.0)
+        )
+        self.assertEqual(rates, [Decimal('0.500000'), None, None])
+        self.assertEqual(gdps, [Decimal('3000000.00'), Decimal('0.00'), None])
+
+    def test_seed_makes_output_reproducible(self):
+        columns = ([10 ** 6] * 50, ['NGN', 'EUR'] * 25, RATES)
+        self.assertEqual(
+            compute_gdp_columns(*columns, rng=get_rng(7)), compute_gdp_columns(*columns, rng=get_rng(7))
+        )
+        self.assertNotEqual(
+            compute_gdp_columns(*columns, rng=get_rng(7)), compute_gdp_columns(*columns, rng=get_rng(8))
+        )
+
+    @override_settings(GDP_RANDOM_SEED=3)
+    def test_seed_setting(self):
+        self.assertEqual(get_rng().random(), get_rng().random())
+
+
+@skipUnless(os.environ.get('COUNTRIES_BENCHMARKS'), "set COUNTRIES_BENCHMARKS=1 to run benchmarks")
+class GdpTransformBenchmark(SimpleTestCase):
+    def test_transform_throughput(self):
+        codes = list(RATES) + [None, 'XXX']
+        for n in (250, 10_000, 100_000):
+            populations = [1000 + i for i in range(n)]
+            currency_codes = [codes[i % len(codes)] for i in range(n)]
+            start = time.perf_counter()
+            compute_gdp_columns(populations, currency_codes, RATES, rng=get_rng(1))
+            elapsed = time.perf_counter() - start
+            print(f"\n{n:>7} rows: transform {elapsed * 1000:8.1f}ms ({n / elapsed:,.0f} rows/s)")
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """Serves a small JSON body after a fixed delay; /fail answers 500."""
+    delay = 0.3
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.path.startswith('/fail'):
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps({'rates': {'EUR': 0.9}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchLayerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubUpstreamHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def sources(self, rates_path='/rates', countries_path='/countries'):
+        return {
+            'rates': {'api_name': 'open.er-api.com', 'url': self.base_url + rates_path},
+            'countries': {'api_name': 'restcountries.com', 'url': self.base_url + countries_path},
+        }
+
+    def timed_fetch(self, parallel):
+        start = time.perf_counter()
+        payloads = fetch_all(sources=self.sources(), session=build_session(max_retries=0), parallel=parallel)
+        return time.perf_counter() - start, payloads
+
+    def test_parallel_fetch_beats_serial(self):
+        serial, serial_payloads = self.timed_fetch(parallel=False)
+        parallel, parallel_payloads = self.timed_fetch(parallel=True)
+        self.assertEqual(serial_payloads, parallel_payloads)
+        self.assertGreaterEqual(serial, 2 * StubUpstreamHandler.delay)
+        self.assertLess(parallel, serial * 0.75)
+
+    def test_error_names_the_failing_source(self):
+        session = build_session(max_retries=0)
+        with self.assertRaises(ExternalApiError) as ctx:
+            fetch_all(sources=self.sources(countries_path='/fail'), session=session)
+        self.assertEqual(ctx.exception.api_name, 'restcountries.com')
+
+        with self.assertRaises(ExternalApiError) as ctx:
+            fetch_all(sources=self.sources(rates_path='/fail'), session=session)
+        self.assertEqual(ctx.exception.api_name, 'open.er-api.com')
+
+
+class RefreshJobTests(APITestCase):
+    def post_refresh(self):
+        return self.client.post('/countries/refresh')
+
+    def test_refresh_is_enqueued_and_deduplicated(self):
+        with mock.patch('countries.jobs.submit_job') as submit, \
+                self.captureOnCommitCallbacks(execute=True):
+            first = self.post_refresh()
+            second = self.post_refresh()
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.json()['state'], RefreshJob.QUEUED)
+        self.assertEqual(second.json()['job_id'], first.json()['job_id'])
+        self.assertFalse(second.json()['created'])
+        submit.assert_called_once()
+
+    @override_settings(REFRESH_JOBS_ALWAYS_EAGER=True)
+    def test_failed_job_names_the_upstream(self):
+        with mock.patch('countries.services.fetch_all', side_effect=ExternalApiError('restcountries.com')), \
+                self.captureOnCommitCallbacks(execute=True):
+            job_id = self.post_refresh().json()['job_id']
+
+        body = self.client.get(f'/countries/refresh/{job_id}').json()
+        self.assertEqual(body['state'], RefreshJob.FAILED)
+        self.assertIn('restcountries.com', body['error'])
+
+    def test_unknown_job_is_404(self):
+        response = self.client.get('/countries/refresh/00000000-0000-0000-0000-000000000000')
+        self.assertEqual(response.status_code, 404)
+
+
+class RefreshLeaseTests(TestCase):
+    def test_one_holder_until_release_or_expiry(self):
+        self.assertTrue(acquire_refresh_lease('a', 60))
+        self.assertTrue(acquire_refresh_lease('a', 60)) # renewal
+        self.assertFalse(acquire_refresh_lease('b', 60))
+
+        release_refresh_lease('b') # not the holder: no effect
+        self.assertFalse(acquire_refresh_lease('b', 60))
+        release_refresh_lease('a')
+        self.assertTrue(acquire_refresh_lease('b', 60))
+
+        # A crashed holder stops renewing; its lease lapses
+        Status.objects.update(refresh_lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(acquire_refresh_lease('a', 60))
+        with self.assertRaises(RefreshLeaseError):
+            with refresh_lease('b'):
+                pass
+
+    def test_job_fails_while_another_process_refreshes(self):
+        acquire_refresh_lease('other-replica', 60)
+        job = RefreshJob.objects.create()
+        with mock.patch('countries.jobs.refresh_country_data') as refresh:
+            run_refresh_job(job.pk)
+        refresh.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.state, RefreshJob.FAILED)
+        self.assertIn('other-replica', job.error)
+
+
+class RefresherCommandTests(TransactionTestCase):
+    """Autocommit, so the image renders inside the tick as it does in production."""
+
+    def setUp(self):
+        cache.clear()
+        response_cache.clear()
+
+    def run_refresher(self, *args):
+        out = io.StringIO()
+        with fake_upstreams(make_countries(3), RATES), \
+                mock.patch('countries.services.generate_summary_image'):
+            call_command('run_refresher', '--once', *args, stdout=out)
+        return out.getvalue()
+
+    def test_refresher_runs_due_stages_and_logs_phases(self):
+        output = self.run_refresher()
+        self.assertIn('Refreshing countries, rates, gdp, image', output)
+        self.assertIn('Refreshed 3 countries (3 inserted, 0 updated)', output)
+        for phase in ('fetch', 'transform', 'process', 'image'):
+            self.assertRegex(output, rf'  {phase}: \d+\.\d{{3}}s')
+        # Released after the tick
+        self.assertIsNone(Status.objects.get().refresh_lease_owner)
+
+        self.assertIn('No stages due', self.run_refresher())
+        self.assertEqual(Country.objects.count(), 3)
+
+    def test_refresher_skips_while_the_lease_is_held(self):
+        acquire_refresh_lease('other-replica', 60)
+        output = self.run_refresher('--stage', 'rates')
+        self.assertIn('Skipped: Another refresh is in progress (held by other-replica', output)
+        self.assertFalse(Country.objects.exists())
+
+
+class RateHistoryTests(APITestCase):
+    def refresh(self, rates, force=False):
+        with fake_upstreams(make_countries(2), rates), \
+                mock.patch('countries.transforms.random.uniform', return_value=1500.0), \
+                mock.patch('countries.services.generate_summary_image'):
+            return refresh_country_data(force=force)
+
+    def snapshot(self, code, rate, taken_at):
+        RateSnapshot.objects.create(currency_code=code, rate=Decimal(rate), taken_at=taken_at)
+
+    def test_refresh_records_one_snapshot_per_currency(self):
+        self.refresh(RATES)
+        self.refresh(RATES) # unchanged upstream: nothing new to record
+        self.refresh(dict(RATES, NGN=1601.25))
+        self.assertEqual(RateSnapshot.objects.filter(currency_code='EUR').count(), 2)
+        self.assertEqual(
+            list(RateSnapshot.objects.filter(currency_code='NGN').order_by('taken_at').values_list('rate', flat=True)),
+            [Decimal('1600.500000'), Decimal('1601.250000')],
+        )
+
+    def test_resampled_history(self):
+        day = datetime(2026, 3, 2, tzinfo=dt_timezone.utc)
+        for hours, rate in [(1, '1.0'), (2, '3.0'), (26, '2.0')]:
+            self.snapshot('EUR', rate, day + timedelta(hours=hours))
+
+        url = '/rates/eur/history?from=2026-03-01&to=2026-03-08'
+        raw = self.client.get(url).json()
+        self.assertEqual([p['rate'] for p in raw['points']], ['1.000000', '3.000000', '2.000000'])
+
+        points = self.client.get(url + '&resample=day').json()['points']
+        self.assertEqual(
+            [(p['min'], p['max'], p['avg'], p['samples']) for p in points],
+            [('1.000000', '3.000000', '2.000000', 2), ('2.000000', '2.000000', '2.000000', 1)],
+        )
+        week, = self.client.get(url + '&resample=week').json()['points']
+        self.assertEqual(week['samples'], 3)
+
+    def test_compaction_keeps_history_queryable(self):
+        now = timezone.now()
+        old = (now - timedelta(days=20)).replace(hour=6)
+        for hours, rate in [(0, '1.0'), (1, '3.0')]:
+            self.snapshot('EUR', rate, old + timedelta(hours=hours))
+        self.snapshot('EUR', '5.0', now)
+
+        self.assertEqual(compact_rate_snapshots(retention_days=7, now=now), 2)
+        self.assertEqual(RateSnapshot.objects.count(), 1)
+        aggregate = RateDailyAggregate.objects.get()
+        self.assertEqual((aggregate.min_rate, aggregate.max_rate, aggregate.avg_rate),
+                         (Decimal('1'), Decimal('3'), Decimal('2')))
+
+        # A later compaction of the same day merges into the existing aggregate
+        self.snapshot('EUR', '8.0', old + timedelta(hours=2))
+        compact_rate_snapshots(retention_days=7, now=now)
+        aggregate.refresh_from_db()
+        self.assertEqual((aggregate.max_rate, aggregate.samples), (Decimal('8'), 3))
+
+        points = self.client.get('/rates/EUR/history?resample=day').json()['points']
+        self.assertEqual([(p['avg'], p['samples']) for p in points], [('4.000000', 3), ('5.000000', 1)])
+
+    def test_invalid_params(self):
+        response = self.client.get('/rates/EURO/history?from=yesterday&resample=month')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['details']), {'code', 'from', 'resample'})
+
+        response = self.client.get('/rates/NGN/history?from=2026-13-01&to=2026-02-30T00:00:00')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['details']), {'from', 'to'})
+
+
+class ConvertTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        rates._table = None
+        taken_at = timezone.now()
+        for code, rate in {'USD': 1, **RATES}.items():
+            RateSnapshot.objects.create(currency_code=code, rate=Decimal(str(rate)), taken_at=taken_at)
+
+    def test_cross_rate_is_decimal_exact(self):
+        body = self.client.get('/convert?from=eur&to=NGN&amount=10.50').json()
+        rate = Decimal('1600.5') / Decimal('0.92')
+        self.assertEqual(body['rate'], str(rate.quantize(Decimal('0.000001'))))
+        self.assertEqual(body['result'], str((Decimal('10.50') * rate).quantize(Decimal('0.000001'))))
+
+    def test_served_from_memory_until_the_version_moves(self):
+        self.client.get('/convert?from=USD&to=EUR')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/convert?from=USD&to=EUR').json()['result'], '0.920000')
+
+        publish_rate_table({'USD': 1, **RATES, 'EUR': 0.5}, timezone.now())
+        self.assertEqual(self.client.get('/convert?from=USD&to=EUR').json()['result'], '0.500000')
+
+        # Another process's refresh: only the data version tells this one to reload
+        bump_data_version()
+        cache.clear()
+        self.assertEqual(self.client.get('/convert?from=USD&to=EUR').json()['result'], '0.920000')
+
+    def test_refresh_publishes_a_table_for_the_committed_version(self):
+        self.client.get('/convert?from=USD&to=EUR')
+        with fake_upstreams(make_countries(2), {'USD': 1, **RATES, 'EUR': 0.5}), \
+                mock.patch('countries.services.generate_summary_image') as render, \
+                self.captureOnCommitCallbacks(execute=True):
+            refresh_country_data(force=True)
+        render.assert_called_once()
+
+        # The refresh handed over its table, retagged after the image render's
+        # bump; nothing is reloaded from the rate history
+        with self.assertNumQueries(1): # the data version read
+            self.assertEqual(self.client.get('/convert?from=USD&to=EUR').json()['result'], '0.500000')
+
+    def test_batch_reports_failures_by_index(self):
+        response = self.client.post('/convert', json.dumps({'conversions': [
+            {'from': 'USD', 'to': 'NGN', 'amount': '2'},
+            {'from': 'USD', 'to': 'XXX', 'amount': '2'},
+            {'from': 'USD', 'to': 'EUR', 'amount': 'lots'},
+            'USD->EUR',
+        ]}), content_type='application/json')
+        body = response.json()
+        self.assertEqual(body['results'], ['3201.000000', None, None, None])
+        self.assertEqual(sorted(body['errors']), ['1', '2', '3'])
+
+    def test_out_of_range_amounts(self):
+        response = self.client.get('/convert?from=USD&to=NGN&amount=1e20')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details']['conversion'], "Amount out of range")
+
+        response = self.client.post('/convert', json.dumps({'conversions': [
+            {'from': 'USD', 'to': 'NGN', 'amount': '1e20'},
+            {'from': 'USD', 'to': 'NGN', 'amount': '2'},
+        ]}), content_type='application/json')
+        body = response.json()
+        self.assertEqual(body['results'], [None, '3201.000000'])
+        self.assertEqual(body['errors'], {'0': "Amount out of range"})
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/convert?from=USD').status_code, 400)
+        self.assertEqual(self.client.get('/convert?from=USD&to=XXX').status_code, 400)
+        self.assertEqual(self.client.post('/convert', '{"conversions": "USD"}', content_type='application/json').status_code, 400)
+        RateSnapshot.objects.all().delete()
+        rates._table = None
+        self.assertEqual(self.client.get('/convert?from=USD&to=EUR').status_code, 503)
+
+
+@skipUnless(os.environ.get('COUNTRIES_BENCHMARKS'), "set COUNTRIES_BENCHMARKS=1 to run benchmarks")
+class ConvertBenchmark(APITestCase):
+    def test_batch_of_100k(self):
+        publish_rate_table({'USD': 1, **RATES}, timezone.now())
+        codes = ['USD', 'NGN', 'EUR']
+        conversions = [
+            {'from': codes[i % 3], 'to': codes[(i + 1) % 3], 'amount': str(i)}
+            for i in range(100_000)
+        ]
+        body = json.dumps({'conversions': conversions})
+
+        start = time.perf_counter()
+        response = self.client.post('/convert', body, content_type='application/json')
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 100_000)
+        print(f"\nPOST /convert with 100k pairs: {elapsed * 1000:.1f}ms")
+
+
+class CountryBulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        Country.objects.create(name='Niger', population=1, currency_code='XOF', last_refreshed_at=timezone.now())
+
+    def post_bulk(self, rows):
+        return self.client.post('/countries/bulk', json.dumps(rows), content_type='application/json')
+
+    def test_upserts_valid_rows_and_reports_errors_by_index(self):
+        response = self.post_bulk([
+            {'name': 'NIGER', 'population': 2, 'currency_code': 'XOF'},
+            {'name': 'Chad', 'population': 3, 'currency_code': 'XAF', 'region': 'Africa'},
+            {'name': 'Mali', 'currency_code': 'XOF'},
+            {'name': 'chad', 'population': 4, 'currency_code': 'XAF'},
+            'Benin',
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([body['inserted'], body['updated'], body['unchanged']], [1, 1, 0])
+        self.assertEqual(sorted(body['errors']), ['2', '3', '4'])
+        self.assertEqual(
+            list(Country.objects.values_list('name', 'population')), [('Chad', 3), ('NIGER', 2)]
+        )
+        self.assertEqual(CountryRollup.objects.get(dimension='region', key='Africa').countries, 1)
+
+    def test_currency_change_clears_derived_columns(self):
+        Country.objects.filter(name='Niger').update(exchange_rate=Decimal('600'), estimated_gdp=Decimal('5'))
+        self.post_bulk([{'name': 'Niger', 'population': 1, 'currency_code': 'XOF'}])
+        self.assertEqual(Country.objects.get(name='Niger').estimated_gdp, Decimal('5'))
+
+        self.post_bulk([{'name': 'Niger', 'population': 1, 'currency_code': 'NGN'}])
+        niger = Country.objects.get(name='Niger')
+        self.assertEqual((niger.exchange_rate, niger.estimated_gdp), (None, None))
+
+    @override_settings(COUNTRY_BULK_MAX_BODY_BYTES=100, CONVERT_MAX_BODY_BYTES=1)
+    def test_body_limit_has_its_own_setting(self):
+        row = {'name': 'Chad', 'population': 3, 'currency_code': 'XAF'}
+        self.assertEqual(self.post_bulk([row]).status_code, 200)
+        self.assertEqual(self.post_bulk([row] * 4).status_code, 400)
+
+    def test_accepts_ndjson(self):
+        body = '{"name": "Chad", "population": 3, "currency_code": "XAF"}\n\n' \
+               '{"name": "Niger", "population": 1, "currency_code": "XOF"}\n'
+        response = self.client.post('/countries/bulk', body, content_type='application/x-ndjson')
+        self.assertEqual(response.json(), {'inserted': 1, 'updated': 0, 'unchanged': 1, 'errors': {}})
+
+        response = self.client.post('/countries/bulk', '{"name": "Chad"}\n{', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_is_constant_in_row_count(self):
+        def count_queries(n):
+            rows = [{'name': f'Country {i}', 'population': i, 'currency_code': 'EUR'} for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.post_bulk(rows).status_code, 200)
+            Country.objects.exclude(name='Niger').delete()
+            return len(ctx.captured_queries)
+
+        count_queries(1) # creates the Status row
+        self.assertEqual(count_queries(10), count_queries(80))
+
+    def test_delete_by_names(self):
+        Country.objects.create(name='Chad', population=3, last_refreshed_at=timezone.now())
+        response = self.client.delete('/countries/bulk', json.dumps(['niger', 'Atlantis', 'CHAD']),
+                                      content_type='application/json')
+        self.assertEqual(response.json(), {'deleted': 2, 'not_found': ['Atlantis']})
+        self.assertFalse(Country.objects.exists())
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post_bulk({'name': 'Chad'}).status_code, 400)
+        # Every row invalid: nothing to write
+        self.assertEqual(self.post_bulk([{'name': 'Chad'}]).status_code, 400)
+        response = self.client.delete('/countries/bulk', json.dumps(['Niger', 7]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Country.objects.filter(name='Niger').exists())
+
+
+@skipUnless(os.environ.get('COUNTRIES_BENCHMARKS'), "set COUNTRIES_BENCHMARKS=1 to run benchmarks")
+class CountryBulkBenchmark(APITestCase):
+    def timed(self, method, path, rows, content_type='application/json'):
+        start = time.perf_counter()
+        response = self.client.generic(method, path, rows, content_type=content_type)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200 if path.endswith('bulk') else 201)
+        return elapsed
+
+    def test_10k_rows(self):
+        rows = [
+            {'name': f'Country {i}', 'population': i, 'currency_code': 'EUR', 'region': f'Region {i % 5}'}
+            for i in range(10_000)
+        ]
+        inserted = self.timed('POST', '/countries/bulk', json.dumps(rows))
+        for row in rows[::2]:
+            row['population'] += 1
+        updated = self.timed('POST', '/countries/bulk', '\n'.join(map(json.dumps, rows)), 'application/x-ndjson')
+        deleted = self.timed('DELETE', '/countries/bulk', json.dumps([row['name'] for row in rows]))
+        self.assertFalse(Country.objects.exists())
+
+        # The per-row endpoint, timed on a sample and scaled to 10k
+        sample = 200
+        single = sum(
+            self.timed('POST', '/countries/create', json.dumps(row)) for row in rows[:sample]
+        ) * len(rows) / sample
+        print(f"\n10k rows: bulk insert {inserted * 1000:.0f}ms, bulk NDJSON update {updated * 1000:.0f}ms, "
+              f"bulk delete {deleted * 1000:.0f}ms; one POST /countries/create per row ~{single * 1000:.0f}ms")
+
+
+class StatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        with fake_upstreams(make_countries(5), RATES), \
+                mock.patch('countries.transforms.random.uniform', return_value=1500.0), \
+                mock.patch('countries.services.generate_summary_image'):
+            refresh_country_data()
+
+    def test_region_rollups_match_the_table(self):
+        body = self.client.get('/stats/regions?top=2').json()
+        self.assertEqual(body['total_countries'], 5)
+        africa = next(row for row in body['results'] if row['key'] == 'Africa')
+
+        countries = Country.objects.filter(region='Africa').order_by('-estimated_gdp')
+        gdps = [c.estimated_gdp for c in countries]
+        self.assertEqual(africa['countries'], 2)
+        self.assertEqual(africa['total_population'], sum(c.population for c in countries))
+        self.assertEqual(Decimal(africa['total_gdp']), sum(gdps))
+        self.assertEqual(Decimal(africa['median_gdp']), ((gdps[0] + gdps[1]) / 2).quantize(Decimal('0.01')))
+        self.assertEqual([c['name'] for c in africa['top_countries']], [c.name for c in countries])
+
+    def test_currency_rollups_follow_deletes(self):
+        before = {row['key']: row['countries'] for row in self.client.get('/stats/currencies').json()['results']}
+        self.assertEqual(before, {'EUR': 3, 'NGN': 2})
+
+        self.client.delete('/countries/Country 0')
+        body = self.client.get('/stats/currencies?top=0').json()
+        self.assertEqual({row['key']: row['countries'] for row in body['results']}, {'EUR': 2, 'NGN': 2})
+        self.assertEqual(body['results'][0]['top_countries'], [])
+
+    def test_groups_ignore_case(self):
+        self.client.post('/countries/create', {'name': 'Extra', 'population': 1, 'currency_code': 'ngn', 'region': 'AFRICA'})
+        regions = {row['key']: row['countries'] for row in self.client.get('/stats/regions').json()['results']}
+        self.assertEqual(regions['Africa'], 3)
+        self.assertNotIn('AFRICA', regions)
+        currencies = {row['key']: row['countries'] for row in self.client.get('/stats/currencies').json()['results']}
+        self.assertEqual(currencies, {'EUR': 3, 'NGN': 3})
+
+    def stored_rollups(self):
+        return sorted(
+            CountryRollup.objects.values_list(
+                'dimension', 'key', 'countries', 'total_population', 'countries_with_gdp',
+                'total_gdp', 'avg_gdp', 'median_gdp', 'top_countries',
+            ),
+            key=lambda row: (row[0], row[1] or ''),
+        )
+
+    def test_single_row_writes_match_a_full_rebuild(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/countries/create', {'name': 'Extra', 'population': 1, 'currency_code': 'XOF'})
+            self.client.delete('/countries/Country 1')
+        # Only the affected groups are read, through their key columns; nothing scans the table
+        reads = [q['sql'] for q in ctx.captured_queries if 'FROM "countries_country"' in q['sql']]
+        self.assertTrue([sql for sql in reads if 'currency_key" = \'xof\'' in sql])
+        self.assertTrue(all('WHERE' in sql for sql in reads), reads)
+
+        # A GDP above the group's top, under another spelling of its region
+        country = Country.objects.create(name='Rich', population=7, currency_code='eur', region='EUROPE',
+                                         estimated_gdp=Decimal('99999999.99'), last_refreshed_at=timezone.now())
+        apply_rollup_delta(country, 1, timezone.now())
+        for name in ['Country 3', 'Country 4']:
+            self.client.delete(f'/countries/{name}')
+
+        incremental = self.stored_rollups()
+        self.assertIn(('region', 'EUROPE'), [row[:2] for row in incremental])
+        rebuild_rollups(timezone.now())
+        self.assertEqual(incremental, self.stored_rollups())
+
+    def test_reads_precomputed_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/stats/regions')
+        self.assertFalse([q for q in ctx.captured_queries if 'countries_country"' in q['sql']])
+        self.assertEqual(self.client.get('/stats/regions?top=99').status_code, 400)
+
+
+class LookupKeyTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        seed_countries(200)
+        Country.objects.create(name="Côte d'Ivoire", population=1, currency_code='XOF',
+                               region='Africa', last_refreshed_at=timezone.now())
+
+    def index_names(self, column):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Country._meta.db_table)
+        return [name for name, info in constraints.items() if info['columns'][:1] == [column]]
+
+    def assertUsesIndex(self, queryset, column):
+        plan = queryset.explain()
+        indexes = self.index_names(column)
+        self.assertTrue(indexes, f"no index on {column}")
+        # SQLite names UNIQUE indexes sqlite_autoindex_*, but shows the indexed term
+        used = any(name in plan for name in indexes) or 'INDEX' in plan and f'({column}=?)' in plan
+        self.assertTrue(used, f"{column} index not used:\n{plan}")
+
+    def test_lookups_plan_index_use(self):
+        self.assertUsesIndex(Country.objects.filter(name_key=normalize_key("CÔTE D'IVOIRE")), 'name_key')
+        self.assertUsesIndex(Country.objects.filter(region_key=normalize_key('AFRICA')), 'region_key')
+        self.assertUsesIndex(Country.objects.filter(currency_key=normalize_key('xof')), 'currency_key')
+
+    def test_keys_are_written_on_every_path(self):
+        country = Country.objects.get(name="Côte d'Ivoire")
+        self.assertEqual((country.name_key, country.region_key, country.currency_key),
+                         ("côte d'ivoire", 'africa', 'xof'))
+
+        country.region = 'Americas'
+        Country.objects.bulk_update([country], ['region'])
+        self.assertEqual(Country.objects.get(pk=country.pk).region_key, 'americas')
+
+        self.assertEqual(self.client.get("/countries/CÔTE D'IVOIRE").json()['region'], 'Americas')
+        self.assertEqual(len(self.client.get('/countries?region=AMERICAS&currency=Xof').json()), 1)
+
+    def test_create_rejects_case_insensitive_duplicates(self):
+        response = self.client.post('/countries/create', {
+            'name': "CÔTE D'IVOIRE", 'population': 5, 'currency_code': 'XOF',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json())
+
+
+def find_plan_problems(plan):
+    """Full table scans and sorts outside an index in a SQLite or MySQL EXPLAIN."""
+    if connection.vendor == 'sqlite':
+        problems = re.findall(r'SCAN \w+(?! USING (?:COVERING )?INDEX)$|USE TEMP B-TREE FOR [A-Z ]*ORDER BY', plan, re.M)
+    else:
+        problems = re.findall(r'\bALL\b|Using filesort', plan)
+    return problems
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Requests every supported list/image query shape and EXPLAINs each
+    statement it runs against the countries table. A plan that falls back to
+    a full table scan or a sort outside an index fails the shape. The
+    unfiltered, unpaginated list is left out: reading the whole table is the
+    right plan for it.
+    """
+    FILTERS = [{}, {'region': 'africa'}, {'currency': 'EUR'}, {'region': 'Europe', 'currency': 'eur'}]
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        Country.objects.bulk_create([
+            Country(
+                name=f'Plan {i:04d}',
+                population=(i * 7919) % 10_000,
+                currency_code=(None, 'EUR', 'NGN', 'USD')[i % 4],
+                region=(None, 'Africa', 'Europe')[i % 3],
+                estimated_gdp=None if i % 11 == 0 else Decimal((i * 104729) % 50_000),
+                last_refreshed_at=now,
+            )
+            for i in range(2000)
+        ])
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE TABLE {Country._meta.db_table}')
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN ') + sql)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def assertPlansUseIndexes(self, url):
+        render_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        statements = [
+            query['sql'] for query in ctx.captured_queries
+            if f'FROM "{Country._meta.db_table}"' in query['sql'].replace('`', '"')
+        ]
+        self.assertTrue(statements, url)
+        for sql in statements:
+            plan = self.explain(sql)
+            self.assertEqual(find_plan_problems(plan), [], f"{url}\n{sql}\n{plan}")
+        return response
+
+    def test_keyset_pages(self):
+        for params in self.FILTERS:
+            for sort in SORT_OPTIONS:
+                with self.subTest(params=params, sort=sort):
+                    url = f"/countries?{urlencode(dict(params, sort=sort, limit=150))}"
+                    # Walk every page, so seeks inside the NULL block are covered too
+                    while url:
+                        url = self.assertPlansUseIndexes(url).json()['next']
+
+    def test_offset_pages_and_filtered_lists(self):
+        for params in self.FILTERS[1:]:
+            for sort in SORT_OPTIONS:
+                with self.subTest(params=params, sort=sort):
+                    self.assertPlansUseIndexes(f"/countries?{urlencode(dict(params, sort=sort))}")
+                    self.assertPlansUseIndexes(f"/countries?{urlencode(dict(params, sort=sort, offset=40, limit=20))}")
+
+    def test_detail_and_image_queries(self):
+        self.assertPlansUseIndexes('/countries/PLAN 0042')
+        self.assertPlansUseIndexes('/countries/image?top=10')
+        self.assertPlansUseIndexes('/countries/image?region=AFRICA&top=10')
+
+
+class SearchTests(APITestCase):
+    COUNTRIES = [
+        ('Nigeria', 'Abuja'), ('Niger', 'Niamey'), ('Nicaragua', 'Managua'),
+        ('Papua New Guinea', 'Port Moresby'), ('Guinea', 'Conakry'), ("Côte d'Ivoire", 'Yamoussoukro'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        Country.objects.bulk_create([
+            Country(name=name, capital=capital, population=1, region='Africa', last_refreshed_at=now)
+            for name, capital in self.COUNTRIES
+        ])
+
+    def search(self, q, **params):
+        return self.client.get(f"/countries/search?{urlencode(dict(params, q=q))}").json()['results']
+
+    def test_prefix_tiers_and_accents(self):
+        self.assertEqual([r['name'] for r in self.search('ni')], ['Nicaragua', 'Niger', 'Nigeria'])
+        self.assertEqual([r['name'] for r in self.search('GUI')], ['Guinea', 'Papua New Guinea'])
+        self.assertEqual(self.search('mana')[0]['matched_field'], 'capital')
+        self.assertEqual(self.search('cote')[0]['name'], "Côte d'Ivoire")
+        self.assertEqual(len(self.search('ni', limit=2)), 2)
+
+    def test_fuzzy_fills_up_after_prefixes(self):
+        first = self.search('nigria')[0]
+        self.assertEqual((first['name'], first['match']), ('Nigeria', 'fuzzy'))
+
+    def test_follows_create_and_delete(self):
+        self.assertEqual(self.search('niu'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/countries/create', {'name': 'Niue', 'population': 1600, 'currency_code': 'NZD'})
+        self.assertEqual(self.search('niu')[0]['name'], 'Niue')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/countries/Niue')
+        self.assertEqual(self.search('niu'), [])
+
+    def test_invalid_params(self):
+        response = self.client.get('/countries/search?q=&limit=500')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['details']), {'q', 'limit'})
+
+
+@skipUnless(os.environ.get('COUNTRIES_BENCHMARKS'), "set COUNTRIES_BENCHMARKS=1 to run benchmarks")
+class SearchBenchmark(SimpleTestCase):
+    def test_lookup_latency(self):
+        rng = random.Random(7)
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+
+        def word():
+            return ''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))).title()
+
+        for n in (250, 100_000):
+            rows = [(f'{word()} {word()}', word(), 'Region') for _ in range(n)]
+            start = time.perf_counter()
+            index = SearchIndex(rows)
+            build = time.perf_counter() - start
+
+            queries = [rng.choice(rows)[rng.randint(0, 1)][:rng.randint(1, 6)] for _ in range(500)]
+            queries += [rng.choice(rows)[0][:6] + 'x' for _ in range(500)] # fuzzy path
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, 10)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"\n{n:>7} entities: build {build * 1000:8.1f}ms  "
+                  f"p50 {timings[len(timings) // 2] * 1e6:7.1f}us  p99 {timings[int(len(timings) * 0.99)] * 1e6:8.1f}us")
+
+
+def metric_value(text, sample):
+    """Value of one exposition line such as 'name{label="x"}', or 0 if absent."""
+    match = re.search(r'^' + re.escape(sample) + r' (\S+)$', text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+class MetricsTests(APITestCase):
+    def scrape(self):
+        response = self.client.get('/metrics', HTTP_ACCEPT='text/plain')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_request_metrics_per_view(self):
+        seed_countries(30)
+        labels = '{view="countries",method="GET",status="200",le="+Inf"}'
+        before = metric_value(self.scrape(), f'http_request_duration_seconds_bucket{labels}')
+        self.client.get('/countries')
+        text = self.scrape()
+
+        self.assertEqual(metric_value(text, f'http_request_duration_seconds_bucket{labels}'), before + 1)
+        self.assertGreater(metric_value(text, 'http_request_db_queries_sum{view="countries"}'), 0)
+        self.assertGreater(metric_value(text, 'http_request_serialization_seconds_sum{view="countries"}'), 0)
+        self.assertGreater(metric_value(text, 'http_response_size_bytes_sum{view="countries"}'), 1000)
+        self.assertIn('summary_image_render_cache_requests_total{result="hit"}', text)
+        self.assertIn('response_cache_requests_total{result="miss"}', text)
+
+    def test_refresh_phase_timers(self):
+        before = self.scrape()
+        with fake_upstreams(make_countries(3), RATES), \
+                mock.patch('countries.services.generate_summary_image'), \
+                self.captureOnCommitCallbacks(execute=True):
+            refresh_country_data()
+        after = self.scrape()
+        for phase in ('fetch', 'transform', 'process'):
+            sample = f'refresh_phase_duration_seconds_count{{phase="{phase}"}}'
+            self.assertEqual(metric_value(after, sample), metric_value(before, sample) + 1, phase)
+
+    def test_queries_are_counted_under_the_asgi_handler(self):
+        # Sync views run in a worker thread there; the request context follows them
+        seed_countries(3)
+        sample = 'http_request_db_queries_sum{view="countries/<str:name>"}'
+        before = metric_value(self.scrape(), sample)
+        self.assertEqual(async_to_sync(self.async_client.get)('/countries/Seed 000001').status_code, 200)
+        self.assertGreater(metric_value(self.scrape(), sample), before)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class SnapshotModeTests(APITestCase):
+    PATHS = [
+        '/countries', '/countries?sort=gdp_desc', '/countries?sort=GDP_ASC&region=africa',
+        '/countries?sort=population_desc&currency=eur&region=Europe', '/countries?region=Atlantis',
+        '/countries?sort=name_desc&offset=5&limit=4', '/countries/seed 000004', '/countries/Nowhere',
+        '/status',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        # Versions restart with every rolled-back test
+        snapshot._snapshot = None
+        seed_countries(24)
+        # NULL GDPs, so keyset walks cross the NULL block
+        Country.objects.filter(population__lt=100).update(estimated_gdp=None)
+        bump_data_version()
+
+    def get(self, path, snapshot=True, client=None):
+        with override_settings(COUNTRY_SNAPSHOT_MODE=snapshot):
+            return (client or self.client.get)(path)
+
+    def walk_pages(self, path, snapshot):
+        pages = [self.get(path, snapshot).json()]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next'], snapshot).json())
+        pages.append(self.get(pages[-1]['previous'], snapshot).json())
+        return pages
+
+    def test_responses_match_the_database_path_without_queries(self):
+        self.get('/status') # builds the snapshot
+        for path in self.PATHS:
+            expected = self.get(path, snapshot=False)
+            with self.assertNumQueries(0):
+                response = self.get(path)
+            self.assertEqual(response.status_code, expected.status_code, path)
+            self.assertEqual(response.content, expected.content, path)
+
+        for sort in ('gdp_desc', 'gdp_asc', 'name_asc'):
+            path = f'/countries?sort={sort}&limit=5&region=Africa'
+            self.assertEqual(self.walk_pages(path, True), self.walk_pages(path, False), sort)
+
+    def test_rebuilt_when_the_data_version_moves(self):
+        self.assertEqual(self.get('/countries/seed 000004').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/countries/seed 000004').status_code, 204)
+        self.assertEqual(self.get('/countries/seed 000004').status_code, 404)
+        self.assertEqual(len(self.get('/countries').json()), 23)
+
+    def test_stale_cursor_falls_back_to_the_database(self):
+        first = self.get('/countries?sort=population_desc&limit=5').json()
+        Country.objects.filter(name=first['results'][-1]['name']).update(population=10 ** 9)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_data_version()
+        self.get('/status') # rebuilds the snapshot
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get(first['next'])
+        self.assertTrue(ctx.captured_queries)
+        self.assertEqual(response.content, self.get(first['next'], snapshot=False).content)
+
+
+@skipUnless(os.environ.get('COUNTRIES_BENCHMARKS'), "set COUNTRIES_BENCHMARKS=1 to run benchmarks")
+@override_settings(RESPONSE_CACHE={'ENABLED': False})
+class MetricsOverheadBenchmark(TestCase):
+    def test_overhead_on_country_list(self):
+        from django.conf import settings
+        seed_countries(250)
+        without = [m for m in settings.MIDDLEWARE if m != 'countries.middleware.RequestMetricsMiddleware']
+
+        def timed(middleware, rounds=300):
+            with override_settings(MIDDLEWARE=middleware):
+                self.client.get('/countries')
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    self.client.get('/countries')
+                return (time.perf_counter() - start) / rounds
+
+        # Interleave runs so drift affects both sides equally
+        base, instrumented = [], []
+        for _ in range(5):
+            base.append(timed(without))
+            instrumented.append(timed(settings.MIDDLEWARE))
+        base, instrumented = min(base), min(instrumented)
+        print(f"\nGET /countries (250 rows): {base * 1000:.2f}ms -> {instrumented * 1000:.2f}ms "
+              f"({(instrumented / base - 1) * 100:+.1f}%)")
+
+
+class BenchmarkHarnessTests(TransactionTestCase):
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(workdir)
+
+    def test_seeds_through_refresh_and_times_workloads(self):
+        results = benchmark_size(
+            30, max_requests=3, max_seconds=0.1, refresh_runs=1,
+            workloads=['refresh', 'list', 'detail', 'search'],
+        )
+        self.assertEqual(Country.objects.count(), 30)
+        self.assertEqual([entry['workload'] for entry in results], ['refresh', 'list', 'detail', 'search'])
+        for entry in results:
+            self.assertEqual(entry['rows'], 30)
+            self.assertGreaterEqual(entry['requests'], 1)
+            self.assertLessEqual(entry['p50_ms'], entry['p99_ms'])
+
+    def test_compare_flags_regressions_past_threshold(self):
+        baseline = {'results': [
+            {'rows': 10, 'workload': 'list', 'p50_ms': 1.0, 'p99_ms': 2.0},
+            {'rows': 10, 'workload': 'detail', 'p50_ms': 1.0, 'p99_ms': 2.0},
+        ]}
+        results = [
+            {'rows': 10, 'workload': 'list', 'p50_ms': 1.1, 'p99_ms': 3.0},
+            {'rows': 10, 'workload': 'detail', 'p50_ms': 0.5, 'p99_ms': 2.1},
+            {'rows': 10, 'workload': 'search', 'p50_ms': 9.0, 'p99_ms': 9.0},
+        ]
+        regressions = compare_results(results, baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('list @ 10 rows: p99_ms', regressions[0])
@@ -0,0 +1,75 @@
+import random
+from decimal import Decimal # <-- CRUCIAL for precise math
+
+from django.conf import settings
+
+# --- GDP Transform Stage ---
+# Pure, batched computation kept out of the DB loop: it takes columns and
+# returns columns, so it can be timed and tested without touching the database.
+
+RATE_QUANTUM = Decimal('0.000001')
+GDP_QUANTUM = Decimal('0.01')
+ZERO_GDP = Decimal('0.00')
+
+MULTIPLIER_RANGE = (1000, 2000)
+
+
+def get_rng(seed=None):
+    """
+    Random source for the GDP multiplier. With a seed (argument or the
+    GDP_RANDOM_SEED setting) refreshes are reproducible; otherwise the global
+    `random` module is used.
+    """
+    if seed is None:
+        seed = getattr(settings, 'GDP_RANDOM_SEED', None)
+    return random if seed is None else random.Random(seed)
+
+
+def compute_gdp_columns(populations, currency_codes, exchange_rates, rng=None):
+    """
+    Computes the exchange_rate and estimated_gdp columns for parallel
+    population/currency columns in one pass. Returns (rates, gdps):
+
+    * no currency code: rate None, GDP 0.00
+    * currency without a rate: rate None, GDP None
+    * otherwise: GDP = population * uniform(1000, 2000) / rate, rounded to
+      cents, and the rate rounded to the column's 6 places
+    """
+    rng = rng or get_rng()
+    uniform = rng.uniform
+    low, high = MULTIPLIER_RANGE
+
+    # Each distinct rate is converted once per batch rather than once per row
+    decimal_rates = {}
+    rates, gdps = [], []
+
+    for population, currency_code in zip(populations, currency_codes):
+        if not currency_code:
+            # No currency information found for the country
+            rates.append(None)
+            gdps.append(ZERO_GDP) # Set to 0 if no currency exists
+            continue
+
+        rate_pair = decimal_rates.get(currency_code)
+        if rate_pair is None:
+            rate = exchange_rates.get(currency_code)
+            if rate:
+                exchange_rate_dec = Decimal(str(rate))
+                rate_pair = (exchange_rate_dec, exchange_rate_dec.quantize(RATE_QUANTUM))
+            else:
+                rate_pair = (None, None)
+            decimal_rates[currency_code] = rate_pair
+
+        exchange_rate_dec, stored_rate = rate_pair
+        if exchange_rate_dec is None:
+            # Currency code exists, but no exchange rate found
+            rates.append(None)
+            gdps.append(None) # Keep NULL/None if rate is missing
+            continue
+
+        multiplier = Decimal(str(uniform(low, high)))
+        # GDP Calculation: (Population * Multiplier) / Exchange Rate
+        rates.append(stored_rate)
+        gdps.append((Decimal(str(population)) * multiplier / exchange_rate_dec).quantize(GDP_QUANTUM))
+
+    return rates, gdps
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .exceptions import ExternalApiError
+
+# --- Upstream Sources ---
+
+SOURCES = {
+    'rates': {
+        'api_name': 'open.er-api.com',
+        'url': "https://open.er-api.com/v6/latest/USD",
+    },
+    'countries': {
+        'api_name': 'restcountries.com',
+        'url': "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies",
+    },
+}
+
+DEFAULT_TIMEOUT = 10
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session(max_retries=None, backoff_factor=None):
+    """Creates a keep-alive session with a connection pool and bounded retry."""
+    if max_retries is None:
+        max_retries = getattr(settings, 'UPSTREAM_MAX_RETRIES', 2)
+    if backoff_factor is None:
+        backoff_factor = getattr(settings, 'UPSTREAM_BACKOFF_FACTOR', 0.5)
+
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=len(SOURCES), pool_maxsize=len(SOURCES), max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Returns the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def get_timeout(name):
+    return getattr(settings, 'UPSTREAM_TIMEOUTS', {}).get(name, DEFAULT_TIMEOUT)
+
+
+# --- Fetching ---
+
+# `payload` is None when `changed` is False: a 304, or a 200 whose body hashes
+# to the stored content_hash, is never parsed.
+FetchResult = namedtuple('FetchResult', ['name', 'payload', 'changed', 'validators'])
+
+
+def fetch_source(name, sources=None, session=None, validators=None):
+    """
+    Downloads and decodes one upstream, raising ExternalApiError naming it on
+    failure. With `validators` (etag/last_modified/content_hash from the last
+    processed payload) the request is conditional and unchanged content is
+    reported without being parsed.
+    """
+    source = (sources or SOURCES)[name]
+    session = session or get_session()
+    validators = validators or {}
+
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    try:
+        response = session.get(source['url'], headers=headers, timeout=get_timeout(name))
+        if response.status_code == 304:
+            return FetchResult(name, None, False, validators)
+        response.raise_for_status()
+
+        content = response.content
+        new_validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': hashlib.sha256(content).hexdigest(),
+        }
+        if new_validators['content_hash'] == validators.get('content_hash'):
+            return FetchResult(name, None, False, new_validators)
+
+        return FetchResult(name, json.loads(content), True, new_validators)
+    except (requests.exceptions.RequestException, ValueError):
+        raise ExternalApiError(source['api_name'])
+
+
+def fetch_all(names=None, sources=None, session=None, parallel=True, validators=None,
+              return_exceptions=False):
+    """
+    Fetches the given upstreams (all of them by default) and returns a
+    name -> FetchResult dict. With `parallel` the downloads overlap, so total
+    latency is that of the slowest source rather than the sum. `validators`
+    maps source name -> stored validators for conditional requests. With
+    `return_exceptions` a failing source maps to its ExternalApiError instead
+    of aborting the others.
+    """
+    sources = sources or SOURCES
+    names = list(names or sources)
+    session = session or get_session()
+    validators = validators or {}
+
+    def collect(fetch):
+        try:
+            return fetch()
+        except ExternalApiError as e:
+            if not return_exceptions:
+                raise
+            return e
+
+    if not parallel:
+        return {
+            name: collect(lambda: fetch_source(name, sources, session, validators.get(name)))
+            for name in names
+        }
+
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        futures = {
+            name: pool.submit(fetch_source, name, sources, session, validators.get(name))
+            for name in names
+        }
+        # .result() re-raises the ExternalApiError of the first failing source
+        return {name: collect(future.result) for name, future in futures.items()}
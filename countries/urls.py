@@ -1,16 +1,25 @@
 # project_name/urls.py
 from django.urls import path
 from countries.views import (
-    RefreshCountriesView, CountryListView, CountryDetailView, 
-    StatusView, SummaryImageView
+    RefreshCountriesView, RefreshJobDetailView, CountryListView, CountryExportView, CountryDetailView, 
+    StatusView, SummaryImageView, RateHistoryView, ConvertView, StatsView, CountrySearchView, MetricsView, CountryBulkView
 )
 
 urlpatterns = [
     # API Endpoints
     path('countries/refresh', RefreshCountriesView.as_view()),
+    path('countries/refresh/<uuid:job_id>', RefreshJobDetailView.as_view(), name='refresh-job'),
+    path('countries/bulk', CountryBulkView.as_view(), name='country-bulk'),
     path('countries/image', SummaryImageView.as_view()),
+    path('countries/export', CountryExportView.as_view(), name='country-export'),
+    path('countries/search', CountrySearchView.as_view(), name='country-search'),
     path('countries', CountryListView.as_view()),
     path('countries/<str:name>', CountryDetailView.as_view()), 
+    path('rates/<str:code>/history', RateHistoryView.as_view(), name='rate-history'),
+    path('convert', ConvertView.as_view(), name='convert'),
+    path('stats/regions', StatsView.as_view(dimension='region'), name='stats-regions'),
+    path('stats/currencies', StatsView.as_view(dimension='currency'), name='stats-currencies'),
     path('status', StatusView.as_view()),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     # Include admin or other paths as needed
 ]
\ No newline at end of file
@@ -2,16 +2,37 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics
 from rest_framework.exceptions import NotFound
-from django.http import JsonResponse, FileResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
 import os
-from .models import Country, Status
-from .serializers import CountrySerializer, StatusSerializer
-from .services import refresh_country_data 
-from .exceptions import ExternalApiError 
-from .serializers import CountrySerializer, StatusSerializer
+from .cache import CachedResponseMixin, bump_data_version, get_file_etag
+from .models import Country, CountryRollup, Status, RefreshJob, RefreshStage, normalize_key
+from .exports import EXPORT_CONTENT_TYPES, encode_export, iter_export_rows
+from .fast_serializers import FastListMixin
+from .exceptions import ValidationError
+from .image_cache import get_variant
+from .image_generator import CANVAS_SIZE, IMAGE_FORMATS, IMAGE_PATH
+from .jobs import enqueue_refresh
+from .metrics import registry
+from .pagination import CountryPagination, keyset_order_by
+from .parsers import LargeJSONParser, NDJSONParser
+from .rate_history import RESAMPLE_KINDS, get_rate_history
+from .rates import ConversionError, get_rate_table
+from .rollups import ROLLUP_DIMENSIONS, apply_rollup_delta, get_rollup_top_n, rebuild_rollups
+from .search import get_search_index
+from .services import delete_countries, upsert_countries
+from .snapshot import StaleCursor, get_snapshot, snapshot_enabled
+from .transforms import RATE_QUANTUM
+from .serializers import (
+    CountryRollupSerializer, CountrySerializer, StatusSerializer, RefreshJobSerializer, serialize_stages,
+)
 from rest_framework import status
-from datetime import datetime
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 # --- POST /countries/refresh ---
 class APIRootView(APIView):
     """Provides a simple welcome message for the API root."""
@@ -20,27 +41,51 @@ class APIRootView(APIView):
             "message": "Welcome to the Country Currency & Exchange API.",
             "available_endpoints": [
                 "/countries",
-                "/countries/refresh (POST)",
-                "/countries/image",
-                "/status"
+                "/countries/refresh?stages=countries,rates,gdp,image (POST)",
+                "/countries/refresh/<job_id>",
+                "/countries/bulk (POST a JSON array or NDJSON of countries, DELETE a list of names)",
+                "/countries/image?region=&top=&width=&format=png|webp|jpeg",
+                "/countries/export?format=json|ndjson|csv",
+                "/countries/search?q=&limit=",
+                "/rates/<code>/history?from=&to=&resample=none|hour|day|week",
+                "/convert?from=&to=&amount= (GET, or POST a batch)",
+                "/stats/regions?top=",
+                "/stats/currencies?top=",
+                "/status",
+                "/metrics"
             ]
         })
 class RefreshCountriesView(APIView):
     def post(self, request):
+        # ?stages=rates,countries refreshes only those upstreams (and what derives from them)
+        stages = [stage for stage in request.query_params.get('stages', '').split(',') if stage]
+        unknown = [stage for stage in stages if stage not in RefreshStage.STAGES]
+        if unknown:
+            return ValidationError({
+                "stages": f"Unknown stage(s) {', '.join(unknown)}; expected any of {', '.join(RefreshStage.STAGES)}"
+            }).to_response()
+
+        # Enqueue (or join the in-flight) refresh and return immediately
+        job, created = enqueue_refresh(stages)
+        response_data = RefreshJobSerializer(job).data
+        response_data['created'] = created
+        return Response(
+            response_data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': f"/countries/refresh/{job.pk}"},
+        )
+
+# --- GET /countries/refresh/:job_id ---
+class RefreshJobDetailView(generics.RetrieveAPIView):
+    queryset = RefreshJob.objects.all()
+    serializer_class = RefreshJobSerializer
+    lookup_url_kwarg = 'job_id'
+
+    def get_object(self):
         try:
-            updated_count, current_time = refresh_country_data()
-            
-            response_data = StatusSerializer({
-                'total_countries': updated_count, 
-                'last_refreshed_at': current_time
-            }).data
-            
-            return Response(response_data, status=200)
-
-        except ExternalApiError as e:
-            return e.to_response()
-        except Exception:
-            return JsonResponse({"error": "Internal server error"}, status=500)
+            return self.queryset.get(pk=self.kwargs.get('job_id'))
+        except RefreshJob.DoesNotExist:
+            raise NotFound(detail={"error": "Refresh job not found"})
 class CountryCreateView(APIView):
     def post(self, request):
         serializer = CountrySerializer(data=request.data)
@@ -49,59 +94,213 @@ class CountryCreateView(APIView):
             # Pass the server-controlled fields to the .save() method
             # This is necessary because they were marked read_only 
             # and were not in the request data.
-            country = serializer.save(
-                last_refreshed_at=datetime.now(),
-                # You would also calculate and set estimated_gdp and exchange_rate here
-                # For simplicity, we'll only set the timestamp for now.
-            )
+            with transaction.atomic():
+                country = serializer.save(
+                    last_refreshed_at=datetime.now(),
+                    # You would also calculate and set estimated_gdp and exchange_rate here
+                    # For simplicity, we'll only set the timestamp for now.
+                )
+                apply_rollup_delta(country, 1, country.last_refreshed_at)
+                bump_data_version()
             return Response(CountrySerializer(country).data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# --- POST & DELETE /countries/bulk ---
+class CountryBulkView(APIView):
+    """
+    Batch writes for data-correction jobs. POST takes a JSON array (or an
+    NDJSON stream) of countries and upserts the valid ones by name; DELETE
+    takes a list of names. Each request is one transaction with batched
+    statements, and invalid rows are reported by index without failing the rest.
+    """
+    parser_classes = [LargeJSONParser, NDJSONParser]
+    max_body_setting = 'COUNTRY_BULK_MAX_BODY_BYTES'
+
+    def get_rows(self, request, field, description):
+        rows = request.data
+        max_rows = getattr(settings, 'COUNTRY_BULK_MAX_ROWS', 100_000)
+        if not isinstance(rows, list):
+            raise ValidationError({field: f"must be a JSON array or NDJSON stream of {description}"})
+        if len(rows) > max_rows:
+            raise ValidationError({field: f"at most {max_rows} {description} per request"})
+        return rows
+
+    def post(self, request):
+        try:
+            rows = self.get_rows(request, 'countries', 'country objects')
+        except ValidationError as e:
+            return e.to_response()
+
+        serializer = CountrySerializer(data=rows, many=True, context={'upsert': True})
+        valid, errors = serializer.validate_rows()
+
+        # name key -> validated row; a name repeated within the batch is an error
+        incoming, seen = {}, {}
+        for index, data in valid:
+            key = normalize_key(data['name'])
+            if key in seen:
+                errors[index] = {"name": [f"duplicates row {seen[key]}"]}
+                continue
+            incoming[key], seen[key] = data, index
+        errors = dict(sorted(errors.items()))
+
+        if errors and not incoming:
+            return ValidationError(errors).to_response()
+
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        if incoming:
+            current_time = datetime.now()
+            with transaction.atomic():
+                # As in CountryCreateView, estimated_gdp is left to the next refresh
+                # (a changed currency clears the rate and GDP derived from the old one)
+                counts = upsert_countries(incoming, current_time, partial=True)
+                rebuild_rollups(current_time)
+                bump_data_version()
+        return Response(dict(counts, errors=errors))
+
+    def delete(self, request):
+        try:
+            names = self.get_rows(request, 'names', 'country names')
+        except ValidationError as e:
+            return e.to_response()
+        invalid = {index: "must be a country name" for index, name in enumerate(names)
+                   if not isinstance(name, str) or not name.strip()}
+        if invalid:
+            return ValidationError({"names": invalid}).to_response()
+
+        with transaction.atomic():
+            deleted, not_found = delete_countries(names)
+            if deleted:
+                rebuild_rollups(datetime.now())
+                bump_data_version()
+        return Response({"deleted": deleted, "not_found": not_found})
     
 # --- GET /countries ---
-class CountryListView(generics.ListAPIView):
+
+# `sort` query param -> order_by field
+SORT_OPTIONS = {
+    'gdp_desc': '-estimated_gdp',
+    'gdp_asc': 'estimated_gdp',
+    'name_asc': 'name',
+    'name_desc': '-name',
+    'population_desc': '-population',
+}
+DEFAULT_ORDERING = 'name'
+
+def get_ordering_field(query_params):
+    sort_param = query_params.get('sort')
+    if sort_param:
+        return SORT_OPTIONS.get(sort_param.lower(), DEFAULT_ORDERING)
+    return DEFAULT_ORDERING
+
+def filter_countries(queryset, query_params):
+    """Applies the `region`/`currency` filters shared by the list and export views."""
+    # Filtering (case-insensitive)
+    region = query_params.get('region')
+    currency = query_params.get('currency')
+    
+    if region:
+        queryset = queryset.filter(region_key=normalize_key(region))
+    if currency:
+        queryset = queryset.filter(currency_key=normalize_key(currency))
+    return queryset
+
+def get_country_queryset(query_params):
+    """The filtered, sorted queryset behind GET /countries."""
+    queryset = filter_countries(Country.objects.all(), query_params)
+        
+    # Sorting, with id as a tie-breaker so pages are stable, in the cursor walk's order
+    return queryset.order_by(*keyset_order_by(Country, get_ordering_field(query_params)))
+
+# Every order_by string GET /countries can use, pre-sorted by the snapshot
+SNAPSHOT_ORDERINGS = tuple(dict.fromkeys([*SORT_OPTIONS.values(), DEFAULT_ORDERING]))
+
+def get_country_snapshot():
+    return get_snapshot(SNAPSHOT_ORDERINGS)
+
+def snapshot_list_data(snapshot, request, view, paginator):
+    """GET /countries response data from the snapshot; raises StaleCursor like paginate_snapshot()."""
+    params = request.query_params
+    selection = snapshot.select(view.get_ordering_field(), params.get('region'), params.get('currency'))
+    page = paginator.paginate_snapshot(selection, request, view)
+    if page is None:
+        return [record.data for record in selection.rows]
+    return paginator.get_paginated_response([record.data for record in page]).data
+
+class CountryListView(CachedResponseMixin, FastListMixin, generics.ListAPIView):
     serializer_class = CountrySerializer
+    pagination_class = CountryPagination
+    fast_serialization = True # values_list() + precompiled row encoder
+    
+    def get_ordering_field(self):
+        return get_ordering_field(self.request.query_params)
     
     def get_queryset(self):
-        queryset = Country.objects.all()
-        
-        # Filtering (case-insensitive)
-        region = self.request.query_params.get('region')
-        currency = self.request.query_params.get('currency')
-        
-        if region:
-            queryset = queryset.filter(region__iexact=region)
-        if currency:
-            queryset = queryset.filter(currency_code__iexact=currency)
-            
-        # Sorting
-        sort_param = self.request.query_params.get('sort')
-        if sort_param:
-            order_by_field = {
-                'gdp_desc': '-estimated_gdp',
-                'gdp_asc': 'estimated_gdp',
-                'name_asc': 'name',
-                'name_desc': '-name',
-                'population_desc': '-population',
-            }.get(sort_param.lower())
-            
-            if order_by_field:
-                queryset = queryset.order_by(order_by_field)
-
-        return queryset
+        return get_country_queryset(self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        if snapshot_enabled():
+            try:
+                return Response(snapshot_list_data(get_country_snapshot(), request, self, self.paginator))
+            except StaleCursor:
+                pass # The database can still seek past a row that has changed since
+        return super().list(request, *args, **kwargs)
+
+# --- GET /countries/export ---
+class CountryExportView(APIView):
+    """Streams the (filtered, sorted) countries table as JSON, NDJSON or CSV."""
+
+    def perform_content_negotiation(self, request, force=False):
+        # `format` selects the export encoding here, not a DRF renderer
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        export_format = request.query_params.get('format', 'json').lower()
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return JsonResponse(
+                {"error": "Validation failed",
+                 "details": {"format": f"must be one of {', '.join(EXPORT_CONTENT_TYPES)}"}},
+                status=400,
+            )
+
+        queryset = filter_countries(Country.objects.all(), request.query_params)
+        rows = iter_export_rows(queryset, get_ordering_field(request.query_params))
+        response = StreamingHttpResponse(
+            encode_export(rows, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        if export_format == 'csv':
+            response['Content-Disposition'] = 'attachment; filename="countries.csv"'
+        return response
 
 # --- GET /countries/:name & DELETE /countries/:name ---
-class CountryDetailView(generics.RetrieveDestroyAPIView):
+def get_country_cache_scope(name):
+    # Lookups are case-insensitive, so every spelling shares one entry
+    return f"country:{normalize_key(name)}"
+
+class CountryDetailView(CachedResponseMixin, generics.RetrieveDestroyAPIView):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
     lookup_field = 'name' # Use 'name' from the URL path
     
+    def get_cache_scope(self):
+        return get_country_cache_scope(self.kwargs.get('name'))
+    
+    def retrieve(self, request, *args, **kwargs):
+        if snapshot_enabled():
+            record = get_country_snapshot().get(self.kwargs.get('name'))
+            if record is None:
+                raise NotFound(detail={"error": "Country not found"})
+            return Response(record.data)
+        return super().retrieve(request, *args, **kwargs)
+
     def get_object(self):
         # Case-insensitive lookup for :name
         name = self.kwargs.get('name')
         try:
-            # Use name__iexact for case-insensitive matching
-            return self.queryset.get(name__iexact=name)
+            # Exact match on the indexed, case-folded name key
+            return self.queryset.get(name_key=normalize_key(name))
         except Country.DoesNotExist:
             # Return required 404 response
             raise NotFound(detail={"error": "Country not found"})
@@ -109,29 +308,299 @@ class CountryDetailView(generics.RetrieveDestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         # Handles the deletion and ensures 404 is returned if not found via get_object
         instance = self.get_object() 
-        self.perform_destroy(instance)
+        with transaction.atomic():
+            self.perform_destroy(instance)
+            apply_rollup_delta(instance, -1, datetime.now())
+            bump_data_version()
         return Response(status=204) # 204 No Content on success
 
 # --- GET /status ---
-class StatusView(APIView):
+class StatusView(CachedResponseMixin, APIView):
     def get(self, request):
+        if snapshot_enabled():
+            return Response(get_country_snapshot().status, status=200)
+        stages = serialize_stages(RefreshStage.objects.all())
         try:
             status = Status.objects.get(pk=1)
-            return Response(StatusSerializer(status).data, status=200)
+            return Response(dict(StatusSerializer(status).data, stages=stages), status=200)
         except Status.DoesNotExist:
             # Return default status if refresh has never run
             return Response({
                 "total_countries": 0, 
-                "last_refreshed_at": None
+                "last_refreshed_at": None,
+                "stages": stages,
             }, status=200)
 
 # --- GET /countries/image ---
+
+# Bounds for on-demand variants: ?region=&top=&width=&format=
+IMAGE_VARIANT_PARAMS = ('region', 'top', 'width', 'format')
+IMAGE_TOP_RANGE = (1, 25)
+IMAGE_WIDTH_RANGE = (200, 2000)
+
+def patch_image_cache_headers(response):
+    # The image only changes on refresh; let CDNs keep it and revalidate by ETag
+    patch_cache_control(
+        response, public=True, must_revalidate=True,
+        max_age=getattr(settings, 'SUMMARY_IMAGE_MAX_AGE', 300),
+    )
+    return response
+
+def parse_variant_params(params):
+    """Validates the variant params; returns (get_variant() args, errors)."""
+    errors = {}
+
+    def bounded_int(name, default, bounds):
+        try:
+            value = int(params.get(name, default))
+        except (TypeError, ValueError):
+            value = None
+        if value is None or not bounds[0] <= value <= bounds[1]:
+            errors[name] = f"must be an integer between {bounds[0]} and {bounds[1]}"
+        return value
+
+    top = bounded_int('top', 5, IMAGE_TOP_RANGE)
+    width = bounded_int('width', CANVAS_SIZE[0], IMAGE_WIDTH_RANGE)
+    image_format = params.get('format', 'png').lower()
+    if image_format not in IMAGE_FORMATS:
+        errors['format'] = f"must be one of {', '.join(IMAGE_FORMATS)}"
+    return (params.get('region'), top, width, image_format), errors
+
+def variant_response(request, variant):
+    """Response for a get_variant() result, honouring If-None-Match."""
+    content_type, content, etag, cache_status = variant
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    response['X-Render-Cache'] = cache_status
+    return patch_image_cache_headers(response)
+
 class SummaryImageView(APIView):
+    def perform_content_negotiation(self, request, force=False):
+        # `format` selects the image encoding here, not a DRF renderer
+        return super().perform_content_negotiation(request, force=True)
+
     def get(self, request):
-        image_path = os.path.join('cache', 'summary.png')
+        if any(param in request.query_params for param in IMAGE_VARIANT_PARAMS):
+            return self.get_variant(request)
+
+        image_path = IMAGE_PATH
 
         if os.path.exists(image_path):
-            return FileResponse(open(image_path, 'rb'), content_type='image/png')
+            stat_result = os.stat(image_path)
+            etag = get_file_etag(image_path, stat_result)
+            last_modified = int(stat_result.st_mtime)
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = FileResponse(open(image_path, 'rb'), content_type='image/png')
+                response['Last-Modified'] = http_date(last_modified)
+            response['ETag'] = etag
+            return patch_image_cache_headers(response)
         else:
             # Return 200 OK with JSON error body as specified
-            return JsonResponse({ "error": "Summary image not found" }, status=200)
\ No newline at end of file
+            return JsonResponse({ "error": "Summary image not found" }, status=200)
+
+    def get_variant(self, request):
+        """Renders (or serves from the render cache) a region/size/format variant."""
+        args, errors = parse_variant_params(request.query_params)
+        if errors:
+            return ValidationError(errors).to_response()
+        return variant_response(request, get_variant(*args))
+
+# --- GET /rates/:code/history ---
+
+RATE_HISTORY_DEFAULT_DAYS = 30
+
+def parse_history_bound(value, end_of_day=False):
+    """Parses an ISO datetime or date (whole day) query param into an aware UTC datetime."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        # Well formed but impossible, e.g. 2026-13-01
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+class RateHistoryView(APIView):
+    def get(self, request, code):
+        params = request.query_params
+        errors = {}
+
+        currency_code = code.upper()
+        if len(currency_code) != 3 or not currency_code.isalpha():
+            errors['code'] = "must be a 3-letter currency code"
+
+        end = timezone.now()
+        if params.get('to'):
+            end = parse_history_bound(params['to'], end_of_day=True)
+            if end is None:
+                errors['to'] = "must be an ISO 8601 date or datetime"
+        start = end - timedelta(days=RATE_HISTORY_DEFAULT_DAYS) if end else None
+        if params.get('from'):
+            start = parse_history_bound(params['from'])
+            if start is None:
+                errors['from'] = "must be an ISO 8601 date or datetime"
+        if start and end and start > end:
+            errors['from'] = "must not be after 'to'"
+
+        resample = params.get('resample', 'none').lower()
+        if resample != 'none' and resample not in RESAMPLE_KINDS:
+            errors['resample'] = f"must be one of none, {', '.join(RESAMPLE_KINDS)}"
+        if errors:
+            return ValidationError(errors).to_response()
+
+        resample = None if resample == 'none' else resample
+        return Response({
+            "currency_code": currency_code,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "resample": resample or 'none',
+            "points": get_rate_history(currency_code, start, end, resample),
+        })
+
+
+# --- GET/POST /convert ---
+
+def rates_unavailable_response():
+    return JsonResponse({
+        "error": "Exchange rates unavailable",
+        "details": "No rates have been loaded yet; run POST /countries/refresh"
+    }, status=503)
+
+class ConvertView(APIView):
+    parser_classes = [LargeJSONParser]
+    max_body_setting = 'CONVERT_MAX_BODY_BYTES'
+
+    def get(self, request):
+        params = request.query_params
+        errors = {
+            name: "This field is required"
+            for name in ('from', 'to') if not params.get(name)
+        }
+        if errors:
+            return ValidationError(errors).to_response()
+
+        table = get_rate_table()
+        if not len(table):
+            return rates_unavailable_response()
+
+        source, target = params['from'].upper(), params['to'].upper()
+        amount = params.get('amount', '1')
+        try:
+            rate, result = table.convert(source, target, amount)
+        except ConversionError as e:
+            return ValidationError({"conversion": str(e)}).to_response()
+
+        return Response({
+            "from": source,
+            "to": target,
+            "amount": amount,
+            "rate": str(rate.quantize(RATE_QUANTUM)),
+            "result": str(result),
+            "rates_as_of": table.taken_at,
+        })
+
+    def post(self, request):
+        conversions = request.data.get('conversions') if isinstance(request.data, dict) else None
+        max_batch = getattr(settings, 'CONVERT_MAX_BATCH', 100_000)
+        if not isinstance(conversions, list):
+            return ValidationError({"conversions": "must be a list of {from, to, amount} objects"}).to_response()
+        if len(conversions) > max_batch:
+            return ValidationError({"conversions": f"at most {max_batch} conversions per request"}).to_response()
+
+        table = get_rate_table()
+        if not len(table):
+            return rates_unavailable_response()
+
+        # Results line up with the request; failed items are null and listed in `errors`
+        convert = table.convert
+        results, errors = [], {}
+        for index, item in enumerate(conversions):
+            try:
+                results.append(str(convert(item['from'], item['to'], item.get('amount', '1'))[1]))
+            except (ConversionError, KeyError, TypeError, AttributeError) as e:
+                results.append(None)
+                errors[index] = str(e) if isinstance(e, ConversionError) else "expected an object with from, to and amount"
+
+        return Response({
+            "results": results,
+            "errors": errors,
+            "rates_as_of": table.taken_at,
+        })
+
+
+# --- GET /stats/regions & GET /stats/currencies ---
+class StatsView(CachedResponseMixin, APIView):
+    """Serves the rollups materialized by the last change to the countries."""
+    dimension = None
+
+    def get(self, request):
+        top_n = get_rollup_top_n()
+        try:
+            top = int(request.query_params.get('top', min(5, top_n)))
+        except ValueError:
+            top = None
+        if top is None or not 0 <= top <= top_n:
+            return ValidationError({"top": f"must be an integer between 0 and {top_n}"}).to_response()
+
+        # One snapshot of Status and the rollups written with it
+        with transaction.atomic():
+            status = Status.objects.filter(pk=1).first()
+            rollups = list(CountryRollup.objects.filter(dimension=self.dimension))
+
+        results = CountryRollupSerializer(rollups, many=True).data
+        for row in results:
+            row['top_countries'] = row['top_countries'][:top]
+        return Response({
+            "group_by": ROLLUP_DIMENSIONS[self.dimension],
+            "total_countries": status.total_countries if status else 0,
+            "last_refreshed_at": StatusSerializer(status).data['last_refreshed_at'] if status else None,
+            "results": results,
+        })
+
+
+# --- GET /countries/search ---
+
+SEARCH_LIMIT_RANGE = (1, 50)
+
+class CountrySearchView(APIView):
+    """Type-ahead prefix/fuzzy search over names and capitals, served from memory."""
+    def get(self, request):
+        params = request.query_params
+        errors = {}
+
+        query = params.get('q', '').strip()
+        if not query:
+            errors['q'] = "is required"
+        try:
+            limit = int(params.get('limit', 10))
+        except ValueError:
+            limit = None
+        if limit is None or not SEARCH_LIMIT_RANGE[0] <= limit <= SEARCH_LIMIT_RANGE[1]:
+            errors['limit'] = f"must be an integer between {SEARCH_LIMIT_RANGE[0]} and {SEARCH_LIMIT_RANGE[1]}"
+        if errors:
+            return ValidationError(errors).to_response()
+
+        return Response({
+            "query": query,
+            "results": get_search_index().search(query, limit),
+        })
+
+
+# --- GET /metrics ---
+class MetricsView(APIView):
+    """Request, refresh and cache metrics in the Prometheus text format."""
+    def perform_content_negotiation(self, request, force=False):
+        # Scrapers ask for text/plain, which no DRF renderer offers
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')